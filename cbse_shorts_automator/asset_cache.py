@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+File: asset_cache.py
+Persistent on-disk cache for downloaded source assets (chapter PDFs, Drive lecture videos).
+- Keyed by URL / Drive file id, so rows sharing a chapter fetch it once.
+- Size (+ ETag where the server provides one) validation on every hit.
+- LRU eviction by total bytes.
+- File locks so parallel render workers don't download the same asset twice.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX only; without it we fall back to in-process locking
+except ImportError:
+    fcntl = None
+
+class AssetCache:
+    """
+    Usage:
+        cache = AssetCache('cache/assets', max_bytes=20 * 1024**3)
+        path = cache.fetch(AssetCache.url_key(url), url, downloader, suffix='.pdf')
+
+    downloader(tmp_path) must write the file and return True/False, or a dict of
+    metadata (e.g. {'etag': ...}) to store with the entry.
+    """
+
+    INDEX_FILE = 'index.json'
+    IN_USE_GRACE = 3600  # Never evict entries touched in the last hour (a worker may still be reading)
+
+    def __init__(self, cache_dir='cache/assets', max_bytes=20 * 1024**3, max_age_hours=168):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.max_age = float(max_age_hours) * 3600
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self._thread_lock = threading.RLock()
+        os.makedirs(os.path.join(cache_dir, 'locks'), exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def url_key(url):
+        return 'url_' + hashlib.sha1(url.strip().encode('utf-8')).hexdigest()[:20]
+
+    @staticmethod
+    def drive_key(file_id):
+        return 'drive_' + file_id
+
+    # ------------------------------------------------------------------
+    # Locking
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self, name):
+        """Cross-process exclusive lock (plus a thread lock for same-process callers)."""
+        lock_path = os.path.join(self.cache_dir, 'locks', f"{name}.lock")
+        with self._thread_lock if name == 'index' else _NullContext():
+            with open(lock_path, 'a') as fh:
+                if fcntl: fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl: fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    return json.load(f)
+            except Exception:
+                print("⚠️ Asset cache index unreadable. Starting fresh.")
+        return {}
+
+    def _save_index(self, index):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def _entry_path(self, entry):
+        return os.path.join(self.cache_dir, entry['file'])
+
+    def _is_valid(self, entry):
+        path = self._entry_path(entry)
+        return os.path.exists(path) and os.path.getsize(path) == entry.get('size', -1)
+
+    def _touch(self, key, **updates):
+        with self._file_lock('index'):
+            index = self._load_index()
+            if key in index:
+                index[key]['last_access'] = time.time()
+                index[key].update(updates)
+                self._save_index(index)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def lookup(self, key, validator=None):
+        """
+        Returns the cached path or None.
+        Entries older than max_age are re-validated with validator(entry) -> bool
+        (e.g. an ETag/Content-Length HEAD check). Without a validator they expire.
+        """
+        with self._file_lock('index'):
+            entry = self._load_index().get(key)
+        if not entry or not self._is_valid(entry):
+            return None
+
+        if time.time() - entry.get('fetched_at', 0) > self.max_age:
+            try:
+                still_fresh = validator(entry) if validator else False
+            except Exception as e:
+                print(f"⚠️ Asset revalidation failed ({e}). Using cached copy.")
+                still_fresh = True  # Offline? Stale beats nothing.
+            if not still_fresh:
+                return None
+            self._touch(key, fetched_at=time.time())
+        else:
+            self._touch(key)
+
+        return self._entry_path(entry)
+
+    def fetch(self, key, source, downloader, suffix='', validator=None):
+        """
+        Returns a local path for `key`, downloading via downloader(tmp_path) on a miss.
+        Returns None if the download failed.
+        """
+        path = self.lookup(key, validator)
+        if path:
+            print(f"   ⚡ Asset cache HIT: {os.path.basename(path)}")
+            return path
+
+        # Per-key lock: a second worker waiting here re-checks after the first finishes
+        with self._file_lock(key):
+            path = self.lookup(key, validator)
+            if path:
+                print(f"   ⚡ Asset cache HIT (fetched by another worker): {os.path.basename(path)}")
+                return path
+
+            filename = f"{key}{suffix}"
+            final_path = os.path.join(self.cache_dir, filename)
+            # Deterministic name (we hold the key lock) so a resumable downloader
+            # can pick up its own '<tmp>.part' after a crash
+            tmp_path = f"{final_path}.download"
+
+            try:
+                result = downloader(tmp_path)
+                if not result or not os.path.exists(tmp_path):
+                    return None
+                os.replace(tmp_path, final_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            meta = result if isinstance(result, dict) else {}
+            now = time.time()
+            with self._file_lock('index'):
+                index = self._load_index()
+                index[key] = {
+                    'file': filename,
+                    'source': source,
+                    'size': os.path.getsize(final_path),
+                    'etag': meta.get('etag'),
+                    'last_modified': meta.get('last_modified'),
+                    'fetched_at': now,
+                    'last_access': now
+                }
+                self._evict(index, keep=key)
+                self._save_index(index)
+
+            print(f"   💾 Asset cached: {filename} ({os.path.getsize(final_path) / 1024**2:.1f} MB)")
+            return final_path
+
+    def _evict(self, index, keep=None):
+        """LRU eviction by total bytes. Caller holds the index lock."""
+        total = sum(e.get('size', 0) for e in index.values())
+        if total <= self.max_bytes:
+            return
+
+        now = time.time()
+        for key, entry in sorted(index.items(), key=lambda kv: kv[1].get('last_access', 0)):
+            if total <= self.max_bytes: break
+            if key == keep or now - entry.get('last_access', 0) < self.IN_USE_GRACE:
+                continue
+            try:
+                os.remove(self._entry_path(entry))
+            except OSError:
+                pass
+            total -= entry.get('size', 0)
+            del index[key]
+            print(f"   🧹 Asset cache evicted: {entry['file']}")
+
+    def is_cached_path(self, path):
+        """True if `path` lives inside the cache (callers must not delete it)."""
+        return bool(path) and os.path.abspath(path).startswith(os.path.abspath(self.cache_dir) + os.sep)
+
+class _NullContext:
+    def __enter__(self): return self
+    def __exit__(self, *args): return False
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+File: batch_pipeline.py
+Staged batch pipeline for main_shorts_generator.
+Rows flow through bounded queues: fetch -> extract -> script -> render -> status,
+so row N+1's downloads and Gemini call overlap row N's render.
+The script stage can run several threads (one per Gemini key by default).
+"""
+
+import time
+import queue
+import threading
+
+import main_shorts_generator as msg
+
+_STOP = object()  # Sentinel passed down the stages on shutdown
+
+class ShortsPipeline:
+    """
+    One thread per stage, connected by bounded queues (back-pressure keeps
+    at most QUEUE_SIZE rows waiting in front of each stage).
+    The status stage runs on the caller's thread, so Sheets writes stay serial.
+    """
+
+    def __init__(self, engine, gemini, on_result, queue_size=2, script_workers=1, batcher_factory=None):
+        """
+        Args:
+            engine: ShortsEngine used by the render stage
+            gemini: GeminiManager used by the script stage
+            on_result: Callback(row_num, success, meta_data) for the status stage
+            queue_size: Max rows buffered between two stages
+            script_workers: Concurrent Gemini calls (the key pool spreads them over keys)
+            batcher_factory: Optional callable(gemini) -> ScriptBatcher (many scripts per request)
+        """
+        self.engine = engine
+        self.gemini = gemini
+        self.on_result = on_result
+        self.queue_size = max(1, int(queue_size))
+        script_workers = max(1, int(script_workers))
+        self.batcher = batcher_factory(gemini) if batcher_factory else None
+
+        # (name, function, threads) - voice synthesis happens inside the template, i.e. the render stage
+        self.stages = [
+            ('fetch', msg.fetch_row_assets, 1),
+            ('extract', msg.extract_row_text, 1),
+            ('script', lambda job: msg.generate_row_script(self.gemini, job, self.batcher), script_workers),
+            ('render', self._render, 1),
+        ]
+
+    def _render(self, job):
+        job['result'] = msg.render_row(self.engine, job)
+
+    def _stage_worker(self, name, func, in_q, out_q, siblings):
+        while True:
+            job = in_q.get()
+            if job is _STOP:
+                # Let the other threads of this stage see it; the last one forwards it
+                in_q.put(_STOP)
+                with siblings['lock']:
+                    siblings['alive'] -= 1
+                    last = siblings['alive'] == 0
+                if last:
+                    out_q.put(_STOP)
+                break
+
+            # Failed rows skip straight through to the status stage
+            if job.get('error') is None:
+                t0 = time.time()
+                try:
+                    func(job)
+                except Exception as e:
+                    print(f"❌ [{name}] Row {job['row_num']} error: {e}")
+                    job['error'] = e
+                job['timings'][name] = time.time() - t0
+
+            out_q.put(job)
+
+    def _feed(self, pending, out_q):
+        for row_num, row in pending:
+            job = msg.new_row_job(row, row_num)
+            if job is None:
+                job = {'row_num': row_num, 'skipped': True, 'temp_pdf': '', 'temp_vid': ''}
+            job.setdefault('error', None)
+            job['timings'] = {}
+            print(f"\n📥 Queued Row {row_num} [ID: {job.get('vid_id', '-')}]")
+            out_q.put(job)
+        out_q.put(_STOP)
+
+    def run(self, pending):
+        """
+        Processes [(row_num, row)] through the pipeline.
+
+        Returns:
+            Number of rows that reached the status stage
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        threads = [threading.Thread(target=self._feed, args=(pending, queues[0]), daemon=True)]
+        for i, (name, func, count) in enumerate(self.stages):
+            siblings = {'lock': threading.Lock(), 'alive': count}
+            for w in range(count):
+                threads.append(threading.Thread(
+                    target=self._stage_worker, args=(name, func, queues[i], queues[i + 1], siblings),
+                    name=f"pipeline-{name}-{w}", daemon=True
+                ))
+
+        print(f"🔀 Pipeline: {len(pending)} rows through {' -> '.join(n for n, _, _ in self.stages)} -> status")
+        batch_start = time.time()
+        for t in threads: t.start()
+
+        processed = 0
+        status_q = queues[-1]
+        while True:
+            job = status_q.get()
+            if job is _STOP: break
+
+            if job.get('skipped'):
+                success, meta_data = False, {"status": "Skipped: Column N empty"}
+            elif job['error'] is not None:
+                success, meta_data = False, msg.failure_meta(job['error'])
+            else:
+                success, meta_data = job['result']
+
+            try:
+                self.on_result(job['row_num'], success, meta_data)
+            finally:
+                if not job.get('skipped'):
+                    msg.cleanup_row_job(job)
+
+            stage_times = ", ".join(f"{k}={v:.1f}s" for k, v in job['timings'].items())
+            print(f"   ⏱️  Row {job['row_num']} stages: {stage_times or 'n/a'}")
+            processed += 1
+
+        for t in threads: t.join()
+        print(f"🔀 Pipeline finished in {time.time() - batch_start:.1f}s")
+        return processed
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+File: chunk_selector.py
+Picks the source passages that go into a Gemini prompt instead of blindly
+sending the first 8000 characters of a chapter.
+- Splits chapter text into ~paragraph sized chunks.
+- Ranks them with BM25 (NumPy, vectorized) against per-template cue words,
+  plus an information-density score (numbers, dates, names, rare terms).
+- Penalizes chunks already used by OTHER rows of the same chapter, so
+  consecutive shorts draw on different parts of the book.
+- Greedily fills a token budget and returns the chunks in document order.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CHARS_PER_TOKEN = 4  # Rough estimate for English prose
+
+STOPWORDS = set("""
+a an the and or but if of to in on at by for with from as is are was were be been being
+this that these those it its they them their we our you your he she his her which who whom
+what when where why how not no so than then there here can could will would shall should may
+might must do does did done has have had also into about over under such each other more most
+some any all only very same both between through during before after above below up down out
+""".split())
+
+# Words that signal the kind of detail each template asks Gemini to find
+TEMPLATE_CUES = {
+    'quiz': ("except exception however unlike only first called known named discovered year "
+             "century date invented founded defined difference compared whereas although"),
+    'fact': ("surprising largest smallest fastest highest lowest percent million billion "
+             "discovered only unique record rare actually myth believed nearly approximately"),
+    'tip': ("formula equation law rule steps types classified classification list stages "
+            "order remember property properties method process units principle sequence"),
+}
+
+def tokenize(text):
+    return [w for w in re.findall(r"[a-z][a-z0-9]+", text.lower()) if w not in STOPWORDS]
+
+def split_chunks(text, target_chars=600):
+    """
+    Groups lines into chunks of roughly target_chars, preferring to break
+    after a line that ends a sentence. (PDF text has one line per visual line.)
+    """
+    chunks, current, size = [], [], 0
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        current.append(line)
+        size += len(line) + 1
+        ends_sentence = line.endswith(('.', '?', '!', ':'))
+        if size >= target_chars * 1.5 or (size >= target_chars and ends_sentence):
+            chunks.append(' '.join(current))
+            current, size = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def chunk_id(chunk):
+    return hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]
+
+class ChunkSelector:
+    """
+    Usage:
+        selector = ChunkSelector('cache/chunk_usage.json', token_budget=1500)
+        text = selector.select(pdf_text, 'quiz', chapter_key=pdf_hash, row_key='12:abc')
+    """
+
+    def __init__(self, history_file='cache/chunk_usage.json', token_budget=1500,
+                 chunk_chars=600, k1=1.5, b=0.75, reuse_penalty=0.5, recency_hours=72):
+        """
+        Args:
+            history_file: JSON record of chunk usage per chapter
+            token_budget: Max source tokens per prompt (~4 chars per token)
+            chunk_chars: Target chunk size in characters
+            reuse_penalty: Score multiplier per earlier use by another row
+            recency_hours: Uses older than this count progressively less
+        """
+        self.history_file = history_file
+        self.token_budget = int(token_budget)
+        self.chunk_chars = int(chunk_chars)
+        self.k1 = k1
+        self.b = b
+        self.reuse_penalty = reuse_penalty
+        self.recency = float(recency_hours) * 3600
+        self.lock = threading.RLock()
+        folder = os.path.dirname(history_file)
+        if folder: os.makedirs(folder, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _bm25(self, chunk_tokens, query_tokens):
+        """Returns (bm25 scores vs query, mean idf of each chunk's terms)."""
+        vocab = {}
+        rows, cols = [], []
+        for i, toks in enumerate(chunk_tokens):
+            for t in toks:
+                rows.append(i)
+                cols.append(vocab.setdefault(t, len(vocab)))
+
+        n = len(chunk_tokens)
+        tf = np.zeros((n, max(len(vocab), 1)), dtype=np.float32)
+        if rows:
+            np.add.at(tf, (np.array(rows), np.array(cols)), 1.0)
+
+        doc_len = tf.sum(axis=1)
+        avg_len = max(float(doc_len.mean()), 1.0)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        weighted = tf * (self.k1 + 1) / (tf + norm[:, None])
+
+        q_cols = [vocab[t] for t in set(query_tokens) if t in vocab]
+        if q_cols:
+            bm25 = (weighted[:, q_cols] * idf[q_cols]).sum(axis=1)
+        else:
+            bm25 = np.zeros(n, dtype=np.float32)
+
+        # Rare-term density: chunks full of chapter-specific vocabulary
+        presence = (tf > 0).astype(np.float32)
+        rarity = (presence * idf).sum(axis=1) / np.maximum(presence.sum(axis=1), 1.0)
+        return bm25, rarity
+
+    @staticmethod
+    def _detail_density(chunks):
+        """Numbers, years and capitalised names per 100 characters."""
+        counts = np.array([
+            len(re.findall(r"\b\d[\d.,]*\b", c)) + len(re.findall(r"(?<=[a-z,] )[A-Z][a-z]+", c))
+            for c in chunks
+        ], dtype=np.float32)
+        lengths = np.array([max(len(c), 1) for c in chunks], dtype=np.float32)
+        return counts * 100.0 / lengths
+
+    @staticmethod
+    def _scale(x):
+        span = float(x.max() - x.min()) if len(x) else 0.0
+        return (x - x.min()) / span if span > 0 else np.zeros_like(x)
+
+    def rank(self, chunks, template='quiz', usage=None, row_key=None):
+        """Final score per chunk (higher is better)."""
+        chunk_tokens = [tokenize(c) for c in chunks]
+        # A batch prompt serves several templates: query with all their cues
+        templates = [template] if isinstance(template, str) else list(template)
+        query = tokenize(' '.join(TEMPLATE_CUES.get(t, '') for t in templates))
+        bm25, rarity = self._bm25(chunk_tokens, query)
+
+        score = (0.5 * self._scale(bm25)
+                 + 0.3 * self._scale(rarity)
+                 + 0.2 * self._scale(self._detail_density(chunks)))
+
+        # Too short to carry a real detail (headers, page numbers, captions)
+        lengths = np.array([len(t) for t in chunk_tokens], dtype=np.float32)
+        score *= np.clip(lengths / 20.0, 0.1, 1.0)
+
+        if usage:
+            now = time.time()
+            penalty = np.ones(len(chunks), dtype=np.float32)
+            for i, c in enumerate(chunks):
+                entry = usage.get(chunk_id(c))
+                if not entry: continue
+                # Uses by this same row don't count: a retry should rebuild the same prompt
+                for rk, ts in entry.items():
+                    if rk == row_key: continue
+                    age_weight = 1.0 / (1.0 + max(now - ts, 0) / self.recency)
+                    penalty[i] *= 1.0 - (1.0 - self.reuse_penalty) * age_weight
+            score *= penalty
+        return score
+
+    # ------------------------------------------------------------------
+    # Usage history
+    # ------------------------------------------------------------------
+
+    def _locked_history(self, update=None):
+        """Reads the history (and applies update(history) under the file lock)."""
+        with self.lock:
+            with open(self.history_file + '.lock', 'a') as fh:
+                if fcntl: fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    history = {}
+                    if os.path.exists(self.history_file):
+                        try:
+                            with open(self.history_file, 'r') as f:
+                                history = json.load(f)
+                        except Exception:
+                            print("⚠️ Chunk usage history unreadable. Starting fresh.")
+                    if update:
+                        update(history)
+                        tmp = f"{self.history_file}.{os.getpid()}.tmp"
+                        with open(tmp, 'w') as f:
+                            json.dump(history, f)
+                        os.replace(tmp, self.history_file)
+                    return history
+                finally:
+                    if fcntl: fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _record(self, chapter_key, row_key, ids):
+        now = time.time()
+        def update(history):
+            chapter = history.setdefault(chapter_key, {})
+            for cid in ids:
+                chapter.setdefault(cid, {})[row_key] = now
+        self._locked_history(update)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def select(self, pdf_text, template='quiz', chapter_key=None, row_key=None):
+        """
+        Returns the selected passages (document order) within the token budget.
+        Usage is recorded when chapter_key is given.
+        """
+        chunks = split_chunks(pdf_text, self.chunk_chars)
+        budget_chars = self.token_budget * CHARS_PER_TOKEN
+        if sum(len(c) + 2 for c in chunks) <= budget_chars:
+            return '\n\n'.join(chunks)
+
+        usage = self._locked_history().get(chapter_key, {}) if chapter_key else {}
+        scores = self.rank(chunks, template, usage, row_key)
+
+        chosen, used = [], 0
+        for i in np.argsort(-scores, kind='stable'):
+            size = len(chunks[i]) + 2
+            if used + size > budget_chars: continue
+            chosen.append(int(i))
+            used += size
+            if budget_chars - used < self.chunk_chars // 4: break
+
+        chosen.sort()
+        if chapter_key and row_key:
+            self._record(chapter_key, row_key, [chunk_id(chunks[i]) for i in chosen])
+
+        print(f"   🧩 Source: {len(chosen)}/{len(chunks)} chunks, ~{used // CHARS_PER_TOKEN} tokens")
+        return '\n\n'.join(chunks[i] for i in chosen)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+File: gemini_cache.py
+On-disk cache for Gemini script responses.
+- Keyed by (prompt hash, model, template, temperature).
+- TTL and total-size eviction (least recently used first).
+- Modes: 'off' (always call the API), 'read_write' (default), 'replay' (never
+  touch the network; a miss is an error - for re-renders and offline tests).
+- Per-request locks so identical in-flight requests (pipeline threads) call
+  the API once.
+Also provides StubGenerativeModel, a local stand-in for genai.GenerativeModel.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+MODES = ('off', 'read_write', 'replay')
+
+class ReplayCacheMiss(Exception):
+    """Raised in replay mode when a prompt has no cached response."""
+    pass
+
+class GeminiResponseCache:
+    """
+    Usage:
+        cache = GeminiResponseCache('cache/gemini', mode='read_write')
+        key = cache.key(prompt, 'gemini-2.5-flash', 'quiz', 0.9)
+        text = cache.get(key)
+        if text is None:
+            text = call_api()
+            cache.put(key, text, model='gemini-2.5-flash', template='quiz')
+    """
+
+    def __init__(self, cache_dir='cache/gemini', mode='read_write', ttl_hours=720, max_size_mb=200):
+        if mode not in MODES:
+            raise ValueError(f"Unknown Gemini cache mode '{mode}' (expected one of {MODES})")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.ttl = float(ttl_hours) * 3600
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._locks = {}   # request key -> [Lock, holders + waiters]
+        self._locks_guard = threading.Lock()
+        if mode != 'off':
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    @staticmethod
+    def key(prompt, model, template, temperature):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        raw = json.dumps([prompt_hash, model, template, round(float(temperature), 3)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:40]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    @contextmanager
+    def request_lock(self, prompt, template, temperature):
+        """
+        Held while a request runs; identical requests (same prompt/template/
+        temperature) wait for it. The entry is dropped once nobody holds or
+        waits for it, so the table only ever holds in-flight requests.
+
+        Usage:
+            with cache.request_lock(prompt, 'quiz', 0.9):
+                ...
+        """
+        lock_key = self.key(prompt, '*', template, temperature)
+        with self._locks_guard:
+            entry = self._locks.get(lock_key)
+            if entry is None:
+                entry = self._locks[lock_key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[lock_key]
+
+    def get(self, key):
+        """Cached response text, or None on a miss / expired entry."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.mode != 'replay' and time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        os.utime(path, None)  # mtime doubles as last-access time for LRU eviction
+        self.hits += 1
+        return entry['text']
+
+    def put(self, key, text, **meta):
+        if not self.enabled:
+            return
+        entry = dict(meta, created=time.time(), text=text)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones until under max size."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'): continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            expired = now - mtime > self.ttl
+            if not expired and total <= self.max_bytes: break
+            self._remove(path)
+            total -= size
+
+# ============================================================================
+# STUB MODEL (local testing without network / quota)
+# ============================================================================
+
+STUB_SCRIPTS = {
+    'quiz': {
+        "filename_slug": "stub", "hook_spoken": "Only toppers get this one right!",
+        "question_visual": "Which gas do plants release?", "question_spoken": "Which gas do plants release",
+        "opt_a_visual": "O₂", "opt_a_spoken": "O two", "opt_b_visual": "CO₂", "opt_b_spoken": "C O two",
+        "opt_c_visual": "N₂", "opt_c_spoken": "N two", "opt_d_visual": "H₂", "opt_d_spoken": "H two",
+        "correct_opt": "A", "explanation_visual": "Photosynthesis releases O₂",
+        "explanation_spoken": "Plants take in carbon dioxide and release oxygen during photosynthesis.",
+        "cta_spoken": "Subscribe for more. Full chapter recap in the link below."
+    },
+    'fact': {
+        "filename_slug": "stub", "hook_spoken": "Bet you did not know this!",
+        "fact_title": "Leaves Breathe Too", "fact_visual": "Stomata open and close to exchange gases",
+        "fact_spoken": "Tiny pores called stomata open and close to let gases in and out of a leaf.",
+        "cta_spoken": "Like and share. Check the link for a full chapter recap."
+    },
+    'tip': {
+        "filename_slug": "stub", "hook_spoken": "Struggling with this formula?",
+        "tip_title": "Photosynthesis Equation", "tip_visual": "6CO₂ + 6H₂O → C₆H₁₂O₆ + 6O₂",
+        "tip_spoken": "Remember six six one six. Six carbon dioxide plus six water gives one glucose and six oxygen.",
+        "bonus": "Light is the energy source.", "cta_spoken": "Subscribe now. Full video below."
+    },
+}
+
+class _StubPart:
+    def __init__(self, text):
+        self.text = text
+
+class _StubContent:
+    def __init__(self, text):
+        self.parts = [_StubPart(text)]
+
+class _StubCandidate:
+    def __init__(self, text):
+        self.content = _StubContent(text)
+        self.finish_reason = 'STOP'
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [_StubCandidate(text)]
+
+class StubGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel(model_name) that answers locally.
+    The template is detected from the prompt's TASK line.
+
+    Usage:
+        model = StubGenerativeModel('gemini-2.5-flash', latency=0.0)
+        res = model.generate_content(prompt)
+        res.text  # '```json {...} ```'
+    """
+
+    calls = 0  # Class-wide counter so tests can assert how often the "API" was hit
+
+    def __init__(self, model_name, latency=0.0):
+        self.model_name = model_name
+        self.latency = latency
+
+    def generate_content(self, prompt, generation_config=None, safety_settings=None):
+        StubGenerativeModel.calls += 1
+        if self.latency: time.sleep(self.latency)
+
+        if 'BATCH MODE' in prompt:
+            # Order list: "1. QUIZ script", "2. FACT script", ...
+            order = re.findall(r"^\s*\d+\. (QUIZ|FACT|TIP) script", prompt, re.M)
+            payload = [dict(STUB_SCRIPTS[t.lower()], template=t.lower()) for t in order]
+        elif 'QUIZ Short' in prompt: payload = STUB_SCRIPTS['quiz']
+        elif 'FACT Short' in prompt: payload = STUB_SCRIPTS['fact']
+        else: payload = STUB_SCRIPTS['tip']
+        return _StubResponse("```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+File: gemini_key_pool.py
+Thread-safe pool of Gemini API keys.
+- Token bucket per key (requests per minute + burst).
+- Cooldown with exponential backoff after a 429 / quota error.
+- Keys that are rejected outright (invalid / permission denied) are disabled.
+- acquire() hands out the least-loaded key that has a token, blocking until
+  one is available, so N keys give ~N times the request throughput.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+class KeysExhausted(Exception):
+    """Every key in the pool is disabled."""
+    pass
+
+class TokenBucket:
+    """Classic token bucket. Not thread-safe on its own (the pool holds a lock)."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = float(rate_per_minute) / 60.0   # tokens per second
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """Seconds until one token is available (0 if available now)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1.0 or self.rate <= 0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1.0
+
+class PooledKey:
+    def __init__(self, api_key, index, bucket):
+        self.api_key = api_key
+        self.index = index
+        self.bucket = bucket
+        self.cooldown_until = 0.0
+        self.strikes = 0        # Consecutive rate-limit hits (drives the backoff)
+        self.in_flight = 0
+        self.disabled = False
+        self.requests = 0
+
+    @property
+    def label(self):
+        return f"key#{self.index + 1}"
+
+class GeminiKeyPool:
+    """
+    Usage:
+        pool = GeminiKeyPool(keys, requests_per_minute=10, burst=2)
+        with pool.acquire() as key:
+            try:
+                call_api(key.api_key)
+            except RateLimitError:
+                pool.mark_rate_limited(key)
+                raise
+    """
+
+    def __init__(self, keys, requests_per_minute=10, burst=2, cooldown_seconds=60, max_cooldown_seconds=900):
+        if not keys:
+            raise KeysExhausted("No Gemini keys configured")
+        self.keys = [PooledKey(k, i, TokenBucket(requests_per_minute, burst)) for i, k in enumerate(keys)]
+        self.cooldown = float(cooldown_seconds)
+        self.max_cooldown = float(max_cooldown_seconds)
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _pick(self, now):
+        """Returns (key, 0) if one is usable now, else (None, seconds_to_wait)."""
+        best, best_wait = None, None
+        for k in self.keys:
+            if k.disabled: continue
+            wait = max(k.cooldown_until - now, k.bucket.wait_time(now))
+            # Prefer ready keys, then fewest in-flight requests, then lowest index
+            rank = (wait, k.in_flight, k.index)
+            if best is None or rank < best_wait:
+                best, best_wait = k, rank
+        if best is None:
+            raise KeysExhausted("All Gemini keys exhausted")
+        return (best, 0.0) if best_wait[0] <= 0 else (None, best_wait[0])
+
+    @contextmanager
+    def acquire(self, timeout=600):
+        """Blocks until a key has a free token (or timeout), then yields it."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                key, wait = self._pick(now)
+                if key: break
+                if now + wait > deadline:
+                    raise TimeoutError(f"No Gemini key available within {timeout}s")
+                self.cond.wait(timeout=min(wait, 5.0))
+            key.bucket.take(now)
+            key.in_flight += 1
+            key.requests += 1
+        try:
+            yield key
+        finally:
+            with self.cond:
+                key.in_flight -= 1
+                self.cond.notify_all()
+
+    def has_spare(self):
+        """True if a key could start a request right now (no waiting for a token or cooldown)."""
+        with self.cond:
+            try:
+                key, _ = self._pick(time.monotonic())
+            except KeysExhausted:
+                return False
+            return key is not None
+
+    def mark_rate_limited(self, key, retry_after=None):
+        """429 / quota: cool the key down (exponential backoff on repeated hits)."""
+        with self.cond:
+            key.strikes += 1
+            delay = retry_after or min(self.cooldown * (2 ** (key.strikes - 1)), self.max_cooldown)
+            key.cooldown_until = time.monotonic() + delay
+            key.bucket.tokens = 0.0
+            print(f"   🧊 Gemini {key.label} rate limited. Cooling down {delay:.0f}s")
+            self.cond.notify_all()
+
+    def mark_success(self, key):
+        with self.cond:
+            key.strikes = 0
+
+    def disable(self, key, reason=''):
+        with self.cond:
+            key.disabled = True
+            print(f"   ⛔ Gemini {key.label} disabled {reason}".rstrip())
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {k.label: {'requests': k.requests, 'disabled': k.disabled,
+                              'cooling': max(0.0, k.cooldown_until - time.monotonic())}
+                    for k in self.keys}
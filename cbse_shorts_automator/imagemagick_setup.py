@@ -3,12 +3,24 @@
 File: imagemagick_setup.py
 ImageMagick configuration for MoviePy
 This MUST be imported before any MoviePy imports
+Optional when TEXT_RENDERER.BACKEND is 'pillow' (text is rasterized in-process).
 """
 
 import os
 import sys
+import json
 import shutil
 
+CONFIG_PATH = 'config/generator_config.json'
+
+def text_backend():
+    """TEXT_RENDERER.BACKEND from the generator config ('imagemagick' if unset)."""
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f).get('TEXT_RENDERER', {}).get('BACKEND', 'imagemagick')
+    except (OSError, ValueError):
+        return 'imagemagick'
+
 def setup_imagemagick():
     """Setup ImageMagick binary for MoviePy"""
     
@@ -21,8 +33,12 @@ def setup_imagemagick():
             im_binary = "/usr/local/bin/convert"
     
     if not im_binary:
+        if text_backend() == 'pillow':
+            print("⚠️ ImageMagick not found. Using the Pillow text renderer only.")
+            return None
         print("❌ CRITICAL: ImageMagick not found.")
         print("   Please install: sudo apt-get install imagemagick")
+        print("   (or set TEXT_RENDERER.BACKEND to 'pillow' in the config)")
         sys.exit(1)
     
     # Set environment variable
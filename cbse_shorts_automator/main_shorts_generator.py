@@ -14,9 +14,16 @@ import json
 import time
 import re
 import requests
-import fitz
 import random
 import gc 
+import multiprocessing
+import threading
+import asyncio
+import functools
+import hashlib
+import shutil
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 
 #from google.auth.transport.requests import Request
 import google.auth.transport.requests
@@ -24,10 +31,19 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 
 from shorts_engine import ShortsEngine, generate_random_config
+from render_host import RenderHost
 from voice_manager import VoiceManager
 from prompt_manager import PromptManager  # <--- NEW IMPORT
+from sheet_writer import BufferedSheetWriter
+from asset_cache import AssetCache
+from resumable_download import ResumableDownloader
+from pdf_text_cache import PDFTextCache
+from chunk_selector import ChunkSelector
+from gemini_cache import GeminiResponseCache, ReplayCacheMiss, StubGenerativeModel
+from gemini_key_pool import GeminiKeyPool, KeysExhausted
 
 CONFIG_FILE = "config/generator_config.json"
 
@@ -148,22 +164,240 @@ def get_col_letter(n):
         n = n // 26 - 1
     return s
 
+def create_chunk_selector():
+    """ChunkSelector from CONFIG['CHUNK_SELECTION'], or None when disabled."""
+    cfg = CONFIG.get('CHUNK_SELECTION', {})
+    if not cfg.get('ENABLED', False):
+        return None
+    return ChunkSelector(
+        history_file=cfg.get('HISTORY_FILE', 'cache/chunk_usage.json'),
+        token_budget=cfg.get('TOKEN_BUDGET', 1500),
+        chunk_chars=cfg.get('CHUNK_CHARS', 600)
+    )
+
+def create_gemini_cache():
+    """GeminiResponseCache from CONFIG['GEMINI_CACHE'] (mode 'off' disables it)."""
+    cfg = CONFIG.get('GEMINI_CACHE', {})
+    return GeminiResponseCache(
+        cache_dir=cfg.get('DIR', 'cache/gemini'),
+        mode=cfg.get('MODE', 'off'),
+        ttl_hours=cfg.get('TTL_HOURS', 720),
+        max_size_mb=cfg.get('MAX_SIZE_MB', 200)
+    )
+
+def is_rate_limit_error(e):
+    return "429" in str(e) or "quota" in str(e).lower() or "resource exhausted" in str(e).lower()
+
+def is_bad_key_error(e):
+    msg = str(e).lower()
+    return "api key not valid" in msg or "api_key_invalid" in msg or "permission denied" in msg
+
+class KeyedGenerativeModel:
+    """
+    genai.GenerativeModel stand-in that sends through its own per-key
+    GenerativeServiceClient (public generativelanguage API), so concurrent
+    requests on different keys never touch genai.configure's global client.
+
+    Usage:
+        client = glm.GenerativeServiceClient(client_options={'api_key': key})
+        res = KeyedGenerativeModel('gemini-2.5-flash', client).generate_content(prompt)
+        res.text
+    """
+
+    def __init__(self, model_name, client):
+        self.model_name = model_name
+        self.client = client
+
+    def generate_content(self, prompt, generation_config=None, safety_settings=None):
+        request = glm.GenerateContentRequest(
+            model=f"models/{self.model_name}",
+            contents=[glm.Content(role='user', parts=[glm.Part(text=prompt)])],
+            generation_config=glm.GenerationConfig(**(generation_config or {})),
+            safety_settings=[
+                glm.SafetySetting(category=glm.HarmCategory[s['category']],
+                                  threshold=glm.SafetySetting.HarmBlockThreshold[s['threshold']])
+                for s in safety_settings or []
+            ]
+        )
+        return genai.types.GenerateContentResponse.from_response(self.client.generate_content(request))
+
 class GeminiManager:
-    def __init__(self):
-        self.keys = [line.strip() for line in open(CONFIG['GEMINI_KEYS_FILE']) if line.strip()]
-        self.idx = 0
-        self.prompter = PromptManager() # Initialize Prompter
-        self._configure()
-
-    def _configure(self):
-        if self.idx < len(self.keys):
-            genai.configure(api_key=self.keys[self.idx])
+    MODELS = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.0-flash-exp']
+    TEMPERATURE = 0.9
+
+    def __init__(self, use_stub=None, rate_share=1):
+        """
+        Args:
+            use_stub: Answer from StubGenerativeModel instead of the API
+                      (default: CONFIG['GEMINI_CACHE']['USE_STUB'])
+            rate_share: Number of processes sharing the keys (render farm), so
+                        each one only uses its share of the per-key rate limit
+        """
+        if use_stub is None:
+            use_stub = CONFIG.get('GEMINI_CACHE', {}).get('USE_STUB', False)
+        self.use_stub = use_stub
+        if use_stub:
+            keys = ['stub']
         else:
-            raise Exception("All Gemini keys exhausted")
+            keys = [line.strip() for line in open(CONFIG['GEMINI_KEYS_FILE']) if line.strip()]
+
+        pool_cfg = CONFIG.get('GEMINI_POOL', {})
+        self.pool = GeminiKeyPool(
+            keys,
+            requests_per_minute=pool_cfg.get('REQUESTS_PER_MINUTE', 10) / max(1, rate_share),
+            burst=pool_cfg.get('BURST', 2),
+            cooldown_seconds=pool_cfg.get('COOLDOWN_SECONDS', 60)
+        )
+        self.hedge_after = pool_cfg.get('HEDGE_AFTER_SECONDS', 0)
+        self.attempts_per_model = max(1, min(len(self.pool), pool_cfg.get('KEY_ATTEMPTS_PER_MODEL', 3)))
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2 * len(self.pool) + 2,
+                                                              thread_name_prefix="gemini")
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+        self.prompter = PromptManager(selector=create_chunk_selector()) # Initialize Prompter
+        self.cache = create_gemini_cache()
+
+    def _model(self, name, api_key):
+        """Model bound to one key (genai.configure is process-global, not per thread)."""
+        if self.use_stub:
+            return StubGenerativeModel(name)
+        with self._clients_lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+                self._clients[api_key] = client
+        return KeyedGenerativeModel(name, client)
+
+    @staticmethod
+    def _parse_json(text):
+        clean_json = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_json)
+
+    @staticmethod
+    def _parse_script(text):
+        parsed = GeminiManager._parse_json(text)
+        
+        if isinstance(parsed, list) and len(parsed) > 0:
+            return parsed[0]
+        return parsed
+
+    def _cached_script(self, prompt, template, parse=None):
+        """First cached (and still parseable) response across the fallback models."""
+        parse = parse or self._parse_script
+        for m in self.MODELS:
+            text = self.cache.get(self.cache.key(prompt, m, template, self.TEMPERATURE))
+            if text is None: continue
+            try:
+                script = parse(text)
+                print(f"   ⚡ Gemini cache HIT ({m})")
+                return script
+            except ValueError:
+                continue
+        return None
 
-    def get_script(self, pdf_text, class_level=None, template='quiz'):
-        prompt = self.prompter.create_prompt(pdf_text, class_level, template)
+    def _row_identity(self, template, class_level, chapter_key, row_key):
+        """
+        Cache identity for one row's script that survives re-runs: PDF content
+        hash + row + template + class + prompt rules. (The prompt itself is not
+        stable - chunk selection depends on other rows' usage history.)
+        None when the row is unknown.
+        """
+        if not (chapter_key and row_key):
+            return None
+        rules = self.prompter.get_base_context('', class_level) + self.prompter.get_task(template)
+        rules_hash = hashlib.sha256(rules.encode('utf-8')).hexdigest()[:16]
+        return f"row|{chapter_key}|{row_key}|{class_level}|{rules_hash}"
 
+    def cached_row_script(self, template, class_level, chapter_key, row_key):
+        """This row's cached script, or None."""
+        identity = self._row_identity(template, class_level, chapter_key, row_key)
+        return self._cached_script(identity, template) if identity else None
+
+    def get_script(self, pdf_text, class_level=None, template='quiz', chapter_key=None, row_key=None):
+        identity = self._row_identity(template, class_level, chapter_key, row_key)
+        prompt = None
+        if identity is None:
+            prompt = self.prompter.create_prompt(pdf_text, class_level, template, chapter_key, row_key)
+        cache_id = identity or prompt
+
+        script = self._cached_script(cache_id, template)
+        if script is not None:
+            return script
+        if self.cache.mode == 'replay':
+            raise ReplayCacheMiss(f"No cached Gemini response for this {template} prompt (replay mode)")
+
+        # Identical requests in flight (e.g. a retried row) wait for the first one
+        with self.cache.request_lock(cache_id, template, self.TEMPERATURE):
+            script = self._cached_script(cache_id, template)
+            if script is not None:
+                return script
+            if prompt is None:
+                prompt = self.prompter.create_prompt(pdf_text, class_level, template, chapter_key, row_key)
+            return self._generate(prompt, template, cache_id=cache_id)[1]
+
+    async def get_script_async(self, pdf_text, class_level=None, template='quiz', chapter_key=None, row_key=None):
+        """asyncio wrapper: the blocking call runs on the loop's default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(
+            self.get_script, pdf_text, class_level, template, chapter_key, row_key))
+
+    def get_scripts_batch(self, pdf_text, templates, class_level=None, chapter_key=None, row_key=None, row_keys=None):
+        """
+        Generates len(templates) scripts with ONE request (shared source text + rules).
+
+        Args:
+            row_keys: Row key per template; accepted scripts are also cached
+                      per row, so re-rendering one row later needs no request
+
+        Returns:
+            List aligned with templates: the script, or None where the item
+            failed schema validation (callers fall back to get_script for those)
+        """
+        prompt = self.prompter.create_batch_prompt(pdf_text, templates, class_level, chapter_key, row_key)
+        cache_template = "batch:" + ",".join(templates)
+
+        def parse(text):
+            items = self._parse_json(text)
+            if not isinstance(items, list):
+                raise ValueError(f"Batch answer is a {type(items).__name__}, not a JSON array")
+            return items
+
+        model = self.MODELS[0]
+        items = self._cached_script(prompt, cache_template, parse)
+        if items is None:
+            if self.cache.mode == 'replay':
+                raise ReplayCacheMiss(f"No cached Gemini response for batch {cache_template} (replay mode)")
+            with self.cache.request_lock(prompt, cache_template, self.TEMPERATURE):
+                items = self._cached_script(prompt, cache_template, parse)
+                if items is None:
+                    # ~1k output tokens per extra script (thinking models need headroom)
+                    max_tokens = min(4096 + 1024 * (len(templates) - 1), 8192)
+                    model, items = self._generate(prompt, cache_template, parse, max_tokens)
+
+        scripts = []
+        for i, template in enumerate(templates):
+            item = items[i] if i < len(items) else None
+            problems = self.prompter.validate_script(item, template) if item is not None else ["missing from batch"]
+            if problems:
+                print(f"   ⚠️ Batch item {i + 1} ({template}) rejected: {'; '.join(problems)}")
+                item = None
+            identity = self._row_identity(template, class_level, chapter_key, row_keys[i]) if row_keys else None
+            if item is not None and identity:
+                self.cache.put(self.cache.key(identity, model, template, self.TEMPERATURE),
+                               json.dumps(item, ensure_ascii=False),
+                               model=model, template=template, temperature=self.TEMPERATURE)
+            scripts.append(item)
+        print(f"   📦 Batch: {sum(1 for x in scripts if x)}/{len(templates)} scripts from 1 request")
+        return scripts
+
+    def _call_model(self, m, prompt, parse=None, max_output_tokens=4096, cancelled=None):
+        """
+        One request on one model. Rate-limited keys are retried on another key.
+
+        Args:
+            cancelled: threading.Event; once set, no further request is started
+        """
         safety_settings = [
             {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
             {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
@@ -171,36 +405,98 @@ class GeminiManager:
             {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
         ]
 
-        gen_config = genai.types.GenerationConfig(
-            temperature=0.9, 
-            max_output_tokens=4096 
-        )
-        
-        models = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.0-flash-exp']
-        
-        for m in models:
-            try:
-                model = genai.GenerativeModel(m)
-                res = model.generate_content(prompt, generation_config=gen_config, safety_settings=safety_settings)
-                # Check if we have valid parts before accessing .text
-                #if res.candidates[0].content.parts:
-                #    print(res.text)
-                if not res.text:
-                    raise Exception(f"Blocked by filters. Finish Reason: {res.candidates[0].finish_reason}")
-
-                clean_json = res.text.replace("```json", "").replace("```", "").strip()
-                parsed = json.loads(clean_json)
-                
-                if isinstance(parsed, list) and len(parsed) > 0:
-                    return parsed[0]
-                return parsed
-                
-            except Exception as e:
-                print(f"⚠️ Gemini error with {m}: {e}")
-                if "429" in str(e) or "quota" in str(e).lower():
-                    self.idx += 1
-                    self._configure()
-        
+        gen_config = {
+            'temperature': self.TEMPERATURE,
+            'max_output_tokens': max_output_tokens
+        }
+
+        for attempt in range(self.attempts_per_model):
+            if cancelled is not None and cancelled.is_set():
+                raise concurrent.futures.CancelledError()  # Another model already answered
+            with self.pool.acquire() as key:
+                if cancelled is not None and cancelled.is_set():
+                    raise concurrent.futures.CancelledError()  # Answered while we waited for a key
+                try:
+                    model = self._model(m, key.api_key)
+                    res = model.generate_content(prompt, generation_config=gen_config, safety_settings=safety_settings)
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        self.pool.mark_rate_limited(key)
+                        if attempt < self.attempts_per_model - 1: continue
+                    elif is_bad_key_error(e):
+                        self.pool.disable(key, f"({e})")
+                        if attempt < self.attempts_per_model - 1: continue
+                    raise
+                self.pool.mark_success(key)
+
+            # Check if we have valid parts before accessing .text
+            #if res.candidates[0].content.parts:
+            #    print(res.text)
+            if not res.text:
+                raise Exception(f"Blocked by filters. Finish Reason: {res.candidates[0].finish_reason}")
+
+            script = (parse or self._parse_script)(res.text)
+            return m, res.text, script
+
+    def _generate(self, prompt, template, parse=None, max_output_tokens=4096, cache_id=None):
+        """
+        Tries the models in order. With HEDGE_AFTER_SECONDS set, a request to the
+        second model is fired if the first hasn't answered in time and a key has
+        a spare token; the first success wins and the loser is cancelled (if it
+        is still queued or waiting for a key, it never sends its request).
+
+        Args:
+            cache_id: Cache the answer under this identity instead of the prompt
+
+        Returns:
+            (model that answered, parsed script)
+        """
+        cancelled = threading.Event()
+        call = functools.partial(self._call_model, prompt=prompt, parse=parse,
+                                 max_output_tokens=max_output_tokens, cancelled=cancelled)
+        futures = {self.executor.submit(call, self.MODELS[0]): self.MODELS[0]}
+        next_model = 1
+        hedge = self.hedge_after if self.hedge_after and len(self.MODELS) > 1 else None
+
+        try:
+            while futures:
+                done, _ = concurrent.futures.wait(futures, timeout=hedge,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slow: hedge on the next model (only once per request),
+                    # unless every key is busy - the hedge would just queue for a token
+                    hedge = None
+                    if next_model < len(self.MODELS) and self.pool.has_spare():
+                        m = self.MODELS[next_model]
+                        next_model += 1
+                        print(f"   🪁 Gemini slow, hedging with {m}")
+                        futures[self.executor.submit(call, m)] = m
+                    continue
+
+                for future in done:
+                    m = futures.pop(future)
+                    try:
+                        m, text, script = future.result()
+                    except Exception as e:
+                        print(f"⚠️ Gemini error with {m}: {e}")
+                        if isinstance(e, (KeysExhausted, TimeoutError)):
+                            raise
+                        if not futures and next_model < len(self.MODELS):
+                            fallback = self.MODELS[next_model]
+                            next_model += 1
+                            futures[self.executor.submit(call, fallback)] = fallback
+                        continue
+
+                    # Only cache responses that parsed
+                    self.cache.put(self.cache.key(cache_id or prompt, m, template, self.TEMPERATURE), text,
+                                   model=m, template=template, temperature=self.TEMPERATURE)
+                    return m, script
+        finally:
+            # The loser's token / quota is only spent if its request already went out
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+
         raise Exception("Gemini generation failed")
 
 def normalize_filename_part(text, max_len):
@@ -267,127 +563,525 @@ def download_file(url, save_path):
             r = requests.get(url, headers=headers, timeout=20)
             if r.status_code == 200:
                 with open(save_path, 'wb') as f: f.write(r.content)
-                return True
+                # Validators for the asset cache (truthy like the old True return)
+                return {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
         except Exception as e:
             print(f"   ❌ PDF Error: {e}")
     return False
 
+def pdf_still_fresh(entry):
+    """Asset-cache validator: HEAD the PDF URL and compare ETag / size with the cached copy."""
+    r = requests.head(entry['source'], headers={'User-Agent': 'Mozilla/5.0'}, timeout=10, allow_redirects=True)
+    if r.status_code != 200: return False
+    etag = r.headers.get('ETag')
+    if etag and entry.get('etag'): return etag == entry['etag']
+    length = r.headers.get('Content-Length')
+    return length is not None and int(length) == entry.get('size')
+
+_ASSET_CACHE = None
+
+def get_asset_cache():
+    """Process-wide AssetCache, or None if ASSET_CACHE is disabled."""
+    global _ASSET_CACHE
+    cache_cfg = CONFIG.get('ASSET_CACHE', {})
+    if not cache_cfg.get('ENABLED', False): return None
+    if _ASSET_CACHE is None:
+        _ASSET_CACHE = AssetCache(
+            cache_dir=cache_cfg.get('DIR', 'cache/assets'),
+            max_bytes=int(cache_cfg.get('MAX_SIZE_GB', 20) * 1024**3),
+            max_age_hours=cache_cfg.get('MAX_AGE_HOURS', 168)
+        )
+    return _ASSET_CACHE
+
+def extract_drive_file_id(url):
+    patterns = [r'/d/([a-zA-Z0-9_-]+)', r'id=([a-zA-Z0-9_-]+)']
+    for p in patterns:
+        match = re.search(p, url)
+        if match: return match.group(1)
+    return None
+
 def download_drive_video(url, output_path):
+    """
+    Streams a Drive video with HTTP Range resume from '<output_path>.part',
+    adaptive chunk sizes and a size check before the atomic rename.
+    """
     try:
         print(f"⬇️ Downloading Video...")
-        patterns = [r'/d/([a-zA-Z0-9_-]+)', r'id=([a-zA-Z0-9_-]+)']
-        file_id = None
-        for p in patterns:
-            match = re.search(p, url)
-            if match:
-                file_id = match.group(1)
-                break
+        file_id = extract_drive_file_id(url)
         if not file_id: return False
 
         DL_URL = "https://drive.google.com/uc?export=download"
         session = requests.Session()
-        response = session.get(DL_URL, params={'id': file_id}, stream=True)
-        token = None
-        for key, value in response.cookies.items():
-            if key.startswith('download_warning'):
-                token = value
-                break
-        if token:
-            response = session.get(DL_URL, params={'id': file_id, 'confirm': token}, stream=True)
-        if response.status_code == 200:
-            with open(output_path, "wb") as f:
-                for chunk in response.iter_content(32768):
-                    if chunk: f.write(chunk)
-            return True
+        params = {'id': file_id}
+        
+        # Large files answer with a virus-scan warning + confirm cookie first
+        with session.get(DL_URL, params=params, stream=True, timeout=(10, 60)) as response:
+            for key, value in response.cookies.items():
+                if key.startswith('download_warning'):
+                    params['confirm'] = value
+                    break
+        
+        downloader = ResumableDownloader(
+            session=session,
+            max_retries=CONFIG.get('API_RETRY_ATTEMPTS', 3) + 2
+        )
+        downloader.download(DL_URL, output_path, params=params)
+        return True
+    except Exception as e:
+        print(f"   ❌ Video Error: {e}")
         return False
-    except Exception: return False
 
-def process_row(engine, gemini, row, row_idx):
+# ============================================================================
+# ROW STAGES
+# process_row() runs these back-to-back; batch_pipeline.py overlaps them
+# across rows. Each stage reads/writes the shared 'job' dict.
+# ============================================================================
+
+def new_row_job(row, row_idx):
+    """Builds the per-row job dict. Returns None if the row has no ID (Column N)."""
     def get_c(i): return row[i].strip() if len(row) > i else ""
     
     vid_id = get_c(COL_IDX_ID)
-    chapter_title = get_c(COL_IDX_CHAPTER)
-    video_title = get_c(COL_IDX_TOPIC)
-    pdf_url = get_c(COL_IDX_PDF)
-    vid_url = get_c(COL_IDX_VIDEO)
+    if not vid_id: return None
     
-    if not vid_id: return False, {"status": "Skipped: Column N empty"}
+    return {
+        'row_num': row_idx,
+        'vid_id': vid_id,
+        'chapter_title': get_c(COL_IDX_CHAPTER),
+        'video_title': get_c(COL_IDX_TOPIC),
+        'pdf_url': get_c(COL_IDX_PDF),
+        'vid_url': get_c(COL_IDX_VIDEO),
+        'class_level': parse_class_level(get_c(COL_IDX_CLASS)),
+        'temp_pdf': os.path.join(DIRS['DOWNLOADS_PDF'], f"t_{vid_id}.pdf"),
+        'temp_vid': os.path.join(DIRS['DOWNLOADS_VID'], f"t_{vid_id}.mp4"),
+    }
+
+def row_key(job):
+    """Stable per-row key (script cache, chunk usage history, config seed)."""
+    return f"{job['row_num']}:{job['vid_id']}"
+
+def fetch_row_assets(job):
+    """Stage 1 (network): chapter PDF + Drive lecture video (via the asset cache when enabled)."""
+    cache = get_asset_cache()
+    if cache is None:
+        if not download_file(job['pdf_url'], job['temp_pdf']): raise Exception("PDF download failed")
+        if not download_drive_video(job['vid_url'], job['temp_vid']): raise Exception("Video download failed")
+        return
     
-    class_str = get_c(COL_IDX_CLASS)
-    class_level = parse_class_level(class_str)
+    pdf_path = cache.fetch(
+        AssetCache.url_key(job['pdf_url']), job['pdf_url'],
+        lambda tmp: download_file(job['pdf_url'], tmp), suffix='.pdf', validator=pdf_still_fresh
+    )
+    if not pdf_path: raise Exception("PDF download failed")
+    job['temp_pdf'] = pdf_path
     
-    print(f"\n🎬 Processing Row {row_idx} [ID: {vid_id}]...")
+    file_id = extract_drive_file_id(job['vid_url'])
+    vid_key = AssetCache.drive_key(file_id) if file_id else AssetCache.url_key(job['vid_url'])
+    vid_path = cache.fetch(
+        vid_key, job['vid_url'],
+        lambda tmp: download_drive_video(job['vid_url'], tmp), suffix='.mp4'
+    )
+    if not vid_path: raise Exception("Video download failed")
+    job['temp_vid'] = vid_path
+
+_PDF_TEXT_CACHE = None
+
+def get_pdf_text_cache():
+    global _PDF_TEXT_CACHE
+    if _PDF_TEXT_CACHE is None:
+        _PDF_TEXT_CACHE = PDFTextCache(CONFIG.get('PDF_TEXT_CACHE', {}).get('DIR', 'cache/pdf_text'))
+    return _PDF_TEXT_CACHE
+
+def extract_row_text(job):
+    """Stage 2 (CPU): PyMuPDF text extraction, cached per PDF content hash."""
+    cache = get_pdf_text_cache()
+    # Only parse as many pages as the prompt can actually use
+    # (the chunk selector ranks passages from a much larger window)
+    selection = CONFIG.get('CHUNK_SELECTION', {})
+    if selection.get('ENABLED', False):
+        max_chars = selection.get('SOURCE_MAX_CHARS', 200000)
+    else:
+        max_chars = PromptManager.MAX_SOURCE_CHARS
+    pdf_text = cache.get_text(job['temp_pdf'], max_chars=max_chars)
     
-    temp_pdf = os.path.join(DIRS['DOWNLOADS_PDF'], f"t_{vid_id}.pdf")
-    temp_vid = os.path.join(DIRS['DOWNLOADS_VID'], f"t_{vid_id}.mp4")
+    if len(pdf_text) < 50: raise Exception("PDF empty")
+    job['pdf_text'] = pdf_text
+    job['pdf_hash'] = cache.content_hash(job['temp_pdf'])
 
-    try:
-        if not download_file(pdf_url, temp_pdf): raise Exception("PDF download failed")
-        
-        doc = fitz.open(temp_pdf)
-        pdf_text = "".join([page.get_text() for page in doc])
-        pdf_text = re.sub(r'\n+', '\n', pdf_text)
-        
-        if len(pdf_text) < 50: raise Exception("PDF empty")
-        
-        if not download_drive_video(vid_url, temp_vid): raise Exception("Video download failed")
-        
-        gen_config = generate_random_config(class_level=class_level)
+class ScriptBatcher:
+    """
+    Generates scripts for several pending rows of the same chapter with one
+    Gemini request and hands them out as those rows reach the script stage.
+    Rows whose batch item was rejected fall back to a single get_script call.
+    """
+
+    def __init__(self, gemini, pending, batch_size=4):
+        """
+        Args:
+            gemini: GeminiManager
+            pending: [(row_num, row)] for the whole run (used to group rows by chapter)
+            batch_size: Max scripts per request
+        """
+        self.gemini = gemini
+        self.batch_size = max(1, int(batch_size))
+        self.lock = threading.Lock()
+        self.chapter_locks = {}
+        self.waiting = {}       # (pdf_url, class_level) -> row_nums not yet batched
+        self.row_chapter = {}   # row_num -> (pdf_url, class_level)
+        self.row_keys = {}      # row_num -> row key (script cache / chunk history / config seed)
+        self.ready = {}         # row_num -> (gen_config, script)
+
+        for row_num, row in pending:
+            job = new_row_job(row, row_num)
+            if job is None: continue
+            key = (job['pdf_url'], job['class_level'])
+            self.waiting.setdefault(key, []).append(row_num)
+            self.row_chapter[row_num] = key
+            self.row_keys[row_num] = row_key(job)
+
+    def take(self, job):
+        """Returns (gen_config, script) for the row, or None (caller generates it alone)."""
+        row_num = job['row_num']
+        key = self.row_chapter.get(row_num)
+        if key is None: return None
+
+        with self.lock:
+            if row_num in self.ready: return self.ready.pop(row_num)
+            chapter_lock = self.chapter_locks.setdefault(key, threading.Lock())
+
+        # Other rows of this chapter wait here while their batch is in flight
+        with chapter_lock:
+            with self.lock:
+                if row_num in self.ready: return self.ready.pop(row_num)
+                waiting = self.waiting.get(key, [])
+                if row_num not in waiting: return None  # Its batch item was rejected
+                candidates = [row_num] + [r for r in waiting if r != row_num]
+
+            # Rows with a cached script (re-renders) don't take a place in the request
+            batch_rows, configs, cached = [], [], {}
+            for r in candidates:
+                if len(batch_rows) >= self.batch_size: break
+                gen_config = generate_random_config(class_level=job['class_level'], seed=self.row_keys[r])
+                script = self.gemini.cached_row_script(gen_config['template'], job['class_level'],
+                                                       job.get('pdf_hash'), self.row_keys[r])
+                if script is not None:
+                    cached[r] = (gen_config, script)
+                else:
+                    batch_rows.append(r)
+                    configs.append(gen_config)
+
+            with self.lock:
+                for r in batch_rows + list(cached): waiting.remove(r)
+                self.ready.update(cached)
+                if len(batch_rows) <= 1:  # Nothing to share the prompt with
+                    if batch_rows and batch_rows[0] != row_num: waiting.append(batch_rows[0])
+                    return self.ready.pop(row_num, None)
+
+            print(f"🤖 Generating {len(batch_rows)} AI scripts in one request (rows {', '.join(map(str, batch_rows))})...")
+            try:
+                scripts = self.gemini.get_scripts_batch(
+                    job['pdf_text'],
+                    [c['template'] for c in configs],
+                    class_level=job['class_level'],
+                    chapter_key=job.get('pdf_hash'),
+                    row_key=self.row_keys[row_num],
+                    row_keys=[self.row_keys[r] for r in batch_rows]
+                )
+            except Exception as e:
+                print(f"⚠️ Batch generation failed ({e}). Falling back to one script per row.")
+                return None
+
+            with self.lock:
+                for r, gen_config, script in zip(batch_rows, configs, scripts):
+                    if script is not None: self.ready[r] = (gen_config, script)
+                return self.ready.pop(row_num, None)
+
+def create_script_batcher(gemini, pending):
+    """ScriptBatcher from CONFIG['SCRIPT_BATCH'], or None when disabled."""
+    cfg = CONFIG.get('SCRIPT_BATCH', {})
+    if not cfg.get('ENABLED', False) or cfg.get('BATCH_SIZE', 4) < 2:
+        return None
+    return ScriptBatcher(gemini, pending, cfg.get('BATCH_SIZE', 4))
+
+def generate_row_script(gemini, job, batcher=None):
+    """Stage 3 (network): pick template config + Gemini script."""
+    planned = batcher.take(job) if batcher else None
+    if planned:
+        gen_config, script = planned
+        print(f"   🎨 Template: {gen_config['template'].upper()} (from batch)")
+    else:
+        # Seeded by the row, so a re-render picks the same template and hits the script cache
+        gen_config = generate_random_config(class_level=job['class_level'], seed=row_key(job))
         print(f"   🎨 Template: {gen_config['template'].upper()}")
 
         print("🤖 Generating AI script...")
         script = gemini.get_script(
-            pdf_text, 
-            class_level=class_level,
-            template=gen_config['template']
+            job['pdf_text'], 
+            class_level=job['class_level'],
+            template=gen_config['template'],
+            chapter_key=job.get('pdf_hash'),
+            row_key=row_key(job)
         )
+    
+    # Preview
+    if gen_config['template'] == 'quiz': preview = script.get('question_text', '')
+    elif gen_config['template'] == 'fact': preview = script.get('fact_title', '')
+    else: preview = script.get('tip_title', '')
+    print(f"   ✅ Script: {preview[:50]}...")
+    
+    job['gen_config'] = gen_config
+    job['script'] = script
+
+def render_row(engine, job):
+    """
+    Stage 4 (CPU): voice synthesis + MoviePy render. Returns (success, meta_data).
+    engine may be a RenderHost: the row is then rendered in the host process.
+    """
+    if isinstance(engine, RenderHost):
+        return engine.run(render_row, job)
+    gen_config = job['gen_config']
+    script = job['script']
+    
+    output_filename = generate_output_filename(
+        job['chapter_title'], gen_config['template'], script, job['vid_id'], DIRS['SHORTS_OUT']
+    )
+    output_path = os.path.join(DIRS['SHORTS_OUT'], output_filename)
+    
+    result = engine.generate_short(
+        video_path=job['temp_vid'],
+        pdf_path=job['temp_pdf'],
+        script=script,
+        config=gen_config,
+        output_path=output_path,
+        class_level=job['class_level']
+    )
+
+    if result['success']:
+        print(f"✅ Created: {output_filename}")
+        # Get voice system used
+        voice_system_used = engine.voice_manager.last_used_system or "Unknown"
         
-        # Preview
-        if gen_config['template'] == 'quiz': preview = script.get('question_text', '')
-        elif gen_config['template'] == 'fact': preview = script.get('fact_title', '')
-        else: preview = script.get('tip_title', '')
-        print(f"   ✅ Script: {preview[:50]}...")
-        
-        output_filename = generate_output_filename(
-            chapter_title, gen_config['template'], script, vid_id, DIRS['SHORTS_OUT']
-        )
-        output_path = os.path.join(DIRS['SHORTS_OUT'], output_filename)
-        
-        result = engine.generate_short(
-            video_path=temp_vid,
-            pdf_path=temp_pdf,
-            script=script,
-            config=gen_config,
-            output_path=output_path,
-            class_level=class_level
-        )
+        # Return full metadata for Sheet update
+        meta_data = {
+            "status": CONFIG['STATUS_SUCCESS'],
+            "filename": output_filename,
+            "template": gen_config['template'],
+            "duration": int(result.get('duration', 0)),
+            "voice_system": voice_system_used  # ADD THIS LINE
+        }
+        return True, meta_data
+    else:
+        raise Exception(result.get('error', 'Unknown error'))
 
-        if result['success']:
-            print(f"✅ Created: {output_filename}")
-            # Get voice system used
-            voice_system_used = engine.voice_manager.last_used_system or "Unknown"
-            
-            # Return full metadata for Sheet update
-            meta_data = {
-                "status": CONFIG['STATUS_SUCCESS'],
-                "filename": output_filename,
-                "template": gen_config['template'],
-                "duration": int(result.get('duration', 0)),
-                "voice_system": voice_system_used  # ADD THIS LINE
-            }
-            return True, meta_data
-        else:
-            raise Exception(result.get('error', 'Unknown error'))
+def failure_meta(error):
+    return {"status": f"{CONFIG['STATUS_FAILURE_PREFIX']} {str(error)}"}
+
+def cleanup_row_job(job):
+    if CONFIG.get('DELETE_TEMP_FILES', True):
+        cache = get_asset_cache()
+        for p in [job['temp_pdf'], job['temp_vid']]:
+            if cache and cache.is_cached_path(p): continue  # Shared with other rows
+            if os.path.exists(p): os.remove(p)
+    gc.collect()
+
+def process_row(engine, gemini, row, row_idx, batcher=None):
+    job = new_row_job(row, row_idx)
+    if job is None: return False, {"status": "Skipped: Column N empty"}
+    
+    print(f"\n🎬 Processing Row {row_idx} [ID: {job['vid_id']}]...")
+
+    try:
+        fetch_row_assets(job)
+        extract_row_text(job)
+        generate_row_script(gemini, job, batcher)
+        return render_row(engine, job)
 
     except Exception as e:
         print(f"❌ Error: {e}")
-        return False, {"status": f"{CONFIG['STATUS_FAILURE_PREFIX']} {str(e)}"}
+        return False, failure_meta(e)
     
     finally:
-        if CONFIG.get('DELETE_TEMP_FILES', True):
-            for p in [temp_pdf, temp_vid]:
-                if os.path.exists(p): os.remove(p)
-        gc.collect()
+        cleanup_row_job(job)
+
+def write_row_result(writer, row_num, success, meta_data):
+    """Queues status (and metadata on success) for one processed sheet row on the BufferedSheetWriter."""
+    # 1. Update Status (Column AN / 39)
+    status_cell = f"{CONFIG['SHEET_NAME']}!{get_col_letter(COL_IDX_STATUS)}{row_num}"
+    writer.update(status_cell, [[meta_data['status']]])
+    
+    # 2. If Successful, Update Metadata Columns (AR, AS, AT, AX)
+    if success:
+        # Range AR:AT (43 to 45) - Filename, Template, Duration
+        start_col = get_col_letter(COL_IDX_FILENAME)
+        end_col = get_col_letter(COL_IDX_DURATION)
+        meta_range = f"{CONFIG['SHEET_NAME']}!{start_col}{row_num}:{end_col}{row_num}"
+        
+        meta_values = [[
+            meta_data['filename'],
+            meta_data['template'],
+            meta_data['duration']
+        ]]
+        writer.update(meta_range, meta_values)
+        
+        # 3. Update Voice System Used (Column AX / 49)
+        voice_cell = f"{CONFIG['SHEET_NAME']}!{get_col_letter(COL_IDX_VOICE)}{row_num}"
+        writer.update(voice_cell, [[meta_data['voice_system']]])
+
+def create_render_engine(encode_share=1):
+    """
+    ShortsEngine for render_row. With SEGMENTED_RENDER on, a RenderHost running one
+    instead, so segment processes are forked from a thread-free process.
+    Call it before any thread starts (sheet writer, Gemini pool, pipeline).
+    """
+    if CONFIG.get('SEGMENTED_RENDER', {}).get('ENABLED', False) and RenderHost.available():
+        return RenderHost(CONFIG_FILE, encode_share=encode_share)
+    return ShortsEngine(CONFIG_FILE, encode_share=encode_share)
+
+def create_sheet_writer(sheets):
+    """Buffered writer: one values().batchUpdate per flush instead of 3 updates per row."""
+    buf_cfg = CONFIG.get('SHEETS_WRITE_BUFFER', {})
+    return BufferedSheetWriter(
+        sheets, CONFIG['SPREADSHEET_ID'],
+        max_pending=buf_cfg.get('MAX_PENDING_UPDATES', 30),
+        flush_interval=buf_cfg.get('FLUSH_INTERVAL_SECONDS', 60),
+        retry_attempts=CONFIG.get('API_RETRY_ATTEMPTS', 3),
+        retry_delay=CONFIG.get('API_RETRY_DELAY', 3)
+    )
+
+def collect_pending_rows(rows):
+    """Returns [(sheet_row_number, row)] eligible for processing, capped at MAX_ROWS_TO_PROCESS."""
+    pending = []
+    for i, row in enumerate(rows):
+        if i == 0: continue
+        if len(pending) >= CONFIG['MAX_ROWS_TO_PROCESS']: break
+        
+        def val(idx): return row[idx].strip() if len(row) > idx else ""
+        
+        if val(COL_IDX_STATUS).lower() != CONFIG['STATUS_TO_PROCESS'].lower(): continue
+        if not val(COL_IDX_FILTER) or not val(COL_IDX_ID) or not val(COL_IDX_VIDEO): continue
+        
+        pending.append((i + 1, row))
+    return pending
+
+# ============================================================================
+# PARALLEL RENDER FARM
+# Each worker process owns its own ShortsEngine + GeminiManager.
+# Sheet writes stay in the coordinator (main process) only.
+# ============================================================================
+
+_WORKER_ENGINE = None
+_WORKER_GEMINI = None
+
+def get_render_worker_count():
+    """Reads PARALLEL_RENDERING from config. Returns 1 when disabled."""
+    par_cfg = CONFIG.get('PARALLEL_RENDERING', {})
+    if not par_cfg.get('ENABLED', False): return 1
+    workers = par_cfg.get('WORKERS', 'auto')
+    if workers == 'auto':
+        # MoviePy/ffmpeg already use a few threads per encode
+        workers = max(1, (os.cpu_count() or 2) // 4)
+    return max(1, int(workers))
+
+def get_script_worker_count():
+    """Concurrent Gemini calls in the pipeline's script stage ('auto' = one per key)."""
+    workers = CONFIG.get('GEMINI_POOL', {}).get('SCRIPT_WORKERS', 'auto')
+    if workers == 'auto':
+        if CONFIG.get('GEMINI_CACHE', {}).get('USE_STUB', False): return 1
+        with open(CONFIG['GEMINI_KEYS_FILE']) as f:
+            workers = sum(1 for line in f if line.strip())
+    return max(1, int(workers))
+
+def _init_render_worker(workers=1):
+    """Runs once per worker process: builds that worker's private engine."""
+    global _WORKER_ENGINE, _WORKER_GEMINI
+    # Engine first: a RenderHost must fork before the Gemini pool starts threads
+    _WORKER_ENGINE = create_render_engine(encode_share=workers)
+    # Workers share the same keys, so each takes its share of the rate limit
+    _WORKER_GEMINI = GeminiManager(rate_share=workers)
+
+def _render_row_in_worker(row, row_num, claim_dir=None):
+    if claim_dir:
+        # Lets the coordinator tell which rows were running if this process dies
+        open(os.path.join(claim_dir, f"{row_num}.started"), 'w').close()
+    return process_row(_WORKER_ENGINE, _WORKER_GEMINI, row, row_num)
+
+def _run_farm_pool(rows, workers, claim_dir, on_result):
+    """
+    Runs rows on one process pool until they are all done or a worker dies
+    (which breaks the whole pool).
+
+    Returns:
+        (rows that were running when the pool broke, rows that never started)
+        - both empty when the pool finished normally
+    """
+    for row_num, _ in rows:
+        claim = os.path.join(claim_dir, f"{row_num}.started")
+        if os.path.exists(claim): os.remove(claim)
+
+    # 'spawn' gives every worker a clean interpreter (no inherited HTTP clients/threads)
+    ctx = multiprocessing.get_context('spawn')
+    unfinished = dict(rows)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                                initializer=_init_render_worker, initargs=(workers,)) as pool:
+        futures = {pool.submit(_render_row_in_worker, row, row_num, claim_dir): row_num for row_num, row in rows}
+        
+        for future in concurrent.futures.as_completed(futures):
+            row_num = futures[future]
+            try:
+                success, meta_data = future.result()
+            except BrokenProcessPool:
+                continue  # Every unfinished row lands here; sorted out by the caller
+            except Exception as e:
+                print(f"❌ Worker failed on row {row_num}: {e}")
+                success, meta_data = False, failure_meta(e)
+            on_result(row_num, success, meta_data)
+            del unfinished[row_num]
+
+    started = [(r, row) for r, row in unfinished.items() if os.path.exists(os.path.join(claim_dir, f"{r}.started"))]
+    not_started = [(r, row) for r, row in unfinished.items() if (r, row) not in started]
+    return started, not_started
+
+def run_parallel_batch(writer, pending, workers):
+    """
+    Fans rows out to a process pool and funnels results back through
+    the coordinator, which is the only place that talks to Google Sheets.
+    
+    A dead worker (OOM, segfault in ffmpeg, ...) breaks the whole pool: rows
+    that hadn't started go to a fresh pool, and each row that was in flight
+    is re-run alone - only a row that crashes its own process is failed.
+    """
+    print(f"🏭 Render farm: {len(pending)} rows across {workers} worker processes")
+    processed = 0
+    claim_dir = os.path.join(DIRS['TEMP'], f"farm_{os.getpid()}")
+    os.makedirs(claim_dir, exist_ok=True)
+    
+    def record(row_num, success, meta_data):
+        nonlocal processed
+        write_row_result(writer, row_num, success, meta_data)
+        processed += 1
+    
+    crashed = lambda: (False, {"status": f"{CONFIG['STATUS_FAILURE_PREFIX']} Worker crashed"})
+    queue = list(pending)
+    try:
+        while queue:
+            in_flight, queue = _run_farm_pool(queue, min(workers, len(queue)), claim_dir, record)
+            if not in_flight and not queue: break
+            if not in_flight:
+                # Died before taking any row (e.g. engine init): retrying would loop forever
+                print(f"❌ Render workers failed to start. {len(queue)} rows not processed.")
+                for row_num, _ in queue: record(row_num, *crashed())
+                break
+            
+            print(f"💥 Render worker died with {len(in_flight)} row(s) in flight. Re-running them one at a time...")
+            for row_num, row in in_flight:
+                again, never = _run_farm_pool([(row_num, row)], 1, claim_dir, record)
+                if again or never:
+                    print(f"❌ Row {row_num} crashed its worker")
+                    record(row_num, *crashed())
+    finally:
+        shutil.rmtree(claim_dir, ignore_errors=True)
+    
+    return processed
 
 def main():
     for d in DIRS.values(): os.makedirs(d, exist_ok=True)
@@ -404,8 +1098,6 @@ def main():
     
     # Build the service object using the credentials
     sheets = build('sheets', 'v4', credentials=sheets_creds)
-    gemini = GeminiManager()
-    engine = ShortsEngine(CONFIG_FILE)
     
     last_col = get_col_letter(COL_IDX_DURATION) # Ensure we read enough columns if needed
     range_n = f"{CONFIG['SHEET_NAME']}!A:{last_col}"
@@ -414,52 +1106,38 @@ def main():
         spreadsheetId=CONFIG['SPREADSHEET_ID'], range=range_n
     ).execute().get('values', [])
     
-    processed = 0
-    for i, row in enumerate(rows):
-        if i == 0: continue
-        if processed >= CONFIG['MAX_ROWS_TO_PROCESS']: break
-        
-        def val(idx): return row[idx].strip() if len(row) > idx else ""
-        
-        if val(COL_IDX_STATUS).lower() != CONFIG['STATUS_TO_PROCESS'].lower(): continue
-        if not val(COL_IDX_FILTER) or not val(COL_IDX_ID) or not val(COL_IDX_VIDEO): continue
-        
-        success, meta_data = process_row(engine, gemini, row, i+1)
-        
-        # 1. Update Status (Column AN / 39)
-        status_cell = f"{CONFIG['SHEET_NAME']}!{get_col_letter(COL_IDX_STATUS)}{i+1}"
-        sheets.spreadsheets().values().update(
-            spreadsheetId=CONFIG['SPREADSHEET_ID'], range=status_cell,
-            valueInputOption='USER_ENTERED', body={'values': [[meta_data['status']]]}
-        ).execute()
-        
-       # 2. If Successful, Update Metadata Columns (AR, AS, AT, AX)
-        if success:
-            # Range AR:AT (43 to 45) - Filename, Template, Duration
-            start_col = get_col_letter(COL_IDX_FILENAME)
-            end_col = get_col_letter(COL_IDX_DURATION)
-            meta_range = f"{CONFIG['SHEET_NAME']}!{start_col}{i+1}:{end_col}{i+1}"
-            
-            meta_values = [[
-                meta_data['filename'],
-                meta_data['template'],
-                meta_data['duration']
-            ]]
-            
-            sheets.spreadsheets().values().update(
-                spreadsheetId=CONFIG['SPREADSHEET_ID'], range=meta_range,
-                valueInputOption='USER_ENTERED', body={'values': meta_values}
-            ).execute()
+    pending = collect_pending_rows(rows)
+    workers = get_render_worker_count()
+    use_farm = workers > 1 and len(pending) > 1
+    # Before the sheet writer starts its thread (farm workers build their own)
+    engine = None if use_farm else create_render_engine()
+    
+    # Flushes on exit of the block - including when the batch crashes
+    with create_sheet_writer(sheets) as writer:
+        if use_farm:
+            processed = run_parallel_batch(writer, pending, min(workers, len(pending)))
+        elif CONFIG.get('PIPELINE', {}).get('ENABLED', False):
+            from batch_pipeline import ShortsPipeline
+            pipeline = ShortsPipeline(
+                engine=engine,
+                gemini=GeminiManager(),
+                on_result=lambda row_num, success, meta: write_row_result(writer, row_num, success, meta),
+                batcher_factory=lambda gemini: create_script_batcher(gemini, pending),
+                queue_size=CONFIG['PIPELINE'].get('QUEUE_SIZE', 2),
+                script_workers=get_script_worker_count()
+            )
+            processed = pipeline.run(pending)
+        else:
+            gemini = GeminiManager()
+            batcher = create_script_batcher(gemini, pending)
             
-            # 3. Update Voice System Used (Column AX / 49)
-            voice_cell = f"{CONFIG['SHEET_NAME']}!{get_col_letter(COL_IDX_VOICE)}{i+1}"
-            sheets.spreadsheets().values().update(
-                spreadsheetId=CONFIG['SPREADSHEET_ID'], range=voice_cell,
-                valueInputOption='USER_ENTERED', body={'values': [[meta_data['voice_system']]]}
-            ).execute()
-        
-        processed += 1
+            processed = 0
+            for row_num, row in pending:
+                success, meta_data = process_row(engine, gemini, row, row_num, batcher)
+                write_row_result(writer, row_num, success, meta_data)
+                processed += 1
     
+    if isinstance(engine, RenderHost): engine.close()
     print(f"\n✨ Processed {processed} videos!")
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+File: pdf_text_cache.py
+Cached, page-selective PDF text extraction (PyMuPDF).
+Per-page text is stored under the PDF's content hash:
+    <hash>.bin  - zlib-compressed page blobs, appended as pages get extracted
+    <hash>.idx  - JSON index {page_count, pages: {page_no: [offset, length]}}
+Pages are only parsed when first requested, so a 300-page book isn't
+parsed just to fill an 8 KB prompt.
+"""
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import fitz
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class PDFTextCache:
+    """
+    Usage:
+        cache = PDFTextCache('cache/pdf_text')
+        text = cache.get_text(pdf_path, max_chars=8000)        # parses only the first few pages
+        tail = cache.get_window(pdf_path, 'end', max_chars=4000)
+    """
+
+    def __init__(self, cache_dir='cache/pdf_text'):
+        self.cache_dir = cache_dir
+        self.lock = threading.RLock()
+        self._hash_memo = {}   # (path, size, mtime) -> sha256
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Keys / storage
+    # ------------------------------------------------------------------
+
+    def content_hash(self, pdf_path):
+        """SHA-256 of the PDF bytes (memoized per path+size+mtime)."""
+        st = os.stat(pdf_path)
+        memo_key = (os.path.abspath(pdf_path), st.st_size, st.st_mtime)
+        if memo_key not in self._hash_memo:
+            h = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(block)
+            self._hash_memo[memo_key] = h.hexdigest()
+        return self._hash_memo[memo_key]
+
+    def _paths(self, doc_hash):
+        base = os.path.join(self.cache_dir, doc_hash[:32])
+        return base + '.idx', base + '.bin', base + '.lock'
+
+    def _load_index(self, doc_hash):
+        idx_path, _, _ = self._paths(doc_hash)
+        if os.path.exists(idx_path):
+            try:
+                with open(idx_path, 'r') as f:
+                    return json.load(f)
+            except Exception:
+                pass
+        return {'page_count': None, 'pages': {}}
+
+    def _save_index(self, doc_hash, index):
+        idx_path, _, _ = self._paths(doc_hash)
+        tmp = f"{idx_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, idx_path)
+
+    # ------------------------------------------------------------------
+    # Extraction
+    # ------------------------------------------------------------------
+
+    def _pages(self, pdf_path, pages, max_chars=None, backwards=False):
+        """
+        Texts of `pages` (in the given order), stopping once their normalized
+        concatenation reaches max_chars. Cached pages are read from the .bin;
+        the missing ones are parsed in the same pass with ONE document open
+        and ONE index write.
+
+        Args:
+            backwards: pages run towards the start of the book (each text is
+                       prepended), which matters for the length count
+        """
+        doc_hash = self.content_hash(pdf_path)
+        _, bin_path, lock_path = self._paths(doc_hash)
+        texts, size, edge = [], 0, ''   # edge: char where the next page joins the text so far
+        doc = out = lock_fh = None
+        dirty = False
+        with self.lock:
+            index = self._load_index(doc_hash)
+            try:
+                with open(bin_path, 'ab+') as bin_in:
+                    for p in pages:
+                        entry = index['pages'].get(str(p))
+                        if entry is None and doc is None:
+                            lock_fh = open(lock_path, 'a')
+                            if fcntl: fcntl.flock(lock_fh, fcntl.LOCK_EX)
+                            # Another worker may have filled pages in meanwhile
+                            index = self._load_index(doc_hash)
+                            entry = index['pages'].get(str(p))
+                            doc = fitz.open(pdf_path)
+                            out = open(bin_path, 'ab')
+                            if index['page_count'] != doc.page_count:
+                                index['page_count'] = doc.page_count
+                                dirty = True
+
+                        if entry is not None:
+                            offset, length = entry
+                            bin_in.seek(offset)
+                            text = zlib.decompress(bin_in.read(length)).decode('utf-8')
+                        else:
+                            if p >= doc.page_count: continue
+                            text = doc.load_page(p).get_text()
+                            blob = zlib.compress(text.encode('utf-8'), 6)
+                            index['pages'][str(p)] = [out.tell(), len(blob)]
+                            out.write(blob)
+                            out.flush()  # Later pages of this pass may be read back through bin_in
+                            dirty = True
+                        texts.append(text)
+
+                        if max_chars is None: continue
+                        # Length of normalize(join(texts)) without re-joining: blank
+                        # lines collapse across page boundaries too
+                        norm = self.normalize(text)
+                        if not norm: continue
+                        size += len(norm)
+                        if edge == '\n' and (norm[-1] if backwards else norm[0]) == '\n':
+                            size -= 1
+                        edge = norm[0] if backwards else norm[-1]
+                        if size >= max_chars: break
+            finally:
+                if doc is not None:
+                    out.close()
+                    doc.close()
+                if dirty:
+                    self._save_index(doc_hash, index)
+                if lock_fh is not None:
+                    if fcntl: fcntl.flock(lock_fh, fcntl.LOCK_UN)
+                    lock_fh.close()
+        return texts[::-1] if backwards else texts
+
+    def page_count(self, pdf_path):
+        doc_hash = self.content_hash(pdf_path)
+        index = self._load_index(doc_hash)
+        if index['page_count'] is None:
+            with self.lock:
+                doc = fitz.open(pdf_path)
+                try:
+                    count = doc.page_count
+                finally:
+                    doc.close()
+                _, _, lock_path = self._paths(doc_hash)
+                with open(lock_path, 'a') as lock_fh:
+                    if fcntl: fcntl.flock(lock_fh, fcntl.LOCK_EX)
+                    try:
+                        index = self._load_index(doc_hash)
+                        index['page_count'] = count
+                        self._save_index(doc_hash, index)
+                    finally:
+                        if fcntl: fcntl.flock(lock_fh, fcntl.LOCK_UN)
+        return index['page_count']
+
+    def get_pages(self, pdf_path, start=0, end=None):
+        """Raw text of pages [start, end). Only uncached pages are parsed."""
+        count = self.page_count(pdf_path)
+        end = count if end is None else min(end, count)
+        return self._pages(pdf_path, range(max(0, start), end))
+
+    @staticmethod
+    def normalize(text):
+        """Same cleanup the generator always applied: collapse blank lines."""
+        return re.sub(r'\n+', '\n', text)
+
+    def get_text(self, pdf_path, max_chars=None, start_page=0, end_page=None):
+        """
+        Normalized text of a page range. With max_chars, pages are parsed lazily
+        and extraction stops as soon as enough text has been collected.
+        """
+        count = self.page_count(pdf_path)
+        end_page = count if end_page is None else min(end_page, count)
+        parts = self._pages(pdf_path, range(start_page, end_page), max_chars)
+        text = self.normalize("".join(parts))
+        return text if max_chars is None else text[:max_chars]
+
+    def get_window(self, pdf_path, position='start', max_chars=8000):
+        """
+        Text window from the 'start', 'middle' or 'end' of the book, or from a
+        fraction (0.0-1.0) of the page range. Parses only the pages it needs.
+        """
+        count = self.page_count(pdf_path)
+        if count == 0: return ""
+        fraction = {'start': 0.0, 'middle': 0.5, 'end': 1.0}.get(position, position)
+
+        if fraction >= 1.0:
+            # Walk backwards from the last page until the window is full
+            parts = self._pages(pdf_path, range(count - 1, -1, -1), max_chars, backwards=True)
+            return self.normalize("".join(parts))[-max_chars:]
+
+        start_page = min(int(count * float(fraction)), count - 1)
+        return self.get_text(pdf_path, max_chars=max_chars, start_page=start_page)
@@ -10,8 +10,26 @@ UPDATED:
 """
 
 class PromptManager:
-    def __init__(self):
-        pass
+    # Source text budget per prompt (characters)
+    MAX_SOURCE_CHARS = 8000
+
+    # Fields every script of a template must carry (mirrors the JSON FORMAT blocks)
+    REQUIRED_FIELDS = {
+        'quiz': ['hook_spoken', 'question_visual', 'question_spoken',
+                 'opt_a_visual', 'opt_a_spoken', 'opt_b_visual', 'opt_b_spoken',
+                 'opt_c_visual', 'opt_c_spoken', 'opt_d_visual', 'opt_d_spoken',
+                 'correct_opt', 'explanation_visual', 'explanation_spoken', 'cta_spoken'],
+        'fact': ['hook_spoken', 'fact_title', 'fact_visual', 'fact_spoken', 'cta_spoken'],
+        'tip': ['hook_spoken', 'tip_title', 'tip_visual', 'tip_spoken', 'cta_spoken'],
+    }
+
+    def __init__(self, selector=None):
+        """
+        Args:
+            selector: Optional ChunkSelector. Without one the source text is
+                      simply truncated to MAX_SOURCE_CHARS.
+        """
+        self.selector = selector
 
     def get_base_context(self, focused_text, class_level):
         """Returns the system persona and core rules."""
@@ -75,13 +93,71 @@ class PromptManager:
             - SPOKEN (_spoken): How it sounds. Use the Phonetic rules from Rule #2 (e.g., H two O, x squared, Delta T, 30 degrees Celsius).
         """
 
-    def create_prompt(self, pdf_text, class_level=None, template='quiz'):
-        """Constructs the final prompt based on the template type."""
-        
+    def focus_text(self, pdf_text, template, chapter_key=None, row_key=None):
+        """Source passages for the prompt (chunk selector, or plain truncation)."""
         # Limit text context to avoid token overflow
-        focused_text = pdf_text[:8000]
+        if self.selector:
+            return self.selector.select(pdf_text, template, chapter_key, row_key)
+        return pdf_text[:self.MAX_SOURCE_CHARS]
+
+    def create_prompt(self, pdf_text, class_level=None, template='quiz', chapter_key=None, row_key=None):
+        """Constructs the final prompt based on the template type."""
+        focused_text = self.focus_text(pdf_text, template, chapter_key, row_key)
         base = self.get_base_context(focused_text, class_level)
-        
+        return base + "\n" + self.get_task(template)
+
+    def create_batch_prompt(self, pdf_text, templates, class_level=None, chapter_key=None, row_key=None):
+        """
+        One prompt asking for len(templates) scripts (shared source text and rules).
+
+        Args:
+            templates: Template per requested script, e.g. ['quiz', 'fact', 'quiz']
+
+        Returns:
+            Prompt string; the answer is a JSON array in the same order
+        """
+        focused_text = self.focus_text(pdf_text, templates, chapter_key, row_key)
+        base = self.get_base_context(focused_text, class_level)
+
+        # Each distinct template's instructions + format only once
+        formats = "\n".join(self.get_task(t) for t in dict.fromkeys(templates))
+        order = "\n".join(f"            {i + 1}. {t.upper()} script" for i, t in enumerate(templates))
+
+        batch = f"""
+        BATCH MODE: Create {len(templates)} SEPARATE scripts from the same source material.
+        Each script below follows its own TASK and JSON FORMAT.
+
+        {formats}
+
+        ⚠️ BATCH OUTPUT RULES:
+            - Return ONE JSON ARRAY with EXACTLY {len(templates)} objects, in this order:
+{order}
+            - Add a "template" field to every object ("quiz", "fact" or "tip").
+            - Every script MUST use a DIFFERENT detail from a different part of the text.
+              Never reuse the same fact, question, or hook twice in the array.
+        """
+        return base + "\n" + batch
+
+    def validate_script(self, script, template):
+        """
+        Checks a parsed script against the template's required fields.
+
+        Returns:
+            List of problems (empty if the script is usable)
+        """
+        if not isinstance(script, dict):
+            return [f"expected a JSON object, got {type(script).__name__}"]
+
+        problems = [f"missing '{f}'" for f in self.REQUIRED_FIELDS.get(template, [])
+                    if not str(script.get(f, '')).strip()]
+        if script.get('template') and script['template'] != template:
+            problems.append(f"template is '{script['template']}', expected '{template}'")
+        if template == 'quiz' and str(script.get('correct_opt', '')).strip().upper()[:1] not in ('A', 'B', 'C', 'D'):
+            problems.append("correct_opt must be A, B, C or D")
+        return problems
+
+    def get_task(self, template):
+        """TASK instructions + JSON format for one template."""
         if template == 'quiz':
             task = f"""
             TASK: Create a JSON script for a QUIZ Short based on the provided text.
@@ -158,4 +234,4 @@ class PromptManager:
             # Fallback
             task = "TASK: Create a generic educational script in JSON."
 
-        return base + "\n" + task
\ No newline at end of file
+        return task
\ No newline at end of file
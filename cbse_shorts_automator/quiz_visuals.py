@@ -4,7 +4,8 @@ Handles the visual composition for the Quiz Template.
 STEP 6: FIXES Animation Lag by compressing travel time (0.2s duration + Elastic Easing).
 """
 
-from moviepy.editor import TextClip, ColorClip, vfx, VideoFileClip 
+from moviepy.editor import TextClip, ColorClip, vfx 
+from video_encoder import open_video_source
 # Ensure visual_fx_utils is imported for glass and themes
 from visual_fx_utils import PREMIUM_THEMES, create_glass_panel, make_motion_func, ease_out_expo, ease_out_back # ADDED ease_out_back
 
@@ -66,7 +67,7 @@ def build_quiz_visuals(engine, video_proc, video_path, script, timings, total_du
     clips = [bg]
 
     STAGE_W = 1000; STAGE_Y = 400 
-    stage_raw = VideoFileClip(video_path)
+    stage_raw = open_video_source(video_path)
     if stage_raw.duration < original_total_dur: stage_raw = stage_raw.loop(duration=original_total_dur)
     else: stage_raw = stage_raw.subclip(0, original_total_dur)
             
@@ -141,7 +142,8 @@ def build_quiz_visuals(engine, video_proc, video_path, script, timings, total_du
             # Use the absolute time for external tracking
             start_time=0,                  
             duration=ANIM_DURATION,           
-            easing_func=ease_out_back 
+            easing_func=ease_out_back,
+            fps=config.get('fps', 24)
         )
         
         # 2. Panel Clip (Apply Motion)
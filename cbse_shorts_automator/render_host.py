@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+File: render_host.py
+A single-threaded render process, forked before the caller starts any thread.
+- Segmented rendering forks one process per segment, which is only safe from a
+  process with no other threads (a thread holding a lock at fork time leaves
+  that lock held forever in the child). The coordinator always has some: the
+  sheet writer's timer, the Gemini hedge pool, pipeline stages.
+- The host is forked while the caller is still single-threaded, owns its own
+  ShortsEngine, and renders the rows it is sent. Its only thread is the one
+  that renders, so the engine can fork segment processes from it.
+- Jobs and results travel over a pipe (pickled); functions are sent by name,
+  so they must be module-level.
+"""
+
+import threading
+import traceback
+import multiprocessing
+from multiprocessing import util
+
+def _serve(conn, parent_end, config_path, encode_share):
+    """Host loop: builds the engine, then runs func(engine, *args) per request until EOF."""
+    parent_end.close()   # Otherwise recv() never sees EOF when the parent dies
+    from shorts_engine import ShortsEngine
+    engine = ShortsEngine(config_path, encode_share=encode_share)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None: break
+        func, args = request
+        try:
+            reply = (True, func(engine, *args))
+        except Exception as e:
+            traceback.print_exc()
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:   # Unpicklable result or exception
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+class RenderHostDied(RuntimeError):
+    """The render process exited (crash, OOM kill) while or before rendering."""
+
+class RenderHost:
+    """
+    Runs engine work in a process forked before any thread exists.
+
+    Usage:
+        host = RenderHost('config/generator_config.json')   # Before starting threads
+        with create_sheet_writer(sheets) as writer:          # Threads are fine from here on
+            success, meta = host.run(render_row, job)        # render_row(engine, job) in the host
+        host.close()
+    """
+
+    @staticmethod
+    def available():
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def __init__(self, config_path='config/generator_config.json', encode_share=1):
+        """
+        Args:
+            config_path: Generator config JSON (the host builds its own ShortsEngine)
+            encode_share: Render processes sharing this machine's cores
+        """
+        if threading.active_count() > 1:
+            raise RuntimeError("RenderHost must be started before any other thread")
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_end = ctx.Pipe()
+        # Not a daemon: daemonic processes may not fork the segment processes
+        self.proc = ctx.Process(target=_serve, args=(child_end, self.conn, config_path, encode_share),
+                                name='render-host')
+        self.proc.start()
+        child_end.close()
+        self.lock = threading.Lock()
+        # Ends the host before multiprocessing joins its children at exit
+        self._finalizer = util.Finalize(self, RenderHost._shutdown, args=(self.conn, self.proc), exitpriority=10)
+        print(f"🖥️ Render host started (pid {self.proc.pid})")
+
+    def run(self, func, *args):
+        """
+        Runs func(engine, *args) in the host and returns its result.
+        Exceptions raised there are re-raised here.
+        """
+        with self.lock:
+            try:
+                self.conn.send((func, args))
+                ok, value = self.conn.recv()
+            except (EOFError, OSError):
+                self.proc.join(timeout=5)
+                raise RenderHostDied(f"Render host exited (code {self.proc.exitcode})") from None
+        if not ok: raise value
+        return value
+
+    @staticmethod
+    def _shutdown(conn, proc):
+        try:
+            conn.send(None)
+        except OSError:
+            pass
+        conn.close()
+        proc.join(timeout=30)
+        if proc.is_alive(): proc.terminate()
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+File: resumable_download.py
+Streaming, resumable HTTP downloader for large lecture videos.
+- Writes to '<output>.part' and resumes with HTTP Range after a dropped connection.
+- Adaptive chunk size (grows while the link is fast, shrinks when it stalls).
+- Size (Content-Length / Content-Range total) and optional SHA-256 check
+  before an atomic rename to the final path.
+
+Self-test against a local Range-capable HTTP stand-in server:
+    python resumable_download.py --selftest
+"""
+
+import os
+import re
+import sys
+import time
+import hashlib
+import requests
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+MIN_CHUNK = 256 * 1024          # 256 KB
+MAX_CHUNK = 8 * 1024 * 1024     # 8 MB
+TARGET_CHUNK_SECONDS = 0.5      # Aim for ~2 progress updates per second
+
+class DownloadError(Exception):
+    pass
+
+class ResumableDownloader:
+    """
+    Usage:
+        dl = ResumableDownloader(session=requests.Session())
+        dl.download(url, 'downloads/yt_vids/t_123.mp4', params={'id': file_id})
+    """
+
+    def __init__(self, session=None, max_retries=5, connect_timeout=10, read_timeout=60,
+                 headers=None, verbose=True):
+        self.session = session or requests.Session()
+        self.max_retries = max_retries
+        self.timeout = (connect_timeout, read_timeout)
+        self.headers = headers or {'User-Agent': 'Mozilla/5.0'}
+        self.verbose = verbose
+
+    @staticmethod
+    def _total_from_response(response, offset):
+        """Full file size from Content-Range ('bytes 100-199/1000') or Content-Length."""
+        content_range = response.headers.get('Content-Range')
+        if content_range:
+            m = re.search(r'/(\d+)$', content_range)
+            if m: return int(m.group(1))
+        length = response.headers.get('Content-Length')
+        if length is not None:
+            return int(length) + (offset if response.status_code == 206 else 0)
+        return None
+
+    @staticmethod
+    def _unsatisfied_range_total(response):
+        """Full size from a 416's Content-Range ('bytes */1000'), else None."""
+        m = re.match(r'bytes \*/(\d+)$', response.headers.get('Content-Range', '').strip())
+        return int(m.group(1)) if m else None
+
+    def download(self, url, output_path, params=None, expected_size=None, expected_sha256=None):
+        """
+        Downloads url -> output_path (atomically). Resumes from output_path + '.part'.
+
+        Returns:
+            Final size in bytes
+
+        Raises:
+            DownloadError when retries are exhausted or the integrity check fails
+        """
+        part_path = output_path + '.part'
+        total = expected_size
+        chunk_size = MIN_CHUNK
+        attempt = 0
+        start = time.time()
+
+        while True:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if total is not None and offset >= total:
+                break
+
+            headers = dict(self.headers)
+            if offset > 0:
+                headers['Range'] = f"bytes={offset}-"
+
+            try:
+                with self.session.get(url, params=params, headers=headers, stream=True,
+                                      timeout=self.timeout) as r:
+                    if r.status_code == 416:
+                        # Range not satisfiable: .part is complete only if the server's
+                        # Content-Range ('bytes */1000') confirms that exact length
+                        confirmed = self._unsatisfied_range_total(r)
+                        if confirmed is not None and offset == confirmed:
+                            total = confirmed
+                            break
+                        if self.verbose:
+                            print(f"   ⚠️ Server rejected resume at {offset} bytes "
+                                  f"(size {confirmed if confirmed is not None else 'unknown'}). Restarting download.")
+                        os.remove(part_path)
+                        total = confirmed if confirmed is not None else total
+                        continue
+                    if r.status_code not in (200, 206):
+                        raise DownloadError(f"HTTP {r.status_code}")
+
+                    if offset > 0 and r.status_code == 200:
+                        # Server ignored Range -> restart from zero
+                        if self.verbose: print("   ⚠️ Server does not support resume. Restarting download.")
+                        offset = 0
+                        mode = 'wb'
+                    else:
+                        mode = 'ab' if offset > 0 else 'wb'
+
+                    total = self._total_from_response(r, offset) or total
+                    if offset > 0 and self.verbose:
+                        print(f"   ↪️ Resuming at {offset / 1024**2:.1f} MB")
+
+                    with open(part_path, mode) as f:
+                        t0 = time.time()
+                        for data in self._read_adaptive(r, chunk_size):
+                            f.write(data)
+                            chunk_size = self._next_chunk_size(chunk_size, time.time() - t0)
+                            t0 = time.time()
+
+                    if total is None:
+                        break  # No size info: a clean EOF is all we can trust
+                    if os.path.getsize(part_path) >= total:
+                        break
+                    raise DownloadError("Connection closed early")
+
+            except (requests.RequestException, Urllib3Error, DownloadError, OSError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise DownloadError(f"Giving up after {self.max_retries} retries: {e}")
+                wait = min(2 ** attempt, 30)
+                chunk_size = MIN_CHUNK
+                if self.verbose:
+                    print(f"   ⏳ Download interrupted ({e}). Retry {attempt}/{self.max_retries} in {wait}s...")
+                time.sleep(wait)
+
+        self._verify(part_path, total, expected_sha256)
+        os.replace(part_path, output_path)
+
+        size = os.path.getsize(output_path)
+        if self.verbose:
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"   ✅ Downloaded {size / 1024**2:.1f} MB in {elapsed:.1f}s ({size / 1024**2 / elapsed:.1f} MB/s)")
+        return size
+
+    def _read_adaptive(self, response, chunk_size):
+        """Yields chunks; the chunk size is re-read every iteration so it can adapt."""
+        self._chunk_size = chunk_size
+        raw = response.raw
+        while True:
+            data = raw.read(self._chunk_size, decode_content=True)
+            if not data:
+                return
+            yield data
+
+    def _next_chunk_size(self, chunk_size, seconds):
+        """Double while chunks arrive fast, halve when they stall."""
+        if seconds < TARGET_CHUNK_SECONDS / 2:
+            chunk_size = min(chunk_size * 2, MAX_CHUNK)
+        elif seconds > TARGET_CHUNK_SECONDS * 2:
+            chunk_size = max(chunk_size // 2, MIN_CHUNK)
+        self._chunk_size = chunk_size
+        return chunk_size
+
+    def _verify(self, path, total, expected_sha256):
+        size = os.path.getsize(path)
+        if total is not None and size != total:
+            raise DownloadError(f"Size mismatch: got {size} bytes, expected {total}")
+        if expected_sha256:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                    h.update(block)
+            if h.hexdigest() != expected_sha256.lower():
+                os.remove(path)  # Corrupt: don't resume from it
+                raise DownloadError("SHA-256 mismatch")
+
+# ============================================================================
+# LOCAL STAND-IN SERVER (Range support + optional mid-stream drop)
+# ============================================================================
+
+def start_local_range_server(payload, drop_after=None, port=0, confirm_length=True):
+    """
+    Serves `payload` bytes at http://127.0.0.1:<port>/file with Range support.
+    If drop_after is set, the FIRST response closes the connection after that many bytes.
+
+    Args:
+        confirm_length: Send 'Content-Range: bytes */<size>' with 416 responses
+
+    Returns:
+        (server, url) - call server.shutdown() when done; server.requests
+        lists the Range header of every request (None = full download)
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'dropped': False}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            rng = self.headers.get('Range')
+            server.requests.append(rng)
+            if rng:
+                m = re.match(r'bytes=(\d+)-(\d*)', rng)
+                start = int(m.group(1))
+                if m.group(2): end = int(m.group(2))
+                if start >= len(payload):
+                    self.send_response(416)
+                    if confirm_length:
+                        self.send_header('Content-Range', f"bytes */{len(payload)}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{len(payload)}")
+            else:
+                self.send_response(200)
+            body = payload[start:end + 1]
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+
+            if drop_after and not state['dropped']:
+                state['dropped'] = True
+                self.wfile.write(body[:drop_after])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/file"
+
+def _selftest():
+    import tempfile
+    payload = os.urandom(3 * 1024 * 1024 + 123)
+    expected = hashlib.sha256(payload).hexdigest()
+    server, url = start_local_range_server(payload, drop_after=1024 * 1024)
+    try:
+        out = os.path.join(tempfile.mkdtemp(), 'video.mp4')
+        dl = ResumableDownloader(max_retries=3, read_timeout=5)
+        dl.download(url, out, expected_sha256=expected)
+        with open(out, 'rb') as f:
+            assert f.read() == payload, "payload mismatch"
+        assert not os.path.exists(out + '.part')
+        print("✅ Self-test passed (dropped connection resumed, hash verified)")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    if '--selftest' in sys.argv:
+        _selftest()
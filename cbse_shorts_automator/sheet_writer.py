@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+File: sheet_writer.py
+Buffered Google Sheets writer.
+Accumulates cell updates and flushes them with ONE values().batchUpdate call
+when a size or time threshold is hit (and on shutdown / crash).
+Also provides FakeSheetsService, an in-memory stand-in for local testing.
+"""
+
+import re
+import time
+import builtins
+import atexit
+import threading
+
+class BufferedSheetWriter:
+    """
+    Usage:
+        with BufferedSheetWriter(sheets, spreadsheet_id) as writer:
+            writer.update("Sheet1!AN5", [["generated"]])
+        # -> remaining updates flushed on exit, even if the batch crashed
+    """
+
+    def __init__(self, sheets, spreadsheet_id, max_pending=30, flush_interval=60.0,
+                 value_input_option='USER_ENTERED', retry_attempts=3, retry_delay=3):
+        """
+        Args:
+            sheets: Sheets API service (googleapiclient) or FakeSheetsService
+            spreadsheet_id: Target spreadsheet
+            max_pending: Flush once this many ranges are buffered
+            flush_interval: Flush buffered updates older than this (seconds)
+        """
+        self.sheets = sheets
+        self.spreadsheet_id = spreadsheet_id
+        self.max_pending = max(1, int(max_pending))
+        self.flush_interval = float(flush_interval)
+        self.value_input_option = value_input_option
+        self.retry_attempts = max(1, int(retry_attempts))
+        self.retry_delay = retry_delay
+
+        # range -> values (later writes to the same range replace earlier ones)
+        self.pending = {}
+        self.oldest_pending = None
+        self.flush_count = 0
+        self.lock = threading.RLock()        # Guards pending; never held during a request
+        self._send_lock = threading.Lock()   # One batchUpdate in flight, in write order
+
+        # Background timer so a long render doesn't hold status writes hostage
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._timer_loop, name="sheet-writer", daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def update(self, range_a1, values):
+        """
+        Queues a values().update equivalent. Flushes if thresholds are hit.
+        Never raises for a failed flush: the updates stay queued for the timer / close().
+        """
+        with self.lock:
+            if range_a1 in self.pending:
+                del self.pending[range_a1]  # Keep insertion order = latest write order
+            self.pending[range_a1] = values
+            if self.oldest_pending is None:
+                self.oldest_pending = time.time()
+            full = len(self.pending) >= self.max_pending
+
+        if full:
+            # Don't queue up behind a flush already in flight (it drains the buffer anyway)
+            self._safe_flush(blocking=False)
+
+    def flush(self, blocking=True):
+        """
+        Sends all buffered updates in a single batchUpdate request.
+        The buffer is swapped out first, so update() keeps working while the
+        request (and its retries) run. On failure the updates are re-queued
+        (newer writes to the same range win) and the error is raised.
+
+        Args:
+            blocking: Wait for a flush already in flight (False: return 0)
+
+        Returns:
+            Number of ranges written
+        """
+        if not self._send_lock.acquire(blocking):
+            return 0
+        try:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                batch, oldest = self.pending, self.oldest_pending
+                self.pending, self.oldest_pending = {}, None
+
+            data = [{'range': r, 'values': v} for r, v in batch.items()]
+            body = {'valueInputOption': self.value_input_option, 'data': data}
+
+            for attempt in range(self.retry_attempts):
+                try:
+                    self.sheets.spreadsheets().values().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id, body=body
+                    ).execute()
+                    break
+                except Exception as e:
+                    print(f"⚠️ Sheets batchUpdate failed ({attempt+1}/{self.retry_attempts}): {e}")
+                    if attempt == self.retry_attempts - 1:
+                        self._requeue(batch, oldest)
+                        raise  # Buffer restored; timer / close() will try again
+                    time.sleep(self.retry_delay)
+
+            with self.lock:
+                self.flush_count += 1
+            print(f"📤 Sheets: flushed {len(data)} range(s) in 1 request")
+            return len(data)
+        finally:
+            self._send_lock.release()
+
+    def _safe_flush(self, blocking=True):
+        try:
+            return self.flush(blocking)
+        except Exception:
+            return 0  # Already logged and re-queued
+
+    def _requeue(self, batch, oldest):
+        """Puts a failed batch back in front of anything queued since."""
+        with self.lock:
+            merged = dict(batch)
+            for r, v in self.pending.items():
+                merged.pop(r, None)
+                merged[r] = v
+            self.pending = merged
+            if self.oldest_pending is None or oldest < self.oldest_pending:
+                self.oldest_pending = oldest
+
+    def _timer_loop(self):
+        tick = max(0.5, min(self.flush_interval / 4, 5.0))
+        while not self._stop.wait(tick):
+            with self.lock:
+                stale = self.oldest_pending is not None and time.time() - self.oldest_pending >= self.flush_interval
+            if stale:
+                self._safe_flush()
+
+    def close(self):
+        """Final flush. Safe to call more than once."""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            with self.lock:
+                lost = list(self.pending.keys())
+            print(f"❌ Sheets: final flush failed, {len(lost)} range(s) NOT written: {lost} ({e})")
+        finally:
+            atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+# ============================================================================
+# FAKE SHEETS SERVICE (local testing without network / quota)
+# ============================================================================
+
+def _col_to_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch.upper()) - 64)
+    return n - 1
+
+def _parse_a1(range_a1):
+    """'Sheet1!AR5:AT5' -> ('Sheet1', row0, col0, row1, col1) with None for open ends."""
+    sheet, _, ref = range_a1.rpartition('!')
+    cells = []
+    for part in ref.split(':'):
+        m = re.match(r'^([A-Za-z]*)(\d*)$', part)
+        col = _col_to_index(m.group(1)) if m.group(1) else None
+        row = int(m.group(2)) - 1 if m.group(2) else None
+        cells.append((row, col))
+    if len(cells) == 1:
+        cells.append(cells[0])
+    (r0, c0), (r1, c1) = cells
+    return sheet or 'Sheet1', r0, c0, r1, c1
+
+class _FakeRequest:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+class _FakeValues:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, spreadsheetId, range):
+        def run():
+            self.service.calls.append(('get', range))
+            sheet, r0, c0, r1, c1 = _parse_a1(range)
+            grid = self.service.grids.setdefault(sheet, [])
+            r0 = r0 or 0
+            r1 = len(grid) - 1 if r1 is None else r1
+            c0 = c0 or 0
+            rows = []
+            for r in builtins.range(r0, min(r1 + 1, len(grid))):
+                row = grid[r][c0:] if c1 is None else grid[r][c0:c1 + 1]
+                rows.append(list(row))
+            return {'range': range, 'values': rows}
+        return _FakeRequest(run)
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        def run():
+            self.service.calls.append(('update', range))
+            self.service._write(range, body['values'])
+            return {'updatedRange': range}
+        return _FakeRequest(run)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            self.service.calls.append(('batchUpdate', [d['range'] for d in body['data']]))
+            for d in body['data']:
+                self.service._write(d['range'], d['values'])
+            return {'totalUpdatedRanges': len(body['data'])}
+        return _FakeRequest(run)
+
+class _FakeSpreadsheets:
+    def __init__(self, service):
+        self._values = _FakeValues(service)
+
+    def values(self):
+        return self._values
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for build('sheets', 'v4', ...).
+    Supports spreadsheets().values().get / update / batchUpdate(...).execute().
+
+    Usage:
+        fake = FakeSheetsService({'Sheet1': rows})
+        writer = BufferedSheetWriter(fake, 'test-sheet')
+        ...
+        fake.calls  # [('batchUpdate', [...ranges...]), ...]
+    """
+
+    def __init__(self, grids=None):
+        self.grids = {name: [list(r) for r in rows] for name, rows in (grids or {}).items()}
+        self.calls = []
+
+    def spreadsheets(self):
+        return _FakeSpreadsheets(self)
+
+    def _write(self, range_a1, values):
+        sheet, r0, c0, _, _ = _parse_a1(range_a1)
+        grid = self.grids.setdefault(sheet, [])
+        for dr, row_vals in enumerate(values):
+            r = r0 + dr
+            while len(grid) <= r:
+                grid.append([])
+            for dc, v in enumerate(row_vals):
+                c = c0 + dc
+                while len(grid[r]) <= c:
+                    grid[r].append("")
+                grid[r][c] = v
@@ -11,8 +11,10 @@ import json
 import random
 import textwrap
 import glob
+import threading
+import multiprocessing
 from moviepy.editor import (
-    VideoFileClip, TextClip, CompositeVideoClip, 
+    VideoFileClip,
     AudioFileClip, ColorClip, CompositeAudioClip,
     ImageClip, vfx
 )
@@ -20,6 +22,9 @@ from moviepy.editor import (
 from moviepy.audio.fx.all import audio_normalize
 from voice_manager import VoiceManager
 from effects_manager import EffectsManager 
+from timeline_compositor import FlatCompositeClip, IndexedCompositeVideoClip
+from text_sprite_cache import make_text_clip, configure_text_cache
+from video_encoder import encode_clip, encode_clip_segmented, plan_segments, resolve_profile, resolve_threads, x264_output_params
 from visual_effects_quiz import FPS
 
 # Theme configurations
@@ -52,7 +57,12 @@ WIDTH = 1080
 HEIGHT = 1920
 
 class ShortsEngine:
-    def __init__(self, config_path='config/generator_config.json'):
+    def __init__(self, config_path='config/generator_config.json', encode_share=1):
+        """
+        Args:
+            config_path: Generator config JSON
+            encode_share: Render processes sharing this machine's cores (for 'auto' encoder threads)
+        """
         if not os.path.exists('config'): os.makedirs('config')
         if not os.path.exists(config_path):
             with open(config_path, 'w') as f:
@@ -66,6 +76,8 @@ class ShortsEngine:
         with open(config_path, 'r') as f: self.config = json.load(f)
         
         self.channel_name = self.config.get('CHANNEL_NAME', 'SUBSCRIBE NOW')
+        self.encode_share = encode_share
+        self.last_render_metrics = None
         self.logo_path = 'config/logo.png'
         
         self.music_dir = 'config/music'
@@ -77,6 +89,9 @@ class ShortsEngine:
         # Initialize Visual FX Manager (Loaded but not used in bypass mode)
         self.fx_manager = EffectsManager()
 
+        # Rasterized text shared by every TextClip-style label in this process
+        configure_text_cache(self.config)
+
         self.voice_manager = VoiceManager()
 
         import moviepy.config as mpconf
@@ -98,27 +113,83 @@ class ShortsEngine:
         # This means "Black Text" triggers earlier (on medium colors), avoiding white-on-light-green.
         return 'black' if luminance > 0.5 else 'white'
 
+    def compose(self, clips, size=(WIDTH, HEIGHT)):
+        """
+        Final (opaque) composite of a short's layers.
+        Uses the single-pass FlatCompositeClip unless COMPOSITOR.FLAT is false
+        (then a time-indexed MoviePy composite).
+        """
+        comp_cfg = self.config.get('COMPOSITOR', {})
+        if comp_cfg.get('FLAT', True):
+            flat = FlatCompositeClip(
+                clips, size=size,
+                static_plates=comp_cfg.get('STATIC_PLATES', True),
+                plate_cache_mb=comp_cfg.get('PLATE_CACHE_MB', 256)
+            )
+            print(f"🧱 Flat compositor: {flat.layer_count} layers")
+            return flat
+        return IndexedCompositeVideoClip(clips, size=size)
+
     # === BYPASS MODE: SKIPS STICKERS ===
-    def render_with_effects(self, video_clip, script_data, output_path):
+    def render_with_effects(self, video_clip, script_data, output_path, cut_points=None):
         """
         Renders the video to disk.
         NOTE: Visual FX (Stickers) are currently SUSPENDED for stability.
+        
+        Args:
+            cut_points: Scene boundary times (seconds) where a segmented render may split
         """
         print("✨ FX SUSPENDED: Rendering clean video (no stickers)...")
         
         # We skip self.fx_manager.apply_visual_effects()
         # and just render the raw clip directly.
         
-        print(f"🎬 Rendering final video to: {output_path}")
+        enc_cfg = self.config.get('ENCODING', {})
+        profile = resolve_profile(self.config)
+        print(f"🎬 Rendering final video to: {output_path} (profile: {profile['NAME']})")
+        
+        if enc_cfg.get('PIPE_ENCODER', True):
+            bounds = self._segment_plan(video_clip.duration, cut_points)
+            if len(bounds) > 2:
+                self.last_render_metrics = encode_clip_segmented(
+                    video_clip, output_path, FPS, profile, bounds,
+                    temp_dir=self.config['DIRS']['TEMP'], thread_share=self.encode_share
+                )
+                return self.last_render_metrics
+            self.last_render_metrics = encode_clip(
+                video_clip, output_path, FPS, profile,
+                temp_dir=self.config['DIRS']['TEMP'], thread_share=self.encode_share
+            )
+            return self.last_render_metrics
+        
         video_clip.write_videofile(
             output_path,
             fps=FPS,
             codec='libx264',
             audio_codec='aac',
-            threads=4,
-            preset='ultrafast' # Keeps the speed gain
+            audio_bitrate=str(profile.get('AUDIO_BITRATE', '128k')),
+            threads=resolve_threads(profile.get('THREADS', 'auto'), self.encode_share),
+            preset=profile.get('PRESET', 'veryfast'),
+            ffmpeg_params=x264_output_params(profile, FPS)
         )
 
+    def _segment_plan(self, duration, cut_points):
+        """Segment boundaries for SEGMENTED_RENDER (just [0, duration] when disabled)."""
+        seg_cfg = self.config.get('SEGMENTED_RENDER', {})
+        if not seg_cfg.get('ENABLED', False) or 'fork' not in multiprocessing.get_all_start_methods():
+            return [0.0, duration]
+        if threading.active_count() > 1:
+            # Forking a threaded process can leave a child holding a lock forever.
+            # main_shorts_generator renders through a RenderHost (render_host.py),
+            # which is forked before the sheet writer / Gemini / pipeline threads start
+            print("   ⚠️ Segmented render skipped: process has other threads running (render through a RenderHost)")
+            return [0.0, duration]
+        segments = seg_cfg.get('SEGMENTS', 'auto')
+        if segments == 'auto':
+            # Farm workers already share the cores: each takes its slice
+            segments = min((os.cpu_count() or 2) // max(1, self.encode_share), seg_cfg.get('MAX_SEGMENTS', 8))
+        return plan_segments(duration, segments, cut_points, seg_cfg.get('MIN_SEGMENT_SECONDS', 5))
+
     def create_outro(self, duration, cta_text="SUBSCRIBE FOR MORE!"):
         bg_color = (255, 255, 255) 
         bg = ColorClip(size=(WIDTH, HEIGHT), color=bg_color, duration=duration)
@@ -134,7 +205,7 @@ class ShortsEngine:
                 logo = logo.resize(pulse).set_position(('center', center_y - 200))
                 clips.append(logo)
                 
-                name_clip = TextClip(
+                name_clip = make_text_clip(
                     self.channel_name.upper(),
                     fontsize=60, color='black', font=FONT_BOLD,
                     stroke_color='black', stroke_width=2
@@ -142,22 +213,22 @@ class ShortsEngine:
                 clips.append(name_clip)
             except Exception as e:
                 print(f"⚠️ Logo error: {e}")
-                txt = TextClip(self.channel_name, fontsize=80, color='black', font=FONT_BOLD).set_position('center').set_duration(duration)
+                txt = make_text_clip(self.channel_name, fontsize=80, color='black', font=FONT_BOLD).set_position('center').set_duration(duration)
                 clips.append(txt)
         else:
-            name_clip = TextClip(
+            name_clip = make_text_clip(
                 self.channel_name.upper(),
                 fontsize=85, color='black', font=FONT_BOLD
             ).set_position(('center', center_y - 50)).set_duration(duration)
             
-            cta_clip = TextClip(
+            cta_clip = make_text_clip(
                 cta_text,
                 fontsize=50, color='black', font=FONT_BOLD
             ).set_position(('center', center_y + 100)).set_duration(duration)
             
             clips.extend([name_clip, cta_clip])
 
-        return CompositeVideoClip(clips, size=(WIDTH, HEIGHT)).crossfadein(0.5)
+        return self.compose(clips, size=(WIDTH, HEIGHT)).crossfadein(0.5)
 
     def _get_contrast_text_color(self, bg_color):
         """
@@ -298,14 +369,12 @@ class ShortsEngine:
         # ============================================================
         
         try:
-            from moviepy.editor import TextClip
-            
             channel_name_y = center_y + res_scale(50) if logo_present else center_y - res_scale(80)
             # Calculate contrast color for theme background
             text_color = self._get_contrast_text_color(bg_color)
             stroke_color = 'black' if text_color == 'white' else 'white'
 
-            name_clip = TextClip(
+            name_clip = make_text_clip(
                 self.channel_name.upper(),
                 fontsize=res_scale(70),
                 color=text_color,  # ✅ Adaptive
@@ -345,7 +414,7 @@ class ShortsEngine:
             # Line 1: Main USP (larger, highlight color)
             usp_y_base = center_y + res_scale(160) if logo_present else center_y + res_scale(40)
             
-            usp_line1 = TextClip(
+            usp_line1 = make_text_clip(
                 line1,
                 fontsize=res_scale(52),
                 color=highlight_color,
@@ -361,7 +430,7 @@ class ShortsEngine:
             
             clips.append(usp_line1)
             
-            usp_line2 = TextClip(
+            usp_line2 = make_text_clip(
                 line2,
                 fontsize=res_scale(42),
                 color=text_color,  # ✅ Same as channel name
@@ -413,7 +482,7 @@ class ShortsEngine:
             clips.append(button_bg)
             
             # Button text
-            button_text = TextClip(
+            button_text = make_text_clip(
                 "🔔 " + cta_text,
                 fontsize=res_scale(48),
                 color='white',
@@ -434,7 +503,7 @@ class ShortsEngine:
         # COMPOSITE & RETURN
         # ============================================================
         
-        outro_clip = CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+        outro_clip = self.compose(clips, size=(WIDTH, HEIGHT))
         
         # Add subtle fade-in at start
         outro_clip = outro_clip.crossfadein(0.5)
@@ -483,11 +552,11 @@ class ShortsEngine:
 
         wrapped = "\n".join(textwrap.wrap(text, width=wrap_width))
         try:
-            return TextClip(wrapped, fontsize=int(fontsize), color=color, font=FONT_BOLD if bold else FONT_REGULAR, 
+            return make_text_clip(wrapped, fontsize=int(fontsize), color=color, font=FONT_BOLD if bold else FONT_REGULAR, 
                             bg_color=bg_color, stroke_color=stroke_color, stroke_width=stroke_width, 
                             method='caption', size=(WIDTH - 100, None), align=align)
         except Exception:
-            return TextClip(wrapped, fontsize=int(fontsize), color=color, font=FONT_BOLD if bold else FONT_REGULAR)
+            return make_text_clip(wrapped, fontsize=int(fontsize), color=color, font=FONT_BOLD if bold else FONT_REGULAR)
 
     def create_background(self, theme_name, duration, video_clip=None):
         theme = self.get_theme(theme_name)
@@ -518,18 +587,26 @@ class ShortsEngine:
             import traceback; traceback.print_exc()
             return {'success': False, 'error': str(e)}
 
-def generate_random_config(class_level=None):
+def generate_random_config(class_level=None, seed=None):
+    """
+    Random template / theme / style picks for one short.
+    
+    Args:
+        seed: e.g. the row key - the same row then always gets the same picks
+              (so a re-render or retry hits the script cache). Voice stays random.
+    """
+    rng = random.Random(seed) if seed is not None else random
     templates = ['quiz', 'fact', 'tip']
     themes = list(THEMES.keys())
     opening_styles = ['countdown', 'montage', 'mystery']
     
     config = {
-        'template': random.choice(templates),
+        'template': rng.choice(templates),
         'voice': VoiceManager.get_random_voice_name(),
-        'theme': random.choice(themes),
-        'cta_style': random.choice(['persistent', 'bookend', 'both']),
-        'opening_style': random.choice(opening_styles),
-        'class_level': class_level or random.randint(6, 12),
-        'retention_strategy': random.choice(['cliffhanger', 'teaser', 'curiosity'])
+        'theme': rng.choice(themes),
+        'cta_style': rng.choice(['persistent', 'bookend', 'both']),
+        'opening_style': rng.choice(opening_styles),
+        'class_level': class_level or rng.randint(6, 12),
+        'retention_strategy': rng.choice(['cliffhanger', 'teaser', 'curiosity'])
     }
     return config
\ No newline at end of file
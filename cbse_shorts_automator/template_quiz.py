@@ -12,10 +12,12 @@ import imagemagick_setup
 import os
 import math
 import concurrent.futures
-from moviepy.editor import VideoFileClip, CompositeVideoClip, CompositeAudioClip, ColorClip, AudioFileClip, TextClip, vfx
+from moviepy.editor import CompositeVideoClip, CompositeAudioClip, ColorClip, AudioFileClip, vfx
+from text_sprite_cache import make_text_clip
 from voice_manager import VoiceManager
 from karaoke_manager import KaraokeManager
-from video_processor import VideoProcessor
+from video_encoder import open_video_source
+from video_processor import create_video_processor
 from sfx_manager import SFXManager  # <--- NEW IMPORT
 from usp_content_variations import USPContent
 from visual_effects_quiz import QuizVisualEffects
@@ -154,7 +156,7 @@ class QuizTemplate:
         target_height = config.get('height', 1920)
         target_fps = config.get('fps', 24)
 
-        set_resolution(target_width, target_height)
+        set_resolution(target_width, target_height, target_fps)
         
         # Update module-level WIDTH/HEIGHT for MoviePy
         global WIDTH, HEIGHT, FPS
@@ -180,7 +182,7 @@ class QuizTemplate:
         # Select ONE voice for entire video
         selected_voice_key = voice_name if voice_name else voice_mgr.get_random_voice_name()
         print(f"   🎤 Using voice: {selected_voice_key} (consistent across all segments)")
-        video_proc = VideoProcessor(temp_dir=self.engine.config['DIRS']['TEMP'])
+        video_proc = create_video_processor(self.engine.config)
         karaoke_mgr = KaraokeManager(voice_mgr, self.engine.config['DIRS']['TEMP'])
         sfx_mgr = SFXManager() # <--- NEW INITIALIZATION
         
@@ -256,7 +258,7 @@ class QuizTemplate:
         # NEW:
         print(f"   🧠 AI Watching video to find relevant clips ({int(total_dur)}s)...")
         #src_vid = video_proc.prepare_video_for_short(video_path, total_dur, script=script, width=WIDTH)
-        src_vid = VideoFileClip(video_path)
+        src_vid = open_video_source(video_path)
 
         # Configure PIP size
         PIP_HEIGHT = res_scale(333)  # Adjust this value (225 = small, 400 = medium, 495 = large)
@@ -297,7 +299,7 @@ class QuizTemplate:
         
         hook_txt = self.engine.get_contrast_color(hook_box)
         hook_text = USPContent.get_random_hook()
-        hook_clip = TextClip(hook_text, fontsize=res_scale(52), color=hook_txt, bg_color=hook_box, font='Arial-Bold', method='label', size=(WIDTH - res_scale(100), res_scale(130)))
+        hook_clip = make_text_clip(hook_text, fontsize=res_scale(52), color=hook_txt, bg_color=hook_box, font='Arial-Bold', method='label', size=(WIDTH - res_scale(100), res_scale(130)))
 
         # Add pulsing animation
         def hook_pulse(t):
@@ -395,7 +397,7 @@ class QuizTemplate:
         for i in range(int(THINK_TIME * timer_label_pulse_freq)):  # Flash twice per second
             opacity = 1.0 if i % 2 == 0 else 0.5  # Alternate full/half
             
-            label = TextClip(
+            label = make_text_clip(
                 timer_label_text,
                 fontsize=res_scale(62),
                 color='#FFFF00',  # Bright yellow
@@ -552,10 +554,11 @@ class QuizTemplate:
         
         final_audio = self.engine.add_background_music(CompositeAudioClip(full_audio_stack), total_dur)
         
-        final_raw = CompositeVideoClip(clips, size=(WIDTH, HEIGHT)).set_audio(final_audio)
+        final_raw = self.engine.compose(clips, size=(WIDTH, HEIGHT)).set_audio(final_audio)
 
         try:
-            self.engine.render_with_effects(final_raw, script, output_path)
+            self.engine.render_with_effects(final_raw, script, output_path,
+                                            cut_points=[t_q, t_a, t_think, t_ans, t_cta, t_outro])
         finally:
             if self.engine.config.get('DELETE_TEMP_FILES', True):
                 import glob
@@ -11,7 +11,7 @@ import concurrent.futures
 from moviepy.editor import CompositeVideoClip, CompositeAudioClip, TextClip, AudioFileClip, vfx
 from voice_manager import VoiceManager
 from karaoke_manager import KaraokeManager
-from video_processor import VideoProcessor
+from video_processor import create_video_processor
 from sfx_manager import SFXManager  # <--- NEW IMPORT
 
 WIDTH = 1080
@@ -37,7 +37,7 @@ class TipTemplate:
         # Select ONE voice for entire video
         selected_voice_key = voice_name if voice_name else voice_mgr.get_random_voice_name()
         print(f"   🎤 Using voice: {selected_voice_key} (consistent across all segments)")
-        video_proc = VideoProcessor(temp_dir=self.engine.config['DIRS']['TEMP'])
+        video_proc = create_video_processor(self.engine.config)
         karaoke_mgr = KaraokeManager(voice_mgr, self.engine.config['DIRS']['TEMP'])
         sfx_mgr = SFXManager() # <--- NEW INITIALIZATION
         
@@ -212,10 +212,11 @@ class TipTemplate:
         
         full_audio_stack = audio_list + sfx_clips # Combine Voice + SFX
         final_audio = self.engine.add_background_music(CompositeAudioClip(full_audio_stack), total_dur)
-        final_raw = CompositeVideoClip(clips, size=(WIDTH, HEIGHT)).set_audio(final_audio)
+        final_raw = self.engine.compose(clips, size=(WIDTH, HEIGHT)).set_audio(final_audio)
         
         try:
-            self.engine.render_with_effects(final_raw, script, output_path)
+            self.engine.render_with_effects(final_raw, script, output_path,
+                                            cut_points=[t_title, t_content, t_bonus, t_cta, t_outro])
         finally:
             if self.engine.config.get('DELETE_TEMP_FILES', True):
                 import glob
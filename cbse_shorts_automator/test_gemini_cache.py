@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+File: test_gemini_cache.py
+Purpose: Offline checks for the Gemini response cache, using StubGenerativeModel.
+- Hit / miss accounting, and a cached row script never reaches the "API"
+- TTL expiry and least-recently-used size eviction
+- Replay mode raises ReplayCacheMiss instead of calling the API
+- Concurrent identical requests call the API once and leave no lock entries behind
+No network, no keys: python test_gemini_cache.py
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from gemini_cache import GeminiResponseCache, ReplayCacheMiss, StubGenerativeModel
+from main_shorts_generator import GeminiManager
+
+PDF_TEXT = "Photosynthesis converts light energy into chemical energy. " * 40
+
+def fresh_cache(mode='read_write', **kwargs):
+    return GeminiResponseCache(tempfile.mkdtemp(), mode=mode, **kwargs)
+
+def stub_manager(cache):
+    gemini = GeminiManager(use_stub=True)
+    gemini.cache = cache
+    return gemini
+
+def test_hit_and_miss():
+    cache = fresh_cache()
+    key = cache.key("prompt", 'gemini-2.5-flash', 'quiz', 0.9)
+    assert cache.get(key) is None and cache.misses == 1
+    cache.put(key, "answer", model='gemini-2.5-flash', template='quiz')
+    assert cache.get(key) == "answer" and cache.hits == 1
+    assert cache.key("prompt", 'gemini-2.5-flash', 'fact', 0.9) != key, "template must be part of the key"
+
+    gemini = stub_manager(fresh_cache())
+    calls = StubGenerativeModel.calls
+    first = gemini.get_script(PDF_TEXT, 'Class 10', 'quiz', chapter_key='chap', row_key='5:vid')
+    second = gemini.get_script(PDF_TEXT, 'Class 10', 'quiz', chapter_key='chap', row_key='5:vid')
+    assert first == second and StubGenerativeModel.calls == calls + 1, StubGenerativeModel.calls - calls
+    print("✅ Hit / miss: second request for the same row served from cache (1 stub call)")
+
+def test_ttl_expiry():
+    cache = fresh_cache(ttl_hours=1)
+    key = cache.key("prompt", 'gemini-2.5-flash', 'quiz', 0.9)
+    cache.put(key, "answer")
+    path = cache._path(key)
+    with open(path, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    entry['created'] = time.time() - 2 * 3600
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+
+    assert cache.get(key) is None and not os.path.exists(path)
+    print("✅ TTL: expired entry is a miss and is deleted")
+
+def test_lru_eviction():
+    cache = fresh_cache(max_size_mb=3 * 1100 / (1024 * 1024))   # Room for ~3 entries of 1 KB
+    keys = [cache.key(f"prompt {i}", 'gemini-2.5-flash', 'quiz', 0.9) for i in range(4)]
+    now = time.time()
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, "x" * 1000)
+        os.utime(cache._path(key), (now - 100 + i, now - 100 + i))
+    assert cache.get(keys[0]) is not None   # Touch: keys[1] is now least recently used
+
+    cache.put(keys[3], "x" * 1000)
+    alive = [os.path.exists(cache._path(k)) for k in keys]
+    assert alive == [True, False, True, True], alive
+    print("✅ LRU: over budget, the least recently used entry is evicted")
+
+def test_replay_miss():
+    cache = fresh_cache()
+    stub_manager(cache).get_script(PDF_TEXT, 'Class 10', 'fact', chapter_key='chap', row_key='6:vid')
+
+    replay = GeminiResponseCache(cache.cache_dir, mode='replay')
+    gemini = stub_manager(replay)
+    calls = StubGenerativeModel.calls
+    assert gemini.get_script(PDF_TEXT, 'Class 10', 'fact', chapter_key='chap', row_key='6:vid')
+    try:
+        gemini.get_script(PDF_TEXT, 'Class 10', 'fact', chapter_key='chap', row_key='7:vid')
+        raise AssertionError("replay miss did not raise")
+    except ReplayCacheMiss:
+        pass
+    assert StubGenerativeModel.calls == calls, "replay mode must never call the API"
+    print("✅ Replay: cached row served, uncached row raises ReplayCacheMiss, 0 stub calls")
+
+def test_request_lock_cleanup():
+    cache = fresh_cache()
+    gemini = stub_manager(cache)
+    calls = StubGenerativeModel.calls
+    threads = [threading.Thread(target=gemini.get_script,
+                                args=(PDF_TEXT, 'Class 10', 'tip'),
+                                kwargs={'chapter_key': 'chap', 'row_key': '8:vid'})
+               for _ in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert StubGenerativeModel.calls == calls + 1, StubGenerativeModel.calls - calls
+    assert not cache._locks, f"{len(cache._locks)} request lock(s) left behind"
+    print("✅ Request locks: 6 identical requests -> 1 stub call, lock table empty afterwards")
+
+if __name__ == "__main__":
+    test_hit_and_miss()
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_replay_miss()
+    test_request_lock_cleanup()
+    print("\n🎉 All Gemini cache checks passed")
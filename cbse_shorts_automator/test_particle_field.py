@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+File: test_particle_field.py
+Purpose: Compares ParticleFieldClip with the MoviePy composite it replaced
+(one ColorClip per particle, set_opacity + a position callback).
+Tolerance, per channel:
+- pixels under no sprite or exactly one sprite: identical
+- pixels under k >= 2 overlapping sprites: at most k - 1 levels apart
+  (MoviePy rounds to uint8 after every blit; the field multiplies the
+  transmittance of all k sprites in float and rounds once)
+Small canvas, many particles, so plenty of overlaps: python test_particle_field.py
+"""
+
+import numpy as np
+from moviepy.editor import ColorClip, ImageClip, CompositeVideoClip
+from visual_fx_utils import ParticleFieldClip
+
+WIDTH, HEIGHT = 60, 120
+DURATION = 2.0
+FPS = 24
+COLOR = (250, 204, 21)
+
+def build(count=200, seed=2):
+    rng = np.random.default_rng(seed)
+    base = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    base[...] = (20, 30, 60)
+    x = rng.integers(0, WIDTH, count)
+    y = HEIGHT + rng.integers(0, 40, count)
+    speed = rng.uniform(40, 80, count)
+    size = rng.choice([6, 8, 10, 12], count)
+    opacity = rng.uniform(0.2, 0.4, count)
+
+    field = ParticleFieldClip((WIDTH, HEIGHT), DURATION, base, COLOR)
+    field.add_drifters(x, y, speed, size, opacity, wobble=10)
+
+    # The pre-vectorization backdrop: one blit per particle
+    layers = [ImageClip(base).set_duration(DURATION)]
+    for i in range(count):
+        dot = ColorClip((int(size[i]), int(size[i])), color=COLOR).set_opacity(float(opacity[i]))
+        dot = dot.set_duration(DURATION).set_position(
+            lambda t, i=i: (x[i] + np.sin(t * 2.0) * 10, y[i] - speed[i] * t))
+        layers.append(dot)
+    return field, CompositeVideoClip(layers, size=(WIDTH, HEIGHT))
+
+def overlap_counts(field, t):
+    """Number of drifters covering each pixel at t (same placement rules as the field)."""
+    d = field.drifters
+    x0 = (d['x'] + np.sin(t * d['freq']) * d['wobble']).astype(np.int64)
+    y0 = (d['y'] - d['speed'] * t).astype(np.int64)
+    counts = np.zeros(WIDTH * HEIGHT, dtype=np.int64)
+    for s in np.unique(d['size']):
+        sel = d['size'] == s
+        idx, _ = field._sprite_pixels(x0[sel], y0[sel], int(s), int(s), d['opacity'][sel])
+        np.add.at(counts, idx, 1)
+    return counts.reshape(HEIGHT, WIDTH)
+
+def test_matches_moviepy_composite():
+    field, reference = build()
+    worst, max_overlap = 0, 0
+    for t in np.arange(0, DURATION, 1.0 / FPS):
+        diff = np.abs(field.get_frame(t).astype(np.int64) - reference.get_frame(t).astype(np.int64)).max(axis=2)
+        counts = overlap_counts(field, t)
+        allowed = np.maximum(counts - 1, 0)
+        bad = diff > allowed
+        assert not bad.any(), (f"t={t:.3f}: {int(bad.sum())} pixel(s) off by up to {int(diff[bad].max())} "
+                               f"with {int(counts[bad].max())} overlapping sprites")
+        worst, max_overlap = max(worst, int(diff.max())), max(max_overlap, int(counts.max()))
+    assert max_overlap >= 3, "scene too sparse to exercise the overlap tolerance"
+    print(f"✅ ParticleFieldClip vs MoviePy composite: exact under <= 1 sprite, "
+          f"max {worst} level(s) off with up to {max_overlap} overlapping sprites")
+
+if __name__ == "__main__":
+    test_matches_moviepy_composite()
+    print("\n🎉 Particle field check passed")
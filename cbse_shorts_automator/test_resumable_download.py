@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+File: test_resumable_download.py
+Purpose: Offline checks for ResumableDownloader against the local Range server.
+- Dropped connection resumes with a Range request (no re-download from zero)
+- Finished '.part' + 416 with a confirming Content-Range is accepted as is
+- Bogus '.part' + 416 WITHOUT a length is discarded and downloaded again
+- '.part' + 416 whose length disagrees is discarded and downloaded again
+No network: python test_resumable_download.py
+"""
+
+import os
+import hashlib
+import tempfile
+from resumable_download import ResumableDownloader, start_local_range_server
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+def download(url, part_bytes=None):
+    """Runs one download into a fresh folder, optionally seeding '<out>.part'."""
+    out = os.path.join(tempfile.mkdtemp(), 'video.mp4')
+    if part_bytes is not None:
+        with open(out + '.part', 'wb') as f:
+            f.write(part_bytes)
+    dl = ResumableDownloader(max_retries=3, read_timeout=5, verbose=False)
+    size = dl.download(url, out, expected_sha256=SHA256)
+    with open(out, 'rb') as f:
+        assert f.read() == PAYLOAD, "payload mismatch"
+    assert size == len(PAYLOAD) and not os.path.exists(out + '.part')
+    return out
+
+def test_drop_and_resume():
+    server, url = start_local_range_server(PAYLOAD, drop_after=1024 * 1024)
+    try:
+        download(url)
+        assert server.requests[0] is None, server.requests
+        # The last partial read before the drop may be lost, so resume lands at or below 1 MB
+        resumed_at = int(server.requests[1][len('bytes='):-1])
+        assert len(server.requests) == 2 and 0 < resumed_at <= 1024 * 1024, server.requests
+        print(f"✅ Drop + resume: second request resumed at {resumed_at / 1024:.0f} KB")
+    finally:
+        server.shutdown()
+
+def test_complete_part_confirmed_by_416():
+    server, url = start_local_range_server(PAYLOAD, confirm_length=True)
+    try:
+        download(url, part_bytes=PAYLOAD)
+        assert server.requests == [f"bytes={len(PAYLOAD)}-"], server.requests
+        print("✅ 416 with Content-Range: complete .part accepted without re-downloading")
+    finally:
+        server.shutdown()
+
+def test_unconfirmed_416_restarts():
+    # Same length as the real file, wrong bytes: only the server's size could vouch for it
+    server, url = start_local_range_server(PAYLOAD, confirm_length=False)
+    try:
+        download(url, part_bytes=os.urandom(len(PAYLOAD)))
+        assert server.requests == [f"bytes={len(PAYLOAD)}-", None], server.requests
+        print("✅ 416 without a length: .part discarded, file downloaded again")
+    finally:
+        server.shutdown()
+
+def test_oversized_part_restarts():
+    server, url = start_local_range_server(PAYLOAD, confirm_length=True)
+    try:
+        download(url, part_bytes=PAYLOAD + b'junk')
+        assert server.requests == [f"bytes={len(PAYLOAD) + 4}-", None], server.requests
+        print("✅ 416 with a different length: .part discarded, file downloaded again")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_drop_and_resume()
+    test_complete_part_confirmed_by_416()
+    test_unconfirmed_416_restarts()
+    test_oversized_part_restarts()
+    print("\n🎉 All resumable download checks passed")
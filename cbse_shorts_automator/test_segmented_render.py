@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+File: test_segmented_render.py
+Purpose: Segmented rendering while the coordinator has threads running.
+- Inside `with create_sheet_writer(...)` (its timer thread is alive) a direct
+  render_with_effects falls back to one segment
+- The same render sent to a RenderHost (forked before the writer started) is
+  split into several segment files and joined into one complete video
+No network, no credentials: python test_segmented_render.py
+"""
+
+import os
+import json
+import tempfile
+import threading
+import numpy as np
+from moviepy.editor import VideoClip, VideoFileClip
+
+import video_encoder
+from render_host import RenderHost
+from sheet_writer import FakeSheetsService
+from shorts_engine import ShortsEngine
+from main_shorts_generator import create_sheet_writer, CONFIG_FILE
+
+DURATION = 6.0
+FPS = 24
+
+def write_config(temp_dir):
+    """Generator config with segmented rendering on (3 segments, draft profile)."""
+    with open(CONFIG_FILE, 'r') as f:
+        config = json.load(f)
+    config['DIRS'] = dict(config.get('DIRS', {}), TEMP=temp_dir)
+    config['ENCODING'] = dict(config.get('ENCODING', {}), PIPE_ENCODER=True, PROFILE='draft')
+    config['SEGMENTED_RENDER'] = {'ENABLED': True, 'SEGMENTS': 3, 'MAX_SEGMENTS': 8, 'MIN_SEGMENT_SECONDS': 1}
+    path = os.path.join(temp_dir, 'generator_config.json')
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return path
+
+def gradient_clip():
+    def make_frame(t):
+        frame = np.zeros((64, 64, 3), dtype=np.uint8)
+        frame[..., 0] = int(255 * t / DURATION)
+        frame[:, int(t * 10) % 64, 1] = 255
+        return frame
+    return VideoClip(make_frame, duration=DURATION)
+
+def render(engine, output_path, log_path):
+    """render_with_effects on a test clip, logging every segment file that gets encoded."""
+    encode_segment = video_encoder._encode_segment
+    def logged(clip, times, path, *args):
+        encode_segment(clip, times, path, *args)
+        with open(log_path, 'a') as f:
+            f.write(f"{path} {os.path.getsize(path)}\n")
+    video_encoder._encode_segment = logged
+    try:
+        return engine.render_with_effects(gradient_clip(), {}, output_path, cut_points=[2.0, 4.0])
+    finally:
+        video_encoder._encode_segment = encode_segment
+
+def segment_files(log_path):
+    if not os.path.exists(log_path): return []
+    with open(log_path) as f:
+        return [line.split() for line in f if line.strip()]
+
+def test_segmented_render_with_sheet_writer():
+    temp_dir = tempfile.mkdtemp()
+    config_path = write_config(temp_dir)
+    output_path = os.path.join(temp_dir, 'short.mp4')
+    log_path = os.path.join(temp_dir, 'segments.log')
+
+    host = RenderHost(config_path)                      # Before the writer's thread
+    try:
+        with create_sheet_writer(FakeSheetsService()):
+            assert threading.active_count() > 1, "sheet writer thread not running"
+
+            metrics = host.run(render, output_path, log_path)
+            parts = segment_files(log_path)
+            assert metrics['segments'] > 1 and len(parts) == metrics['segments'], (metrics, parts)
+            assert all(int(size) > 0 for _, size in parts), parts
+
+            clip = VideoFileClip(output_path)
+            frames = clip.reader.nframes
+            clip.close()
+            assert abs(clip.duration - DURATION) < 0.1 and frames >= DURATION * FPS - 1, (clip.duration, frames)
+            print(f"✅ RenderHost inside the sheet writer block: {len(parts)} segment files, {frames} frames joined")
+
+            # The same render in this (threaded) process must not fork
+            os.remove(log_path)
+            render(ShortsEngine(config_path), output_path, log_path)
+            assert not segment_files(log_path), "forked segment processes from a threaded process"
+            print("✅ Direct render with threads running: single segment, no fork")
+    finally:
+        host.close()
+    assert not host.proc.is_alive()
+
+if __name__ == "__main__":
+    test_segmented_render_with_sheet_writer()
+    print("\n🎉 Segmented render checks passed")
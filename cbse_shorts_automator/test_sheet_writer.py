@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+File: test_sheet_writer.py
+Purpose: Offline checks for BufferedSheetWriter against FakeSheetsService.
+- Repeated writes to one range coalesce (latest value wins)
+- Size threshold and timer flushes send ONE batchUpdate each
+- A failing flush never escapes update(); updates are re-queued and sent later
+- update() is not blocked while a flush sleeps between retries
+No network, no credentials: python test_sheet_writer.py
+"""
+
+import time
+import threading
+from sheet_writer import BufferedSheetWriter, FakeSheetsService
+
+class FlakySheetsService(FakeSheetsService):
+    """FakeSheetsService whose next `failures` batchUpdate calls raise."""
+
+    def __init__(self, failures=0, delay=0.0):
+        super().__init__()
+        self.failures = failures
+        self.delay = delay
+        self.attempts = 0
+
+    def spreadsheets(self):
+        service = self
+        real = super().spreadsheets()
+
+        class _Values:
+            def batchUpdate(self, spreadsheetId, body):
+                request = real.values().batchUpdate(spreadsheetId=spreadsheetId, body=body)
+
+                class _Request:
+                    def execute(self):
+                        service.attempts += 1
+                        time.sleep(service.delay)
+                        if service.failures > 0:
+                            service.failures -= 1
+                            raise ConnectionError("simulated 503")
+                        return request.execute()
+                return _Request()
+
+        class _Spreadsheets:
+            def values(self):
+                return _Values()
+        return _Spreadsheets()
+
+def batches(fake):
+    return [c[1] for c in fake.calls if c[0] == 'batchUpdate']
+
+def test_coalescing():
+    fake = FakeSheetsService()
+    with BufferedSheetWriter(fake, 'test', max_pending=10, flush_interval=3600) as writer:
+        writer.update("Sheet1!AN5", [["processing"]])
+        writer.update("Sheet1!AN6", [["processing"]])
+        writer.update("Sheet1!AN5", [["generated"]])
+        assert not fake.calls, "nothing should be sent before a threshold"
+    assert batches(fake) == [["Sheet1!AN6", "Sheet1!AN5"]], batches(fake)
+    assert fake.grids['Sheet1'][4][39] == "generated"
+    print("✅ Coalescing: 3 writes -> 1 request, 2 ranges, latest value kept")
+
+def test_threshold_flush():
+    fake = FakeSheetsService()
+    writer = BufferedSheetWriter(fake, 'test', max_pending=3, flush_interval=3600)
+    for row in (5, 6, 7):
+        writer.update(f"Sheet1!AN{row}", [["generated"]])
+    assert len(batches(fake)) == 1 and len(batches(fake)[0]) == 3, batches(fake)
+    assert not writer.pending
+    writer.close()
+    assert len(batches(fake)) == 1, "close() with an empty buffer must not send"
+    print("✅ Threshold flush: 1 request at max_pending")
+
+def test_timer_flush():
+    fake = FakeSheetsService()
+    writer = BufferedSheetWriter(fake, 'test', max_pending=100, flush_interval=0.2)
+    writer.update("Sheet1!AN5", [["generated"]])
+    deadline = time.time() + 5
+    while not fake.calls and time.time() < deadline:
+        time.sleep(0.05)
+    assert batches(fake) == [["Sheet1!AN5"]], batches(fake)
+    writer.close()
+    print("✅ Timer flush: stale update sent without reaching max_pending")
+
+def test_failed_flush_is_requeued():
+    fake = FlakySheetsService(failures=2)
+    writer = BufferedSheetWriter(fake, 'test', max_pending=2, flush_interval=3600,
+                                 retry_attempts=2, retry_delay=0)
+    writer.update("Sheet1!AN5", [["processing"]])
+    writer.update("Sheet1!AN6", [["generated"]])   # Threshold flush fails twice: must not raise
+    assert fake.attempts == 2 and not fake.calls
+    assert list(writer.pending) == ["Sheet1!AN5", "Sheet1!AN6"], writer.pending
+
+    writer.update("Sheet1!AN5", [["generated"]])   # Newer write to a re-queued range wins
+    assert not writer.pending and len(batches(fake)) == 1
+    assert sorted(batches(fake)[0]) == ["Sheet1!AN5", "Sheet1!AN6"]
+    assert fake.grids['Sheet1'][4][39] == "generated"
+    writer.close()
+    print("✅ Failed flush: error contained, updates re-queued and sent on the next flush")
+
+def test_update_not_blocked_by_retries():
+    fake = FlakySheetsService(failures=1, delay=0.3)
+    writer = BufferedSheetWriter(fake, 'test', max_pending=100, flush_interval=0.2,
+                                 retry_attempts=2, retry_delay=1.0)
+    writer.update("Sheet1!AN5", [["generated"]])
+    while fake.attempts == 0:
+        time.sleep(0.02)                           # Timer flush is now failing / sleeping
+
+    t0 = time.time()
+    writer.update("Sheet1!AN6", [["generated"]])
+    blocked = time.time() - t0
+    assert blocked < 0.1, f"update() blocked {blocked:.2f}s behind the flush"
+
+    writer.close()
+    written = {r for batch in batches(fake) for r in batch}
+    assert written == {"Sheet1!AN5", "Sheet1!AN6"}, batches(fake)
+    print(f"✅ Retrying flush: update() returned in {blocked*1000:.1f} ms, everything written on close()")
+
+if __name__ == "__main__":
+    test_coalescing()
+    test_threshold_flush()
+    test_timer_flush()
+    test_failed_flush_is_requeued()
+    test_update_not_blocked_by_retries()
+    print(f"\n🎉 All sheet writer checks passed ({threading.active_count()} thread(s) left)")
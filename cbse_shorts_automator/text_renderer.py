@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+File: text_renderer.py
+In-process text rasterizer (Pillow / FreeType) with TextClip's arguments.
+- No ImageMagick subprocess, temp PNG or patched subprocess_call per clip.
+- Named fonts ('Arial-Bold', 'Impact', ...) resolve through one fixed alias
+  table to files on disk, so every host picks the same face (or the same
+  documented fallback); bold names fall back to a bold face.
+- Characters the resolved font can't draw (e.g. emoji in a text font) are
+  reported once instead of silently rendering as boxes.
+- Supports method 'label' / 'caption' (word wrap to the size box), align
+  (ImageMagick gravity names), stroke, background color, interline and
+  auto-fitting the font size to a box when fontsize is None.
+Kerning is accepted but ignored (no call site uses it).
+"""
+
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+
+FONT_DIRS = [
+    '/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'), '/Library/Fonts', '/System/Library/Fonts',
+    'C:/Windows/Fonts', 'config/fonts',
+]
+
+# Named fonts used by the templates -> candidate files, best match first.
+# DejaVu is the last resort because it ships with every Linux image we use.
+FONT_ALIASES = {
+    'arial': ['Arial.ttf', 'arial.ttf', 'LiberationSans-Regular.ttf', 'DejaVuSans.ttf'],
+    'arial-bold': ['Arial Bold.ttf', 'Arial_Bold.ttf', 'arialbd.ttf', 'LiberationSans-Bold.ttf',
+                   'DejaVuSans-Bold.ttf'],
+    'impact': ['Impact.ttf', 'impact.ttf', 'Anton-Regular.ttf', 'LiberationSans-Bold.ttf',
+               'DejaVuSans-Bold.ttf'],
+    'courier': ['Courier New.ttf', 'cour.ttf', 'LiberationMono-Regular.ttf', 'DejaVuSansMono.ttf'],
+    # Color emoji fonts are bitmap-only (fixed strike size): use scalable outline emoji
+    # fonts instead (🔊 🔔 ...); DejaVu still covers the player glyphs (◄ ►)
+    'noto color emoji': ['NotoEmoji-Regular.ttf', 'NotoEmoji-VariableFont_wght.ttf', 'seguiemj.ttf',
+                         'Symbola.ttf', 'seguisym.ttf', 'DejaVuSans.ttf'],
+}
+DEFAULT_FONT_FILES = ['DejaVuSans.ttf', 'LiberationSans-Regular.ttf', 'Arial.ttf', 'arial.ttf']
+# Last resort for bold / heavy faces (so a missing bold font never turns regular)
+DEFAULT_BOLD_FONT_FILES = ['DejaVuSans-Bold.ttf', 'LiberationSans-Bold.ttf', 'Arial Bold.ttf', 'arialbd.ttf']
+BOLD_NAME = re.compile(r'bold|black|heavy|impact')
+
+MISSING_GLYPH_PROBE = '\U0010FFFD'  # Plane-16 private use: mapped by none of our fonts
+_warned_glyphs = set()
+
+DEFAULT_FONTSIZE = 12  # ImageMagick's default pointsize (1pt = 1px at 72 dpi)
+
+@lru_cache(maxsize=1)
+def _font_index():
+    """Lower-cased font file name -> path, for every font under FONT_DIRS."""
+    index = {}
+    for folder in FONT_DIRS:
+        if not os.path.isdir(folder): continue
+        for root, _, files in os.walk(folder):
+            for name in files:
+                if name.lower().endswith(('.ttf', '.otf', '.ttc')):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+@lru_cache(maxsize=64)
+def resolve_font(font):
+    """Font path (or None for Pillow's built-in font) for a TextClip font argument."""
+    if font and os.path.isfile(font):
+        return font
+    index = _font_index()
+    name = (font or '').strip().lower()
+    if '/' in name or '\\' in name or name.endswith(('.ttf', '.otf', '.ttc')):
+        name = os.path.splitext(os.path.basename(name))[0]  # Absolute path from another host
+    candidates = list(FONT_ALIASES.get(name, []))
+    candidates += [name + ext for ext in ('.ttf', '.otf', '.ttc')]
+    candidates += [name.replace(' ', '') + '.ttf', name.replace(' ', '-') + '.ttf']
+    if BOLD_NAME.search(name):
+        candidates += DEFAULT_BOLD_FONT_FILES
+    for candidate in candidates + DEFAULT_FONT_FILES:
+        path = index.get(candidate.lower())
+        if path: return path
+    return None
+
+@lru_cache(maxsize=256)
+def load_font(font, fontsize):
+    path = resolve_font(font)
+    if path is None:
+        return ImageFont.load_default(size=fontsize)
+    return ImageFont.truetype(path, int(fontsize))
+
+@lru_cache(maxsize=4096)
+def has_glyph(path, char):
+    """True if the font file draws char as something other than its missing-glyph box."""
+    try:
+        font = ImageFont.truetype(path, 24)
+    except OSError:
+        return True  # Bitmap-only font: can't probe at this size, assume covered
+
+    def ink(c):
+        img = Image.new('L', (48, 48), 0)
+        ImageDraw.Draw(img).text((8, 8), c, font=font, fill=255)
+        return img.tobytes()
+    return ink(char) != ink(MISSING_GLYPH_PROBE)
+
+def warn_missing_glyphs(txt, fnt):
+    """Prints once per (font, character) that would come out as a box (tofu)."""
+    path = getattr(fnt, 'path', None)
+    if not path: return
+    chars = sorted({c for c in txt if ord(c) > 127 and not c.isspace()})
+    missing = [c for c in chars if (path, c) not in _warned_glyphs and not has_glyph(path, c)]
+    if missing:
+        _warned_glyphs.update((path, c) for c in missing)
+        listed = ' '.join(f"{c} (U+{ord(c):04X})" for c in missing)
+        print(f"⚠️ Font {os.path.basename(path)} has no glyph for {listed}: rendered as boxes")
+
+def parse_color(color):
+    """RGBA tuple for an ImageMagick-style color ('white', '#FF0', (r,g,b), 'transparent')."""
+    if color is None or color == 'transparent':
+        return (0, 0, 0, 0)
+    if isinstance(color, (tuple, list)):
+        rgba = tuple(int(c) for c in color)
+        return rgba if len(rgba) == 4 else rgba[:3] + (255,)
+    rgba = ImageColor.getrgb(color)
+    return rgba if len(rgba) == 4 else rgba + (255,)
+
+# ----------------------------------------------------------------------------
+# Layout
+# ----------------------------------------------------------------------------
+
+def wrap_lines(text, font, max_width):
+    """Greedy word wrap by rendered width; explicit newlines are kept."""
+    lines = []
+    for paragraph in text.split('\n'):
+        words = paragraph.split()
+        if not words:
+            lines.append('')
+            continue
+        current = words[0]
+        for word in words[1:]:
+            trial = current + ' ' + word
+            if font.getlength(trial) <= max_width:
+                current = trial
+            else:
+                lines.append(current)
+                current = word
+        lines.append(current)
+    return lines
+
+def _layout(text, font, method, box_w, stroke, interline):
+    """Returns (lines, line widths, line height, block width, block height)."""
+    if method == 'caption' and box_w:
+        lines = wrap_lines(text, font, max(box_w - 2 * stroke, 1))
+    else:
+        lines = text.split('\n')
+    ascent, descent = font.getmetrics()
+    line_h = ascent + descent + int(interline or 0)
+    widths = [int(np.ceil(font.getlength(line))) for line in lines]
+    block_w = max(widths) + 2 * stroke
+    block_h = line_h * len(lines) - int(interline or 0) + 2 * stroke
+    return lines, widths, line_h, block_w, block_h
+
+def _fit_fontsize(text, font, method, box_w, box_h, stroke_width, interline):
+    """Largest font size whose text block fits the (partially) given box."""
+    lo, hi = 4, int(box_h or box_w or 400)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        stroke = _stroke_px(stroke_width)
+        _, _, _, w, h = _layout(text, load_font(font, mid), method, box_w, stroke, interline)
+        if (box_w and w > box_w) or (box_h and h > box_h):
+            hi = mid - 1
+        else:
+            lo = mid
+    return lo
+
+def _stroke_px(stroke_width):
+    # ImageMagick strokes are centred on the outline: half the width shows outside the glyph
+    return max(1, int(round(float(stroke_width) / 2.0))) if stroke_width else 0
+
+def _gravity(align):
+    a = (align or 'center').lower()
+    horizontal = 'left' if 'west' in a or a == 'left' else 'right' if 'east' in a or a == 'right' else 'center'
+    vertical = 'top' if 'north' in a else 'bottom' if 'south' in a else 'center'
+    return horizontal, vertical
+
+# ----------------------------------------------------------------------------
+# Rasterization
+# ----------------------------------------------------------------------------
+
+def render_text(txt, **kwargs):
+    """
+    Rasterizes text with TextClip's keyword arguments.
+
+    Returns:
+        (rgb uint8 HxWx3, alpha float32 HxW in 0..1, or None when fully opaque)
+    """
+    rgb, alpha, _ = render_text_layout(txt, **kwargs)
+    return rgb, alpha
+
+def render_text_layout(txt, size=None, color='black', bg_color='transparent', fontsize=None, font='Courier',
+                       stroke_color=None, stroke_width=1, method='label', kerning=None, align='center',
+                       interline=None, transparent=True, **_ignored):
+    """
+    Same as render_text, plus the ink bounding box of every word.
+
+    Returns:
+        (rgb, alpha, word_boxes) - word_boxes is [(x0, y0, x1, y1), ...] in
+        reading order, in canvas pixels, stroke included.
+    """
+    txt = str(txt)
+    box_w, box_h = (size if size else (None, None))
+    box_w = int(box_w) if box_w else None
+    box_h = int(box_h) if box_h else None
+
+    if fontsize is None:
+        fontsize = (_fit_fontsize(txt, font, method, box_w, box_h, stroke_width if stroke_color else 0, interline)
+                    if (box_w or box_h) else DEFAULT_FONTSIZE)
+    fontsize = max(int(fontsize), 1)
+    fnt = load_font(font, fontsize)
+    warn_missing_glyphs(txt, fnt)
+    stroke = _stroke_px(stroke_width) if stroke_color else 0
+
+    lines, widths, line_h, block_w, block_h = _layout(txt, fnt, method, box_w, stroke, interline)
+    width, height = max(box_w or block_w, 1), max(box_h or block_h, 1)
+    horizontal, vertical = _gravity(align)
+
+    top = {'top': 0, 'bottom': height - block_h}.get(vertical, (height - block_h) // 2)
+
+    # Coverage masks: glyph fill and glyph+stroke, drawn separately so edges
+    # blend against the real background instead of transparent black
+    fill_mask = Image.new('L', (width, height), 0)
+    stroke_mask = Image.new('L', (width, height), 0) if stroke else None
+    fill_draw = ImageDraw.Draw(fill_mask)
+    stroke_draw = ImageDraw.Draw(stroke_mask) if stroke else None
+    word_boxes = []
+    for i, (line, line_w) in enumerate(zip(lines, widths)):
+        if not line: continue
+        x = {'left': stroke, 'right': width - stroke - line_w}.get(horizontal, (width - line_w) // 2)
+        y = top + stroke + i * line_h
+        fill_draw.text((x, y), line, font=fnt, fill=255)
+        if stroke_draw:
+            stroke_draw.text((x, y), line, font=fnt, fill=255, stroke_width=stroke, stroke_fill=255)
+        for match in re.finditer(r"\S+", line):
+            wx = x + fnt.getlength(line[:match.start()])
+            l, t, r, b = fnt.getbbox(match.group(), stroke_width=stroke)
+            word_boxes.append((max(int(wx + l), 0), max(int(y + t), 0),
+                               min(int(np.ceil(wx + r)), width), min(int(y + b), height)))
+
+    f = np.asarray(fill_mask, dtype=np.float32) / 255.0
+    fg = np.array(parse_color(color), dtype=np.float32)
+    if stroke:
+        s = np.maximum(np.asarray(stroke_mask, dtype=np.float32) / 255.0, f)
+        sc = np.array(parse_color(stroke_color), dtype=np.float32)
+        # Fill sits on top of the stroke inside the glyph
+        text_rgb = sc[:3] * (1.0 - f[..., None]) + fg[:3] * f[..., None]
+        text_a = s * (sc[3] / 255.0) * (1.0 - f) + f * (fg[3] / 255.0)
+    else:
+        text_rgb = np.broadcast_to(fg[:3], f.shape + (3,))
+        text_a = f * (fg[3] / 255.0)
+
+    bg = np.array(parse_color(bg_color), dtype=np.float32)
+    bg_a = bg[3] / 255.0
+    out_a = text_a + bg_a * (1.0 - text_a)
+    premul = text_rgb * text_a[..., None] + bg[:3] * (bg_a * (1.0 - text_a))[..., None]
+    rgb = premul / np.maximum(out_a, 1e-6)[..., None]
+    rgb = np.clip(np.round(rgb), 0, 255).astype(np.uint8)
+
+    if not transparent or out_a.min() >= 1.0:
+        return rgb, None, word_boxes
+    return rgb, out_a.astype(np.float32), word_boxes
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+File: text_sprite_cache.py
+Rasterized text cache in front of MoviePy's TextClip.
+- Every TextClip shells out to ImageMagick `convert` (a subprocess plus a
+  temp PNG round trip). Labels, countdown digits, typewriter prefixes and
+  outro strings repeat constantly within a batch.
+- Keyed by everything that changes the pixels (text, font, size, colors,
+  stroke, method, size box, align, ...).
+- RGB + alpha kept in an in-memory LRU (bounded in MB) and as .npz files on
+  disk, so render-farm workers and later batches share the same sprites.
+- make_text_clip() is a drop-in for TextClip(...) returning a static
+  ImageClip (with mask), which the flat compositor can also plate.
+- Backend 'pillow' rasterizes in-process (text_renderer.py); 'imagemagick'
+  keeps MoviePy's TextClip.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from moviepy.editor import ImageClip, TextClip
+from text_renderer import render_text
+
+BACKENDS = ('imagemagick', 'pillow')
+
+# TextClip keyword defaults (MoviePy 1.0.3) - part of the key so that
+# TextClip('A') and TextClip('A', color='black') share an entry.
+TEXT_DEFAULTS = {
+    'size': None, 'color': 'black', 'bg_color': 'transparent', 'fontsize': None,
+    'font': 'Courier', 'stroke_color': None, 'stroke_width': 1, 'method': 'label',
+    'kerning': None, 'align': 'center', 'interline': None, 'transparent': True,
+}
+
+# Arguments that only affect how ImageMagick is driven, never the pixels
+IGNORED_ARGS = ('tempfilename', 'temptxt', 'remove_temp', 'print_cmd')
+
+class TextSpriteCache:
+    """
+    Usage:
+        cache = TextSpriteCache('cache/text_sprites', max_memory_mb=128)
+        rgb, alpha = cache.render('3', fontsize=140, color='white', font='Arial-Bold')
+        clip = cache.clip('3', fontsize=140, color='white', font='Arial-Bold')
+    """
+
+    def __init__(self, cache_dir='cache/text_sprites', max_memory_mb=128, max_disk_mb=500, backend='imagemagick'):
+        """
+        Args:
+            cache_dir: Folder for .npz sprites (None = memory only)
+            max_memory_mb: In-memory LRU budget
+            max_disk_mb: Disk budget, enforced by prune()
+            backend: 'imagemagick' (TextClip) or 'pillow' (in-process)
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown text backend '{backend}' (expected one of {BACKENDS})")
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.max_memory = int(float(max_memory_mb) * 1024 * 1024)
+        self.max_disk = int(float(max_disk_mb) * 1024 * 1024)
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(txt, backend='imagemagick', **kwargs):
+        params = dict(TEXT_DEFAULTS, backend=backend)
+        params.update({k: v for k, v in kwargs.items() if k not in IGNORED_ARGS})
+        font = params.get('font')
+        if isinstance(font, str) and os.path.isfile(font):
+            # A replaced font file must not reuse stale sprites
+            st = os.stat(font)
+            params['font_stamp'] = [st.st_size, int(st.st_mtime)]
+        raw = json.dumps([txt, sorted(params.items())], default=str, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    # ------------------------------------------------------------------
+    # Memory LRU
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _nbytes(sprite):
+        rgb, alpha = sprite
+        return rgb.nbytes + (alpha.nbytes if alpha is not None else 0)
+
+    def _remember(self, key, sprite):
+        with self.lock:
+            if key in self.memory: return
+            self.memory[key] = sprite
+            self.memory_bytes += self._nbytes(sprite)
+            while self.memory_bytes > self.max_memory and len(self.memory) > 1:
+                _, old = self.memory.popitem(last=False)
+                self.memory_bytes -= self._nbytes(old)
+
+    def _recall(self, key):
+        with self.lock:
+            sprite = self.memory.get(key)
+            if sprite is not None:
+                self.memory.move_to_end(key)
+            return sprite
+
+    # ------------------------------------------------------------------
+    # Disk
+    # ------------------------------------------------------------------
+
+    def _load(self, key):
+        if not self.cache_dir: return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                rgb = data['rgb']
+                alpha = data['alpha'] if 'alpha' in data.files else None
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path, None)  # mtime doubles as last-access time for prune()
+        return self._freeze(rgb, None if alpha is None else alpha.astype(np.float32) / 255.0)
+
+    def _store(self, key, rgb, alpha):
+        if not self.cache_dir: return
+        arrays = {'rgb': rgb}
+        if alpha is not None:
+            arrays['alpha'] = np.round(alpha * 255.0).astype(np.uint8)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            np.savez_compressed(tmp, **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"   ⚠️ Text sprite not saved: {e}")
+
+    def prune(self):
+        """Drops least recently used sprites until the folder is under max_disk_mb."""
+        if not self.cache_dir: return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'): continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk: break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _freeze(rgb, alpha):
+        # Sprites are shared between clips: a stray in-place edit must fail loudly
+        rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        rgb.flags.writeable = False
+        if alpha is not None:
+            alpha = np.ascontiguousarray(alpha, dtype=np.float32)
+            alpha.flags.writeable = False
+        return rgb, alpha
+
+    def render(self, txt, **kwargs):
+        """Returns (rgb uint8 HxWx3, alpha float32 HxW or None) for TextClip(txt, **kwargs)."""
+        key = self.key(txt, self.backend, **kwargs)
+        sprite = self._recall(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+
+        sprite = self._load(key)
+        if sprite is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            sprite = self._freeze(*rasterize(txt, self.backend, **kwargs))
+            self._store(key, *sprite)
+        self._remember(key, sprite)
+        return sprite
+
+    def clip(self, txt, **kwargs):
+        return sprite_clip(*self.render(txt, **kwargs))
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'items': len(self.memory), 'memory_mb': round(self.memory_bytes / 1048576, 1)}
+
+def rasterize(txt, backend='imagemagick', **kwargs):
+    """(rgb, alpha or None) for TextClip(txt, **kwargs) with the given backend."""
+    if backend == 'pillow':
+        return render_text(txt, **kwargs)
+    clip = TextClip(txt, **kwargs)
+    alpha = clip.mask.get_frame(0) if clip.mask is not None else None
+    return clip.get_frame(0), alpha
+
+def sprite_clip(rgb, alpha):
+    clip = ImageClip(rgb)
+    if alpha is not None:
+        clip = clip.set_mask(ImageClip(alpha, ismask=True))
+    return clip
+
+# ============================================================================
+# MODULE-LEVEL CACHE (shared by every template in this process)
+# ============================================================================
+
+_TEXT_CACHE = None
+_TEXT_CACHE_ENABLED = True
+_TEXT_BACKEND = 'imagemagick'
+
+def configure_text_cache(config):
+    """Builds the process-wide cache from the TEXT_CACHE / TEXT_RENDERER config sections."""
+    global _TEXT_CACHE, _TEXT_CACHE_ENABLED, _TEXT_BACKEND
+    settings = config.get('TEXT_CACHE', {})
+    _TEXT_BACKEND = config.get('TEXT_RENDERER', {}).get('BACKEND', 'imagemagick')
+    _TEXT_CACHE_ENABLED = settings.get('ENABLED', True)
+    if not _TEXT_CACHE_ENABLED:
+        _TEXT_CACHE = None
+        return None
+    _TEXT_CACHE = TextSpriteCache(
+        cache_dir=settings.get('DIR', 'cache/text_sprites'),
+        max_memory_mb=settings.get('MAX_MEMORY_MB', 128),
+        max_disk_mb=settings.get('MAX_DISK_MB', 500),
+        backend=_TEXT_BACKEND
+    )
+    _TEXT_CACHE.prune()
+    return _TEXT_CACHE
+
+def get_text_cache():
+    global _TEXT_CACHE
+    if _TEXT_CACHE is None and _TEXT_CACHE_ENABLED:
+        _TEXT_CACHE = TextSpriteCache(backend=_TEXT_BACKEND)
+    return _TEXT_CACHE
+
+def make_text_clip(txt=None, **kwargs):
+    """
+    Drop-in for TextClip(txt, **kwargs) that rasterizes each distinct
+    (text, style) once. With the cache disabled the configured backend
+    renders every call; text read from a file always goes to TextClip.
+    """
+    if txt is None or kwargs.get('filename'):
+        return TextClip(txt, **kwargs)
+    cache = get_text_cache()
+    if cache is None:
+        if _TEXT_BACKEND == 'pillow':
+            return sprite_clip(*render_text(txt, **kwargs))
+        return TextClip(txt, **kwargs)
+    return cache.clip(txt, **kwargs)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+File: timeline_compositor.py
+Single-pass replacement for (nested) MoviePy CompositeVideoClip trees.
+- Untouched nested IndexedCompositeVideoClip groups (PIP group, overlays...)
+  are flattened into one layer list with accumulated time offsets.
+- A sorted event list of layer activations returns only the layers active
+  at time t (also usable on plain CompositeVideoClips: index_composite /
+  IndexedCompositeVideoClip).
+- Layers are alpha-blended into ONE preallocated float32 frame buffer,
+  instead of MoviePy copying the full frame for every blit.
+- Runs of consecutive settled layers (ImageClip / TextClip / ColorClip still
+  images that haven't moved since the previous frame) are pre-rasterized
+  once into a premultiplied RGBA plate and reused until a layer in the run
+  moves, appears or ends. Static layers are fetched once, not every frame.
+Positions follow VideoClip.blit_on exactly (str / relative / callable positions).
+
+Note: MoviePy composites a transparent nested group over black and then
+re-applies the group mask, which darkens semi-transparent edges. Flattening
+blends each layer straight onto the frame, so soft edges come out slightly
+cleaner; opaque pixels are identical. (It also sidesteps MoviePy placing a
+group member's mask at the absolute position when the member uses
+relative=True positioning.)
+"""
+
+import bisect
+import numpy as np
+from collections import OrderedDict
+from moviepy.video.VideoClip import VideoClip, ImageClip
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.audio.AudioClip import CompositeAudioClip
+
+def is_plain_composite(clip, size):
+    """
+    True for an untouched, transparent, full-canvas IndexedCompositeVideoClip
+    at (0, 0): its layers can be drawn straight onto the parent frame.
+    The group records its own frame / mask / position functions when built;
+    anything that replaced them since (fades, resizes, subclips, set_position,
+    set_mask...) is kept as a single layer.
+    """
+    if not isinstance(clip, IndexedCompositeVideoClip) or clip.make_frame is not clip.group_frame:
+        return False
+    if clip.mask is None or clip.mask.make_frame is not clip.group_mask_frame:
+        return False  # Opaque background (bg_color set) or a custom mask
+    if not getattr(clip, 'created_bg', False) or tuple(clip.size) != tuple(size):
+        return False
+    return clip.pos is clip.group_pos and not clip.relative_pos
+
+def is_still_image(clip):
+    """
+    True for an ImageClip (ColorClip / TextClip / sprite) still showing its
+    one stored image. MoviePy turns an ImageClip into a plain VideoClip as
+    soon as a time-dependent fx is applied, and fl_image updates .img.
+    """
+    return isinstance(clip, ImageClip) and clip.make_frame(0) is clip.img
+
+def has_static_content(clip):
+    """True if the clip's pixels (and mask) are the same at every time."""
+    return is_still_image(clip) and (clip.mask is None or is_still_image(clip.mask))
+
+class Layer:
+    """One leaf clip on the flat timeline."""
+    __slots__ = ('clip', 'offset', 'start', 'end', 'z', 'static', 'pixels')
+
+    def __init__(self, clip, offset, start, end, z):
+        self.clip = clip        # Leaf clip (its own .start is relative to its parent)
+        self.offset = offset    # Sum of the starts of the flattened parents
+        self.start = start      # Global activation window [start, end)
+        self.end = end
+        self.z = z              # Paint order (lower first)
+        self.static = has_static_content(clip)  # Only its position can change
+        self.pixels = None      # (img, mask) of a static layer, fetched once
+
+class Plate:
+    """Pre-rasterized run of static layers: premultiplied colour + alpha over a bounding box."""
+    __slots__ = ('x', 'y', 'color', 'alpha', 'opaque', 'nbytes')
+
+    def __init__(self, x, y, color, alpha):
+        self.x, self.y = x, y
+        self.color = color      # float32 (h, w, 3), premultiplied by alpha
+        self.alpha = alpha      # float32 (h, w)
+        self.opaque = bool(alpha.min() >= 1.0)
+        self.nbytes = color.nbytes + alpha.nbytes
+
+def flatten_layers(clips, size, offset=0.0, window=(0.0, np.inf), layers=None):
+    """Walks the clip tree depth-first, producing Layers in paint order."""
+    if layers is None:
+        layers = []
+    for clip in clips:
+        c_start = offset + clip.start
+        c_end = offset + clip.end if clip.end is not None else np.inf
+        start, end = max(window[0], c_start), min(window[1], c_end)
+        if start >= end:
+            continue
+
+        if is_plain_composite(clip, size):
+            # Children play on the group's local clock
+            flatten_layers(clip.clips, size, offset=c_start, window=(start, end), layers=layers)
+        else:
+            layers.append(Layer(clip, offset, start, end, len(layers)))
+    return layers
+
+class LayerIndex:
+    """
+    Sorted event list over activation windows [start, end).
+    Between two consecutive start/end events the set of live layers cannot
+    change, so active(t) is one bisect plus a lookup of that interval's
+    (lazily built) layer list: O(log n + active) per frame, not O(n).
+
+    Usage:
+        index = LayerIndex(clips)   # anything with .start / .end (None = open)
+        for clip in index.active(t): ...
+    """
+
+    def __init__(self, items):
+        """
+        Args:
+            items: Layers or clips in paint order (bottom first)
+        """
+        self.items = list(items)
+        self.starts = np.array([i.start for i in self.items], dtype=np.float64)
+        self.ends = np.array([np.inf if i.end is None else i.end for i in self.items], dtype=np.float64)
+        events = np.concatenate([self.starts, self.ends[np.isfinite(self.ends)]])
+        self.events = np.unique(events).tolist()
+        self._intervals = {}  # event interval -> live items
+
+    def __len__(self):
+        return len(self.items)
+
+    def active(self, t):
+        """Items playing at t (start <= t < end), in paint order."""
+        slot = bisect.bisect_right(self.events, t)
+        live = self._intervals.get(slot)
+        if live is None:
+            idx = np.nonzero((self.starts <= t) & (self.ends > t))[0]
+            live = [self.items[i] for i in idx]
+            self._intervals[slot] = live
+        return live
+
+def index_composite(comp):
+    """
+    Replaces a CompositeVideoClip's per-frame is_playing() scan over every
+    child (and its mask's) with a LayerIndex lookup. Same pixels. In place.
+
+    Returns:
+        comp
+    """
+    index = LayerIndex(comp.clips)
+    bg = comp.bg
+
+    def make_frame(t):
+        f = bg.get_frame(t)
+        for c in index.active(t):
+            f = c.blit_on(f, t)
+        return f
+
+    comp.make_frame = make_frame
+    comp.layer_index = index
+    if isinstance(comp.mask, CompositeVideoClip):
+        index_composite(comp.mask)
+    return comp
+
+class IndexedCompositeVideoClip(CompositeVideoClip):
+    """
+    CompositeVideoClip whose frames only visit the children live at t.
+
+    Usage:
+        group = IndexedCompositeVideoClip(clips, size=(1080, 1920))
+    """
+
+    def __init__(self, clips, size=None, bg_color=None, use_bgclip=False, ismask=False):
+        CompositeVideoClip.__init__(self, clips, size=size, bg_color=bg_color,
+                                    use_bgclip=use_bgclip, ismask=ismask)
+        index_composite(self)
+        # Flattening markers: FlatCompositeClip only inlines the group while these still match
+        self.group_frame = self.make_frame
+        self.group_mask_frame = self.mask.make_frame if self.mask is not None else None
+        self.group_pos = self.pos
+
+def resolve_position(clip, ct, img_shape, frame_shape):
+    """Top-left pixel of the clip at clip time ct (same rules as VideoClip.blit_on)."""
+    hf, wf = frame_shape[:2]
+    hi, wi = img_shape[:2]
+    pos = clip.pos(ct)
+
+    if isinstance(pos, str):
+        pos = {'center': ['center', 'center'],
+               'left': ['left', 'center'],
+               'right': ['right', 'center'],
+               'top': ['center', 'top'],
+               'bottom': ['center', 'bottom']}[pos]
+    else:
+        pos = list(pos)
+
+    if clip.relative_pos:
+        for i, dim in enumerate([wf, hf]):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+
+    if isinstance(pos[0], str):
+        pos[0] = {'left': 0, 'center': (wf - wi) / 2, 'right': wf - wi}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {'top': 0, 'center': (hf - hi) / 2, 'bottom': hf - hi}[pos[1]]
+
+    return int(pos[0]), int(pos[1])
+
+class FlatCompositeClip(VideoClip):
+    """
+    Drop-in for CompositeVideoClip(clips, size=...) on an opaque canvas.
+
+    Usage:
+        final = FlatCompositeClip(clips, size=(1080, 1920)).set_audio(audio)
+        final.layer_count  # leaf layers after flattening
+    """
+
+    MIN_PLATE_LAYERS = 2  # A single static layer is as cheap to draw as its plate
+
+    def __init__(self, clips, size=None, bg_color=(0, 0, 0), static_plates=True, plate_cache_mb=256):
+        """
+        Args:
+            clips: Layers, bottom first (same as CompositeVideoClip)
+            size: (width, height) of the canvas
+            static_plates: Pre-rasterize runs of static layers
+            plate_cache_mb: Memory budget for cached plates (LRU)
+        """
+        VideoClip.__init__(self)
+        if size is None:
+            size = clips[0].size
+
+        self.size = tuple(size)
+        self.clips = clips
+        self.bg_color = np.array(bg_color if bg_color is not None else (0, 0, 0), dtype=np.float32)
+
+        fpss = [c.fps for c in clips if getattr(c, 'fps', None)]
+        self.fps = max(fpss) if fpss else None
+
+        ends = [c.end for c in clips]
+        if None not in ends:
+            self.duration = max(ends)
+            self.end = self.duration
+
+        audioclips = [c.audio for c in clips if c.audio is not None]
+        if audioclips:
+            self.audio = CompositeAudioClip(audioclips)
+
+        self.layers = flatten_layers(clips, self.size)
+        self.layer_count = len(self.layers)
+        self.index = LayerIndex(self.layers)
+
+        self.static_plates = static_plates
+        self.plate_budget = int(plate_cache_mb * 1024 * 1024)
+        self.plates = OrderedDict()     # run signature -> Plate (LRU order)
+        self.plate_bytes = 0
+        self.plate_hits = 0
+        self.plate_builds = 0
+        self._prev_positions = {}       # Layer z -> position of static layers in the previous frame
+
+        w, h = self.size
+        self._buffer = np.empty((h, w, 3), dtype=np.float32)
+        self.make_frame = self._compose
+
+    # ------------------------------------------------------------------
+    # Per-layer drawing
+    # ------------------------------------------------------------------
+
+    def _layer_frame(self, layer, t, frame_shape):
+        """(img, mask, x, y) of a layer at global time t."""
+        clip = layer.clip
+        lt = t - layer.offset       # Parent-local time
+        ct = lt - clip.start        # Clip time (what blit_on uses)
+
+        if layer.pixels is not None:
+            img, mask = layer.pixels
+        else:
+            img = clip.get_frame(ct)
+            mask = clip.mask.get_frame(ct) if clip.mask is not None else None
+            if mask is not None and img.shape[:2] != mask.shape[:2]:
+                img = clip.fill_array(img, mask.shape)
+            if img.ndim == 2:
+                img = img[:, :, None]   # Mask-style clip used as a layer
+            if layer.static:
+                layer.pixels = (img, mask)
+
+        xp, yp = resolve_position(clip, ct, img.shape, frame_shape)
+        return img, mask, xp, yp
+
+    @staticmethod
+    def _visible(img_shape, xp, yp, hf, wf):
+        """Source/destination rects after clipping to the frame (as moviepy.tools.drawing.blit)."""
+        hi, wi = img_shape[:2]
+        x1, y1 = max(0, -xp), max(0, -yp)
+        x2, y2 = min(wi, wf - xp), min(hi, hf - yp)
+        if x1 >= x2 or y1 >= y2:
+            return None
+        return x1, y1, x2, y2, max(0, xp), max(0, yp)
+
+    def _blend(self, buf, img, mask, xp, yp):
+        hf, wf = buf.shape[:2]
+        rect = self._visible(img.shape, xp, yp, hf, wf)
+        if rect is None:
+            return
+        x1, y1, x2, y2, xp1, yp1 = rect
+        region = buf[yp1:yp1 + (y2 - y1), xp1:xp1 + (x2 - x1)]
+        src = img[y1:y2, x1:x2]
+
+        if mask is None:
+            region[...] = src
+        else:
+            alpha = mask[y1:y2, x1:x2, None].astype(np.float32)
+            region += alpha * (src - region)
+
+    # ------------------------------------------------------------------
+    # Static plates
+    # ------------------------------------------------------------------
+
+    def _build_plate(self, drawn, hf, wf):
+        """Rasterizes [(img, mask, x, y)] (paint order) into one Plate over their bounding box."""
+        rects = [(d, self._visible(d[0].shape, d[2], d[3], hf, wf)) for d in drawn]
+        rects = [(d, r) for d, r in rects if r is not None]
+        if not rects:
+            return None
+        bx0 = min(r[4] for _, r in rects)
+        by0 = min(r[5] for _, r in rects)
+        bx1 = max(r[4] + r[2] - r[0] for _, r in rects)
+        by1 = max(r[5] + r[3] - r[1] for _, r in rects)
+
+        color = np.zeros((by1 - by0, bx1 - bx0, 3), dtype=np.float32)
+        alpha = np.zeros((by1 - by0, bx1 - bx0), dtype=np.float32)
+        for (img, mask, _, _), (x1, y1, x2, y2, xp1, yp1) in rects:
+            ys = slice(yp1 - by0, yp1 - by0 + (y2 - y1))
+            xs = slice(xp1 - bx0, xp1 - bx0 + (x2 - x1))
+            src = img[y1:y2, x1:x2]
+            if mask is None:
+                color[ys, xs] = src
+                alpha[ys, xs] = 1.0
+            else:
+                a = mask[y1:y2, x1:x2].astype(np.float32)
+                color[ys, xs] = a[:, :, None] * src + (1.0 - a[:, :, None]) * color[ys, xs]
+                alpha[ys, xs] = a + (1.0 - a) * alpha[ys, xs]
+        return Plate(bx0, by0, color, alpha)
+
+    @staticmethod
+    def _apply_plate(buf, plate):
+        h, w = plate.alpha.shape
+        region = buf[plate.y:plate.y + h, plate.x:plate.x + w]
+        if plate.opaque:
+            region[...] = plate.color
+        else:
+            region *= (1.0 - plate.alpha)[:, :, None]
+            region += plate.color
+
+    def _store_plate(self, signature, plate):
+        self.plates[signature] = plate
+        self.plate_bytes += plate.nbytes
+        while self.plate_bytes > self.plate_budget and len(self.plates) > 1:
+            _, old = self.plates.popitem(last=False)
+            self.plate_bytes -= old.nbytes
+
+    def _draw_settled_run(self, buf, run, drawn):
+        """Draws consecutive settled static layers through a cached plate."""
+        signature = tuple((layer.z, x, y) for layer, (_, _, x, y) in zip(run, drawn))
+
+        plate = self.plates.get(signature)
+        if plate is None:
+            plate = self._build_plate(drawn, *buf.shape[:2])
+            if plate is None:
+                return
+            self._store_plate(signature, plate)
+            self.plate_builds += 1
+        else:
+            self.plates.move_to_end(signature)
+            self.plate_hits += 1
+        self._apply_plate(buf, plate)
+
+    # ------------------------------------------------------------------
+    # Frame
+    # ------------------------------------------------------------------
+
+    def _compose(self, t):
+        buf = self._buffer
+        buf[...] = self.bg_color
+        active = self.index.active(t)
+
+        if not self.static_plates:
+            for layer in active:
+                self._blend(buf, *self._layer_frame(layer, t, buf.shape))
+            return buf.astype(np.uint8)
+
+        # A static layer is "settled" once it sits where it sat in the previous frame
+        positions = {}
+        run, run_drawn = [], []
+        for layer in active + [None]:
+            drawn = self._layer_frame(layer, t, buf.shape) if layer is not None else None
+            settled = False
+            if layer is not None and layer.static:
+                positions[layer.z] = drawn[2:]
+                settled = self._prev_positions.get(layer.z) == drawn[2:]
+            if settled:
+                run.append(layer)
+                run_drawn.append(drawn)
+                continue
+
+            # Flush the pending settled run before the next moving / dynamic layer
+            if len(run) >= self.MIN_PLATE_LAYERS:
+                self._draw_settled_run(buf, run, run_drawn)
+            else:
+                for d in run_drawn:
+                    self._blend(buf, *d)
+            run, run_drawn = [], []
+            if drawn is not None:
+                self._blend(buf, *drawn)
+
+        self._prev_positions = positions
+        return buf.astype(np.uint8)
+
+    def close(self):
+        if getattr(self, 'audio', None):
+            self.audio.close()
+            self.audio = None
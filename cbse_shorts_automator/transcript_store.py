@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+File: transcript_store.py
+Durable Whisper transcript store, keyed by (video content hash, model name).
+Each transcript is one compact .npz:
+    starts / ends  - float64 columns, one row per segment
+    offsets        - int64 segment boundaries into the text blob
+    text           - all segment texts as one UTF-8 blob
+Survives temp cleanup and batches, so a lecture video shared by ten rows
+is transcribed once. Least recently used transcripts are evicted when the
+store grows past max_size_mb.
+TranscriptIndex answers "first segment at/after t mentioning X" (stemmed
+words or phrases) with a token -> sorted segment-start posting list + bisect.
+The audio track is decoded once (ffmpeg, audio stream only) to mono 16 kHz
+int16 PCM and kept next to the transcripts as <hash>.pcm.npy; Whisper and
+any later analysis read that instead of decoding the video again.
+"""
+
+import os
+import re
+import json
+import bisect
+import hashlib
+import threading
+import subprocess
+import numpy as np
+from moviepy.config import get_setting
+
+SAMPLE_RATE = 16000  # Whisper's native input rate
+
+class Transcript:
+    """
+    Columnar transcript.
+
+    Usage:
+        tr = Transcript.from_segments(result['segments'])
+        tr.starts[i], tr.ends[i], tr.texts[i]
+        tr.to_segments()  # [{'id', 'start', 'end', 'text'}, ...]
+    """
+
+    def __init__(self, starts, ends, texts):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.texts = list(texts)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_segments(cls, segments):
+        return cls([s['start'] for s in segments], [s['end'] for s in segments],
+                   [s['text'] for s in segments])
+
+    def to_segments(self):
+        return [{'id': i, 'start': float(s), 'end': float(e), 'text': t}
+                for i, (s, e, t) in enumerate(zip(self.starts, self.ends, self.texts))]
+
+    def to_arrays(self):
+        blobs = [t.encode('utf-8') for t in self.texts]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in blobs])
+        text = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        return {'starts': self.starts, 'ends': self.ends, 'offsets': offsets, 'text': text}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        blob = arrays['text'].tobytes()
+        offsets = arrays['offsets']
+        texts = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        return cls(arrays['starts'], arrays['ends'], texts)
+
+# ============================================================================
+# AUDIO
+# ============================================================================
+
+def extract_pcm(video_path, sample_rate=SAMPLE_RATE):
+    """Mono int16 PCM of the audio track (video streams are never decoded)."""
+    cmd = [get_setting("FFMPEG_BINARY"), '-nostdin', '-loglevel', 'error', '-i', video_path,
+           '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"Audio extraction failed for {video_path}: {result.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+def load_pcm(path):
+    """float32 samples in -1..1 (Whisper's input format) from a stored .pcm.npy."""
+    return np.load(path, mmap_mode='r').astype(np.float32) / 32768.0
+
+# ============================================================================
+# KEYWORD INDEX
+# ============================================================================
+
+# Longest first; a suffix is only stripped if a stem of 3+ letters remains
+_SUFFIXES = ('ational', 'ization', 'fulness', 'iveness', 'ations', 'ation', 'ments', 'ment',
+             'ness', 'ings', 'ing', 'edly', 'ies', 'ied', 'ed', 'es', 'ly', 's')
+
+def stem(word):
+    """Light suffix-stripping stemmer (enough to match plurals / tenses in lectures)."""
+    for suffix in _SUFFIXES:
+        if suffix == 's' and word.endswith(('ss', 'us', 'is')):
+            continue  # "glass", "nucleus", "photosynthesis"
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if suffix in ('ies', 'ied'):
+                word += 'y'
+            break
+    # "running" -> "runn" -> "run"
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in 'aeiouls':
+        word = word[:-1]
+    return word
+
+def stem_tokens(text):
+    return [stem(w) for w in re.findall(r"[a-z0-9]+", text.lower())]
+
+class TranscriptIndex:
+    """
+    Inverted index over a transcript, built once.
+
+    Usage:
+        index = TranscriptIndex(transcript)       # or TranscriptIndex.from_segments(segments)
+        t = index.first_after('photosynthesis', 12.0)   # start of first match >= 12.0, or None
+        t = index.first_after('light reaction', 0.0)    # multi-word phrase
+    """
+
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.tokens = [stem_tokens(t) for t in transcript.texts]
+        self.starts = transcript.starts.tolist()
+        postings = {}
+        for i, toks in enumerate(self.tokens):
+            for tok in set(toks):
+                postings.setdefault(tok, []).append(i)
+        # Segments are chronological, but sort anyway (bisect needs it)
+        self.postings = {tok: sorted(ids, key=self.starts.__getitem__) for tok, ids in postings.items()}
+        self.posting_starts = {tok: [self.starts[i] for i in ids] for tok, ids in self.postings.items()}
+
+    @classmethod
+    def from_segments(cls, segments):
+        return cls(Transcript.from_segments(segments))
+
+    def _has_phrase(self, i, phrase):
+        """Phrase inside segment i (or running on into segment i + 1)."""
+        toks = self.tokens[i] + (self.tokens[i + 1] if i + 1 < len(self.tokens) else [])
+        n = len(phrase)
+        return any(toks[j:j + n] == phrase for j in range(len(self.tokens[i])))
+
+    def first_after(self, keyword, t):
+        """Start time of the first segment starting at/after t that contains keyword."""
+        phrase = stem_tokens(keyword or '')
+        if not phrase:
+            return None
+        if any(tok not in self.postings for tok in phrase):
+            return None
+        # A match starts in a segment holding the first word; single words need no verification
+        ids, starts = self.postings[phrase[0]], self.posting_starts[phrase[0]]
+        for k in range(bisect.bisect_left(starts, t), len(ids)):
+            if len(phrase) == 1 or self._has_phrase(ids[k], phrase):
+                return starts[k]
+        return None
+
+DEFAULT_MAX_SIZE_MB = 1000  # Same as TRANSCRIPTS.MAX_SIZE_MB in generator_config.json
+
+# Shared by every store in the process (templates build their processor per row)
+_HASH_MEMO = {}   # "path|size|mtime_ns" -> sha256
+_HASH_LOCK = threading.Lock()
+
+class TranscriptStore:
+    """
+    Usage:
+        store = shared_store('cache/transcripts', max_size_mb=1000)
+        tr = store.get(video_path, 'tiny')
+        if tr is None:
+            tr = store.put(video_path, 'tiny', Transcript.from_segments(segments))
+        samples = store.load_audio(video_path)   # float32 16 kHz mono, decoded once
+    """
+
+    def __init__(self, store_dir='cache/transcripts', max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.store_dir = store_dir
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024)
+        self.lock = threading.RLock()
+        self.memo_path = os.path.join(store_dir, 'hashes.json')
+        os.makedirs(store_dir, exist_ok=True)
+
+    def content_hash(self, video_path):
+        """
+        SHA-256 of the video bytes, memoized per path+size+mtime for the whole
+        process and on disk (render-farm workers and later batches reuse it),
+        so a multi-GB lecture is hashed once, not once per row.
+        """
+        st = os.stat(video_path)
+        memo_key = f"{os.path.abspath(video_path)}|{st.st_size}|{st.st_mtime_ns}"
+        with _HASH_LOCK:
+            if memo_key in _HASH_MEMO:
+                return _HASH_MEMO[memo_key]
+            stored = self._load_hash_memo()
+            if memo_key in stored:
+                _HASH_MEMO[memo_key] = stored[memo_key]
+                return stored[memo_key]
+
+            h = hashlib.sha256()
+            with open(video_path, 'rb') as f:
+                for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                    h.update(block)
+            _HASH_MEMO[memo_key] = h.hexdigest()
+            self._save_hash_memo(memo_key, _HASH_MEMO[memo_key])
+            return _HASH_MEMO[memo_key]
+
+    def _load_hash_memo(self):
+        try:
+            with open(self.memo_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hash_memo(self, memo_key, digest):
+        memo = self._load_hash_memo()
+        memo[memo_key] = digest
+        # Drop entries for files that are gone (temp downloads)
+        memo = {k: v for k, v in memo.items() if os.path.exists(k.rsplit('|', 2)[0])}
+        tmp = f"{self.memo_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(memo, f)
+            os.replace(tmp, self.memo_path)
+        except OSError:
+            pass
+
+    def _path(self, video_path, model_name):
+        safe_model = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_name)
+        return os.path.join(self.store_dir, f"{self.content_hash(video_path)[:32]}_{safe_model}.npz")
+
+    def audio_path(self, video_path):
+        """Path of the stored .pcm.npy for the video, extracting it on first use."""
+        path = os.path.join(self.store_dir, f"{self.content_hash(video_path)[:32]}.pcm.npy")
+        if os.path.exists(path):
+            os.utime(path, None)
+            return path
+        pcm = extract_pcm(video_path)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp, pcm)
+        os.replace(tmp, path)
+        self._evict(keep=path)
+        return path
+
+    def load_audio(self, video_path):
+        """float32 mono 16 kHz samples of the video's audio track."""
+        return load_pcm(self.audio_path(video_path))
+
+    def get(self, video_path, model_name):
+        """Stored Transcript, or None."""
+        path = self._path(video_path, model_name)
+        try:
+            with np.load(path) as data:
+                transcript = Transcript.from_arrays(data)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path, None)  # mtime doubles as last-access time for LRU eviction
+        return transcript
+
+    def put(self, video_path, model_name, transcript):
+        path = self._path(video_path, model_name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, **transcript.to_arrays())
+        os.replace(tmp, path)
+        self._evict(keep=path)
+        return transcript
+
+    def _evict(self, keep=None):
+        """Drops least recently used transcripts / audio until under max size."""
+        entries = []
+        for name in os.listdir(self.store_dir):
+            if not name.endswith(('.npz', '.pcm.npy')) or '.tmp.' in name: continue
+            path = os.path.join(self.store_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if path == keep: continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+_STORES = {}
+
+def shared_store(store_dir='cache/transcripts', max_size_mb=None):
+    """
+    One TranscriptStore per folder for the whole process. Two stores over one
+    folder would evict each other's files, so a second caller asking for a
+    different budget gets the same store, with the larger of the two budgets.
+    """
+    key = os.path.abspath(store_dir)
+    max_size_mb = DEFAULT_MAX_SIZE_MB if max_size_mb is None else max_size_mb
+    with _HASH_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = TranscriptStore(store_dir, max_size_mb)
+        with store.lock:
+            store.max_bytes = max(store.max_bytes, int(float(max_size_mb) * 1024 * 1024))
+        return store
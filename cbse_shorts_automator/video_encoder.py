@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+File: video_encoder.py
+Streams a clip's raw frames into one ffmpeg (libx264) process per render.
+- Named profiles (draft / upload / archive) from ENCODING.PROFILES in
+  generator_config.json: preset, CRF, tune, threads ('auto' = cores shared
+  between render processes), keyframe interval, audio bitrate, faststart.
+- Audio is written once to a temp WAV and muxed by the same ffmpeg process.
+- Returns per-render metrics (encode fps, output bitrate, size).
+- Segmented mode: the timeline is cut at scene boundaries, each segment is
+  encoded by a forked process, and the parts are joined losslessly with the
+  ffmpeg concat demuxer (stream copy) while the audio is muxed once.
+  Source videos opened with open_video_source() get their ffmpeg pipes
+  closed before the fork, so every process decodes through its own pipe.
+"""
+
+import os
+import time
+import shutil
+import weakref
+import tempfile
+import subprocess
+import multiprocessing
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+DEFAULT_PROFILES = {
+    'draft': {
+        'PRESET': 'ultrafast', 'CRF': 28, 'TUNE': None, 'THREADS': 'auto',
+        'KEYINT_SECONDS': 2, 'AUDIO_BITRATE': '96k', 'FASTSTART': True
+    },
+    'upload': {
+        'PRESET': 'veryfast', 'CRF': 21, 'TUNE': 'animation', 'THREADS': 'auto',
+        'KEYINT_SECONDS': 2, 'AUDIO_BITRATE': '128k', 'FASTSTART': True
+    },
+    'archive': {
+        'PRESET': 'slow', 'CRF': 17, 'TUNE': None, 'THREADS': 'auto',
+        'KEYINT_SECONDS': 4, 'AUDIO_BITRATE': '192k', 'FASTSTART': True
+    },
+}
+
+AUDIO_FPS = 44100
+
+def resolve_profile(config, name=None):
+    """Profile dict (defaults overlaid with the config's values) for name or ENCODING.PROFILE."""
+    enc_cfg = config.get('ENCODING', {})
+    name = name or enc_cfg.get('PROFILE', 'upload')
+    profile = dict(DEFAULT_PROFILES.get(name, DEFAULT_PROFILES['upload']))
+    profile.update(enc_cfg.get('PROFILES', {}).get(name, {}))
+    profile['NAME'] = name
+    return profile
+
+def resolve_threads(value, share=1):
+    """'auto' -> this process's share of the cores (render farm workers split them)."""
+    if value in (None, 'auto'):
+        return max(1, (os.cpu_count() or 2) // max(1, int(share)))
+    return max(1, int(value))
+
+def x264_output_params(profile, fps):
+    """
+    libx264 output options of a profile besides preset / threads / pix_fmt:
+    CRF, tune, keyframe interval and faststart. Shared by the pipe encoder
+    and the write_videofile fallback (as its ffmpeg_params).
+    """
+    keyint = max(1, int(round(float(profile.get('KEYINT_SECONDS', 2)) * fps)))
+    params = ['-crf', str(profile.get('CRF', 21))]
+    if profile.get('TUNE'):
+        params += ['-tune', profile['TUNE']]
+    params += ['-g', str(keyint), '-keyint_min', str(keyint)]
+    if profile.get('FASTSTART', True):
+        params += ['-movflags', '+faststart']
+    return params
+
+class FFmpegPipeEncoder:
+    """
+    Usage:
+        with FFmpegPipeEncoder('out.mp4', (1080, 1920), 24, profile, audio_path='a.wav') as enc:
+            for frame in clip.iter_frames(fps=24, dtype='uint8'):
+                enc.write_frame(frame)
+        enc.metrics  # {'frames': ..., 'encode_fps': ..., 'bitrate_kbps': ...}
+    """
+
+    def __init__(self, output_path, size, fps, profile, audio_path=None, thread_share=1):
+        self.output_path = output_path
+        self.size = tuple(int(v) for v in size)
+        self.fps = fps
+        self.profile = profile
+        self.audio_path = audio_path
+        self.threads = resolve_threads(profile.get('THREADS', 'auto'), thread_share)
+        self.frames = 0
+        self.metrics = None
+        self.proc = None
+        self.log = None
+        self.started = None
+
+    def command(self):
+        w, h = self.size
+        p = self.profile
+        cmd = [
+            get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f'{w}x{h}',
+            '-pix_fmt', 'rgb24', '-r', str(self.fps), '-i', '-',
+        ]
+        if self.audio_path:
+            cmd += ['-i', self.audio_path]
+        cmd += ['-map', '0:v:0']
+        if self.audio_path:
+            cmd += ['-map', '1:a:0', '-c:a', 'aac', '-b:a', str(p.get('AUDIO_BITRATE', '128k')), '-shortest']
+        cmd += ['-c:v', 'libx264', '-preset', p.get('PRESET', 'veryfast')]
+        cmd += x264_output_params(p, self.fps)
+        cmd += ['-threads', str(self.threads), '-pix_fmt', 'yuv420p']
+        cmd.append(self.output_path)
+        return cmd
+
+    def open(self):
+        self.started = time.time()
+        # stderr goes to a file, not a pipe: nobody reads it while frames are
+        # written, and a full pipe would stall ffmpeg (and us) mid-render
+        self.log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(self.command(), stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL, stderr=self.log)
+        return self
+
+    def write_frame(self, frame):
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError):
+            self.proc.wait()  # So its last error lines are in the log
+            raise IOError(f"ffmpeg stopped while encoding {self.output_path}: {self._stderr()}")
+        self.frames += 1
+
+    def _stderr(self):
+        try:
+            self.log.seek(0)
+            return self.log.read().decode('utf-8', 'replace').strip()[-2000:]
+        except Exception:
+            return ''
+
+    def _close_log(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def close(self):
+        """Finishes the file and returns the metrics dict."""
+        if self.proc is None: return self.metrics
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        code = self.proc.wait()
+        err = self._stderr()
+        self._close_log()
+        self.proc = None
+        if code != 0:
+            raise IOError(f"ffmpeg exited with {code} for {self.output_path}: {err}")
+
+        elapsed = max(time.time() - self.started, 1e-6)
+        duration = self.frames / float(self.fps) if self.fps else 0.0
+        size_bytes = os.path.getsize(self.output_path) if os.path.exists(self.output_path) else 0
+        self.metrics = {
+            'profile': self.profile.get('NAME'),
+            'frames': self.frames,
+            'seconds': round(elapsed, 2),
+            'encode_fps': round(self.frames / elapsed, 1),
+            'size_mb': round(size_bytes / 1048576, 2),
+            'bitrate_kbps': round(size_bytes * 8 / 1000 / duration, 1) if duration else 0.0,
+            'threads': self.threads,
+        }
+        return self.metrics
+
+    def abort(self):
+        if self.proc is None: return
+        self.proc.kill()
+        self.proc.wait()
+        self._close_log()
+        self.proc = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def encode_clip(clip, output_path, fps, profile, temp_dir='temp', thread_share=1):
+    """
+    Renders clip (video + audio) to output_path through one ffmpeg pipe.
+
+    Returns:
+        Metrics dict (see FFmpegPipeEncoder.close)
+    """
+    audio_path = None
+    if clip.audio is not None:
+        os.makedirs(temp_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        audio_path = os.path.join(temp_dir, f"{stem}.{os.getpid()}.enc_audio.wav")
+        clip.audio.write_audiofile(audio_path, fps=AUDIO_FPS, nbytes=2, codec='pcm_s16le', logger=None)
+
+    try:
+        with FFmpegPipeEncoder(output_path, clip.size, fps, profile, audio_path, thread_share) as encoder:
+            for frame in clip.iter_frames(fps=fps, dtype='uint8'):
+                encoder.write_frame(frame)
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
+
+    m = encoder.metrics
+    print(f"   📼 Encoded [{m['profile']}] {m['frames']} frames in {m['seconds']}s "
+          f"({m['encode_fps']} fps, {m['bitrate_kbps']} kbps, {m['size_mb']} MB)")
+    return m
+
+# ============================================================================
+# SEGMENTED (MULTI-PROCESS) RENDERING
+# ============================================================================
+
+def plan_segments(duration, segments, cut_points=None, min_seconds=5.0):
+    """
+    Splits [0, duration] into up to `segments` parts. Each cut snaps to the
+    nearest scene boundary in cut_points when one lies within half a segment.
+
+    Returns:
+        Sorted boundaries [0, ..., duration]
+    """
+    segments = max(1, min(int(segments), int(duration // max(min_seconds, 0.1)) or 1))
+    candidates = sorted(c for c in (cut_points or []) if 0 < c < duration)
+    step = duration / segments
+    bounds = [0.0]
+    for j in range(1, segments):
+        ideal = step * j
+        near = [c for c in candidates if abs(c - ideal) <= step / 2]
+        cut = min(near, key=lambda c: abs(c - ideal)) if near else ideal
+        if cut - bounds[-1] >= min_seconds and duration - cut >= min_seconds:
+            bounds.append(cut)
+    bounds.append(float(duration))
+    return bounds
+
+# Source videos whose decoder pipes must not be shared by forked segment processes
+_SOURCES = weakref.WeakSet()
+
+def open_video_source(path, **kwargs):
+    """VideoFileClip(path, **kwargs), registered for segmented rendering."""
+    clip = VideoFileClip(path, **kwargs)
+    _SOURCES.add(clip)
+    return clip
+
+def close_source_pipes():
+    """
+    Closes the ffmpeg pipe of every registered source. The readers stay
+    usable: the next get_frame() opens a fresh pipe at t in whichever
+    process asks, so segment processes never read the parent's pipe.
+    """
+    for clip in list(_SOURCES):
+        if clip.reader is not None:
+            clip.reader.close()
+
+def _encode_segment(clip, times, path, fps, profile, thread_share):
+    with FFmpegPipeEncoder(path, clip.size, fps, profile, None, thread_share) as encoder:
+        for t in times:
+            frame = clip.get_frame(t)
+            if frame.dtype != np.uint8:
+                frame = frame.astype(np.uint8)
+            encoder.write_frame(frame)
+
+def encode_clip_segmented(clip, output_path, fps, profile, boundaries, temp_dir='temp', thread_share=1):
+    """
+    Renders clip in len(boundaries) - 1 forked processes and concatenates
+    the parts. Frame times are exactly those of clip.iter_frames(fps).
+
+    Returns:
+        Metrics dict (same keys as encode_clip, plus 'segments')
+    """
+    started = time.time()
+    times = np.arange(0, clip.duration, 1.0 / fps)
+    cuts = [int(np.searchsorted(times, b - 1e-9)) for b in boundaries]
+    cuts[0], cuts[-1] = 0, len(times)
+    ranges = [(a, b) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+    stem = os.path.splitext(os.path.basename(output_path))[0]
+    work_dir = os.path.join(temp_dir, f"{stem}.{os.getpid()}.segments")
+    os.makedirs(work_dir, exist_ok=True)
+    part_profile = dict(profile, FASTSTART=False)
+    part_share = max(1, int(thread_share)) * len(ranges)
+
+    try:
+        # Fork (not spawn): children inherit the fully built clip tree. Callers
+        # must only get here single-threaded (see ShortsEngine._segment_plan and
+        # render_host.RenderHost).
+        close_source_pipes()
+        ctx = multiprocessing.get_context('fork')
+        parts, procs = [], []
+        for i, (a, b) in enumerate(ranges):
+            part = os.path.join(work_dir, f"part_{i:03d}.mp4")
+            parts.append(part)
+            proc = ctx.Process(target=_encode_segment,
+                               args=(clip, times[a:b], part, fps, part_profile, part_share))
+            proc.start()
+            procs.append(proc)
+
+        # The parent mixes the audio while the children encode
+        audio_path = None
+        if clip.audio is not None:
+            audio_path = os.path.join(work_dir, "audio.wav")
+            clip.audio.write_audiofile(audio_path, fps=AUDIO_FPS, nbytes=2, codec='pcm_s16le', logger=None)
+
+        for proc in procs:
+            proc.join()
+        failed = [i for i, proc in enumerate(procs) if proc.exitcode != 0]
+        if failed:
+            raise IOError(f"Segment render failed for part(s) {failed} of {output_path}")
+
+        list_path = os.path.join(work_dir, "parts.txt")
+        with open(list_path, 'w') as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+
+        cmd = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            cmd += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0',
+                    '-c:a', 'aac', '-b:a', str(profile.get('AUDIO_BITRATE', '128k')), '-shortest']
+        cmd += ['-c:v', 'copy']
+        if profile.get('FASTSTART', True):
+            cmd += ['-movflags', '+faststart']
+        cmd.append(output_path)
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg concat failed for {output_path}: "
+                          f"{result.stderr.decode('utf-8', 'replace').strip()[-2000:]}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = max(time.time() - started, 1e-6)
+    duration = len(times) / float(fps)
+    size_bytes = os.path.getsize(output_path)
+    m = {
+        'profile': profile.get('NAME'),
+        'frames': len(times),
+        'seconds': round(elapsed, 2),
+        'encode_fps': round(len(times) / elapsed, 1),
+        'size_mb': round(size_bytes / 1048576, 2),
+        'bitrate_kbps': round(size_bytes * 8 / 1000 / duration, 1) if duration else 0.0,
+        'threads': resolve_threads(profile.get('THREADS', 'auto'), part_share),
+        'segments': len(ranges),
+    }
+    print(f"   📼 Encoded [{m['profile']}] {m['frames']} frames in {m['seconds']}s across {m['segments']} "
+          f"segments ({m['encode_fps']} fps, {m['bitrate_kbps']} kbps, {m['size_mb']} MB)")
+    return m
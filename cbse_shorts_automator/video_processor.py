@@ -6,13 +6,15 @@ UPDATED: Restored 'Breathing Micro-Zoom' for dynamic visuals.
 """
 
 import os
-import json
 import random
-import whisper
 import warnings
-from moviepy.editor import VideoFileClip, concatenate_videoclips, vfx
+from moviepy.editor import concatenate_videoclips, vfx
 import numpy as np
 import gc
+from video_encoder import open_video_source
+from transcript_store import Transcript, TranscriptStore, TranscriptIndex, load_pcm, shared_store, SAMPLE_RATE, DEFAULT_MAX_SIZE_MB
+from whisper_server import WhisperClient, WhisperServerUnavailable
+from voice_activity import speech_regions, transcribe_regions
 
 # Suppress Whisper warnings
 warnings.filterwarnings("ignore")
@@ -22,11 +24,22 @@ class VideoProcessor:
     Processes static slide videos into dynamic shorts.
     """
     
-    def __init__(self, temp_dir="temp", debug=False):
+    def __init__(self, temp_dir="temp", debug=False, store=None, model_name="tiny", server=None, vad=None):
+        """
+        Args:
+            temp_dir: Scratch folder
+            store: TranscriptStore (durable transcripts); default store if None
+            model_name: Whisper model ('tiny' for speed/RAM)
+            server: WhisperClient for the shared model server (None = in-process model)
+            vad: speech_regions() keyword arguments; only speech is transcribed (None = whole file)
+        """
         self.debug = debug
         self.temp_dir = temp_dir
         self.model = None # Lazy load
-        self.current_cache_file = None # Track file to delete later
+        self.model_name = model_name
+        self.store = store if store is not None else shared_store()
+        self.server = server
+        self.vad = vad
         
         # Ensure temp folder exists
         os.makedirs(self.temp_dir, exist_ok=True)
@@ -34,47 +47,70 @@ class VideoProcessor:
     def _load_model(self):
         """Lazy loads the Whisper model."""
         if self.model is None:
-            # Using 'tiny' for speed/RAM. 
-            if self.debug: print("⏳ Loading Whisper Model (tiny)...")
-            self.model = whisper.load_model("tiny")
+            import whisper  # Only rows that miss the store and the server pay for torch
+            if self.debug: print(f"⏳ Loading Whisper Model ({self.model_name})...")
+            self.model = whisper.load_model(self.model_name)
 
     def get_transcript_map(self, video_path):
         """
-        Generates a transcript, saves to temp, returns segments.
+        Returns the video's transcript segments, transcribing only on a
+        store miss (keyed by video content hash + model).
         """
         filename = os.path.basename(video_path)
-        cache_path = os.path.join(self.temp_dir, f"{filename}.json")
-        self.current_cache_file = cache_path 
         
-        # 1. Check Cache
-        if os.path.exists(cache_path):
-            if self.debug: print(f"⚡ Using existing temp transcript: {cache_path}")
-            with open(cache_path, 'r') as f:
-                return json.load(f)
+        # 1. Check Store
+        transcript = self.store.get(video_path, self.model_name)
+        if transcript is not None:
+            if self.debug: print(f"⚡ Using stored transcript: {filename}")
+            return transcript.to_segments()
 
-        # 2. Transcribe
-        self._load_model()
+        # 2. Transcribe the stored 16 kHz PCM (shared server first, in-process model as fallback)
         if self.debug: print(f"🎙️ Transcribing audio for indexing: {filename}")
+        audio_path = self.store.audio_path(video_path)
+        samples = load_pcm(audio_path)
         
-        result = self.model.transcribe(video_path)
-        segments = result['segments']
+        # Skip silence (slide transitions, intros, outros): only speech regions go to Whisper
+        regions = None
+        if self.vad is not None:
+            regions = speech_regions(samples, **self.vad)
+            if self.debug:
+                speech = sum(e - s for s, e in regions)
+                print(f"   🔊 {speech:.0f}s of speech in {len(samples) / SAMPLE_RATE:.0f}s ({len(regions)} regions)")
         
-        # 3. Save to Temp
-        with open(cache_path, 'w') as f:
-            json.dump(segments, f)
+        segments = [] if regions == [] else None
+        if segments is None and self.server is not None:
+            try:
+                segments = self.server.transcribe(audio_path, regions=regions)
+            except WhisperServerUnavailable as e:
+                print(f"   ⚠️ Whisper server unavailable ({e}). Using in-process model.")
+                self.server = None  # Don't pay the startup timeout again for every row
+        if segments is None:
+            self._load_model()
+            if regions is None:
+                segments = self.model.transcribe(samples)['segments']
+            else:
+                segments = transcribe_regions(self.model, samples, regions)
+        
+        # 3. Save to Store
+        self.store.put(video_path, self.model_name, Transcript.from_segments(segments))
             
         return segments
 
     def find_best_timestamp(self, segments, keyword, last_end_time):
         """
-        Scans transcript for keyword to find best scene.
+        Finds the first scene at/after last_end_time that mentions keyword.
+        
+        Args:
+            segments: TranscriptIndex (or raw segments, indexed on the spot)
         """
-        # Strategy 1: Semantic Search (Forward only)
+        index = segments if isinstance(segments, TranscriptIndex) else TranscriptIndex.from_segments(segments)
+        
+        # Strategy 1: Semantic Search (Forward only, bisect on the keyword's postings)
         if keyword and len(keyword) > 3:
-            for seg in segments:
-                if seg['start'] >= last_end_time and keyword.lower() in seg['text'].lower():
-                    if self.debug: print(f"   ✅ Found '{keyword}' at {seg['start']:.2f}s")
-                    return seg['start']
+            start = index.first_after(keyword, last_end_time)
+            if start is not None:
+                if self.debug: print(f"   ✅ Found '{keyword}' at {start:.2f}s")
+                return start
         
         # Strategy 2: Linear Flow (Fallback)
         # Jumps 1.5s forward to ensure visual change
@@ -122,7 +158,7 @@ class VideoProcessor:
 
     def release_resources(self):
         """
-        CRITICAL: Cleans RAM and deletes Temp files.
+        CRITICAL: Cleans RAM. (Transcripts stay in the store for later rows.)
         """
         if self.model is not None:
             if self.debug: print("🧹 Releasing Whisper AI from memory...")
@@ -130,17 +166,13 @@ class VideoProcessor:
             self.model = None
             gc.collect()
 
-        if self.current_cache_file and os.path.exists(self.current_cache_file):
-            try:
-                os.remove(self.current_cache_file)
-                self.current_cache_file = None
-            except: pass
-
     def prepare_video_for_short(self, video_path, total_duration, script=None, width=1080, style='smart'):
         """
         Main Pipeline: Index -> Match -> Extract -> Cleanup
         """
-        video = VideoFileClip(video_path)
+        # Templates lay their own audio over the scenes; the soundtrack is only
+        # needed for transcription, which reads the stored PCM instead
+        video = open_video_source(video_path, audio=False)
         vid_duration = video.duration
         
         # SAFETY: Ignore the last 5 seconds (Outro/Logo Zone)
@@ -148,7 +180,7 @@ class VideoProcessor:
         if safe_duration < 10: safe_duration = vid_duration 
         
         # Get Intelligence
-        transcript = self.get_transcript_map(video_path)
+        transcript = TranscriptIndex.from_segments(self.get_transcript_map(video_path))
         keywords = self.extract_keywords_ordered(script) if script else []
         
         final_clips = []
@@ -201,4 +233,34 @@ class VideoProcessor:
         
         self.release_resources()
         
-        return final_vid
\ No newline at end of file
+        return final_vid
+
+def create_video_processor(config):
+    """VideoProcessor wired to the TRANSCRIPTS / WHISPER_SERVER / VAD config sections."""
+    settings = config.get('TRANSCRIPTS', {})
+    model_name = settings.get('MODEL', 'tiny')
+    store = shared_store(settings.get('STORE_DIR', 'cache/transcripts'), settings.get('MAX_SIZE_MB', DEFAULT_MAX_SIZE_MB))
+    server_cfg = config.get('WHISPER_SERVER', {})
+    server = None
+    if server_cfg.get('ENABLED', False):
+        server = WhisperClient(
+            socket_path=server_cfg.get('SOCKET', 'cache/whisper.sock'),
+            model_name=model_name,
+            autostart=server_cfg.get('AUTOSTART', True),
+            idle_seconds=server_cfg.get('IDLE_TIMEOUT_SECONDS', 900),
+            start_timeout=server_cfg.get('START_TIMEOUT_SECONDS', 30),
+            timeout_base=server_cfg.get('REQUEST_TIMEOUT_BASE_SECONDS', 120),
+            timeout_per_audio_second=server_cfg.get('REQUEST_TIMEOUT_PER_AUDIO_SECOND', 0.5)
+        )
+    vad_cfg = config.get('VAD', {})
+    vad = None
+    if vad_cfg.get('ENABLED', False):
+        vad = {
+            'threshold_db': vad_cfg.get('THRESHOLD_DB', 10.0),
+            'floor_db': vad_cfg.get('FLOOR_DB', -50.0),
+            'min_speech': vad_cfg.get('MIN_SPEECH_SECONDS', 0.25),
+            'pad': vad_cfg.get('PAD_SECONDS', 0.3),
+            'min_gap': vad_cfg.get('MIN_GAP_SECONDS', 1.0),
+        }
+    return VideoProcessor(temp_dir=config['DIRS']['TEMP'], store=store, model_name=model_name,
+                          server=server, vad=vad)
@@ -7,11 +7,15 @@ Provides Hollywood-grade visual effects synchronized to audio.
 
 import math
 import random
+import numpy as np
 from moviepy.editor import (
-    ColorClip, CompositeVideoClip, TextClip, 
+    ColorClip,
     ImageClip, vfx
 )
 from debug_logger import DebugLogger, LogLevel
+from visual_fx_utils import ParticleFieldClip, TypewriterClip, memoize_per_frame
+from text_sprite_cache import make_text_clip
+from timeline_compositor import IndexedCompositeVideoClip
 
 BASE_WIDTH = 1080
 BASE_HEIGHT = 1920
@@ -143,12 +147,14 @@ class QuizVisualEffects:
     def create_particle_backdrop(self, duration):
         """
         Creates animated particle backdrop with drifting circles + energy bursts.
+        All particles live in NumPy arrays and are drawn in one vectorized pass
+        per frame (ParticleFieldClip), so hundreds cost about what 30 ColorClips did.
         
         Args:
             duration: Total video duration
             
         Returns:
-            CompositeVideoClip with background + particles
+            ParticleFieldClip (opaque: background + gradient + particles)
         """
         self.logger.section_start("Particle Backdrop Generation")
         self.logger.data("Particle Count", self.particle_count)
@@ -156,11 +162,10 @@ class QuizVisualEffects:
         
         # Base background color
         bg_color = self.theme['bg_color']
-        bg = ColorClip(size=(WIDTH, HEIGHT), color=bg_color, duration=duration)
+        base = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        base[...] = bg_color
         
-        clips = [bg]
-        
-        # Create gradient overlay (subtle)
+        # Create gradient overlay (subtle) - baked into the static base plate
         try:
             highlight_color = self._parse_color(self.theme['highlight'])
             num_grd_layers=1
@@ -168,16 +173,9 @@ class QuizVisualEffects:
                 radius = res_scale(50) + (i * res_scale(HEIGHT//2//num_grd_layers))
                 opacity = 0.05 - (i//num_grd_layers * 0.015)
                 
-                gradient_circle = ColorClip(
-                    size=(radius*2, radius*2), 
-                    color=highlight_color
-                ).set_opacity(opacity)
-                
-                gradient_circle = gradient_circle.set_position(
-                    (WIDTH//2 - radius, HEIGHT//2 - radius)
-                ).set_duration(duration)
-                
-                clips.append(gradient_circle)
+                x0, y0 = max(0, WIDTH//2 - radius), max(0, HEIGHT//2 - radius)
+                region = base[y0:HEIGHT//2 + radius, x0:WIDTH//2 + radius]
+                region[...] = (opacity * np.array(highlight_color, dtype=np.float32) + (1 - opacity) * region).astype(np.uint8)
                 
             self.logger.log("Gradient overlay created", LogLevel.DEBUG)
         except Exception as e:
@@ -187,66 +185,34 @@ class QuizVisualEffects:
         self.logger.log(f"Generating {self.particle_count} particles", LogLevel.DEBUG)
         
         highlight_color = self._parse_color(self.theme['highlight'])
-        
-        for i in range(self.particle_count):
-            self.logger.progress(i+1, self.particle_count, "Particles")
-            
-            x = random.randint(0, WIDTH)
-            y_start = HEIGHT + random.randint(0, res_scale(200))
-            drift_speed = random.uniform(40, 80)
-            size = random.choice([res_scale(6), res_scale(8), res_scale(10), res_scale(12)])
-            
-            particle = ColorClip(
-                size=(size, size), 
-                color=highlight_color
-            ).set_opacity(random.uniform(0.2, 0.4))
-            
-            def make_drift_func(x_pos, y_start, speed):
-                def drift(t):
-                    wobble = math.sin(t * 2) * res_scale(10)
-                    return (x_pos + wobble, y_start - (speed * t))
-                return drift
-            
-            particle = particle.set_position(
-                make_drift_func(x, y_start, drift_speed)
-            ).set_duration(duration)
-            
-            clips.append(particle)
+        field = ParticleFieldClip((WIDTH, HEIGHT), duration, base, highlight_color)
+        
+        n = self.particle_count
+        sizes = [res_scale(6), res_scale(8), res_scale(10), res_scale(12)]
+        field.add_drifters(
+            x=[random.randint(0, WIDTH) for _ in range(n)],
+            y_start=[HEIGHT + random.randint(0, res_scale(200)) for _ in range(n)],
+            speed=[random.uniform(40, 80) for _ in range(n)],
+            size=[random.choice(sizes) for _ in range(n)],
+            opacity=[random.uniform(0.2, 0.4) for _ in range(n)],
+            wobble=res_scale(10)
+        )
         
         # Add 5 "speed streak" particles (USP: Fast-paced energy)
         self.logger.log("Adding energy burst streaks", LogLevel.DEBUG)
         
-        for i in range(5):
-            # Random timing
-            burst_start = random.uniform(2, duration - 2)
-            burst_duration = 1.5
-            
-            # Diagonal streak
-            streak = ColorClip(size=(3, 50), color=highlight_color).set_opacity(0.6)
-            
-            # Diagonal motion (top-left to bottom-right or reverse)
-            direction = random.choice([-1, 1])
-            start_x = WIDTH if direction > 0 else 0
-            start_y = random.randint(300, 1000)
-            
-            def make_streak_func(start_x, start_y, direction):
-                def streak_motion(t):
-                    progress = t / 1.5  # 1.5s duration
-                    x = start_x + (direction * -WIDTH * progress)
-                    y = start_y + (HEIGHT * 0.3 * progress)
-                    return (x, y)
-                return streak_motion
-            
-            streak = streak.set_position(
-                make_streak_func(start_x, start_y, direction)
-            ).set_start(burst_start).set_duration(burst_duration)
-            
-            clips.append(streak)
-        
-        backdrop = CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+        # Diagonal motion (top-left to bottom-right or reverse), 1.5s each
+        directions = [random.choice([-1, 1]) for _ in range(5)]
+        field.add_streaks(
+            start_x=[WIDTH if d > 0 else 0 for d in directions],
+            start_y=[random.randint(300, 1000) for _ in range(5)],
+            direction=directions,
+            start=[random.uniform(2, duration - 2) for _ in range(5)],
+            size=(3, 50), opacity=0.6, life=1.5
+        )
         
         self.logger.section_end("Particle Backdrop Generation")
-        return backdrop
+        return field
     
     def create_pip_source_video(self, source_video_clip, duration):
         """
@@ -355,6 +321,10 @@ class QuizVisualEffects:
                     current_y = y_base + (target_y - y_base) * phase_progress
                 
                 return (current_x, current_y)
+            
+            # PIP, borders, glow and overlay buttons all follow this path: once per frame
+            wavy_journey = memoize_per_frame(wavy_journey, FPS)
+            
             # Scale function for enlargement in Phase 4
             def pip_scale(t):
                 progress = min(t / duration, 1.0)
@@ -384,14 +354,8 @@ class QuizVisualEffects:
                     current_scale = 1.0 + (target_scale - 1.0) * eased_progress
                     return current_scale
 
-                # Cache scale values (calculate once, reuse)
-            scale_cache = {}
-
-            def pip_scale_cached(t):
-                frame = int(t * FPS)  # Assuming 24 fps
-                if frame not in scale_cache:
-                    scale_cache[frame] = pip_scale(t)
-                return scale_cache[frame]
+            # Cache scale values (calculate once per frame, reuse)
+            pip_scale_cached = memoize_per_frame(pip_scale, FPS)
 
             pip = pip.resize(pip_scale_cached)
 
@@ -486,7 +450,7 @@ class QuizVisualEffects:
             glow = glow.set_position(glow_pos)
             
             # Composite: Glow -> Borders -> PIP
-            pip_base = CompositeVideoClip([
+            pip_base = IndexedCompositeVideoClip([
                 glow, top_border, bottom_border, left_border, right_border, pip
             ], size=(WIDTH, HEIGHT))
 
@@ -502,7 +466,7 @@ class QuizVisualEffects:
             )
 
             if youtube_controls:
-                pip_with_effects = CompositeVideoClip([
+                pip_with_effects = IndexedCompositeVideoClip([
                     pip_base, youtube_controls
                 ], size=(WIDTH, HEIGHT))
             else:
@@ -618,7 +582,7 @@ class QuizVisualEffects:
         
         # Previous button (⏮)
         try:
-            prev_btn = TextClip(
+            prev_btn = make_text_clip(
                 "◄",
                 fontsize=res_scale(18),
                 color='white',
@@ -638,7 +602,7 @@ class QuizVisualEffects:
         
         # Play/Pause button (⏸) - center of 3 buttons
         try:
-            play_btn = TextClip(
+            play_btn = make_text_clip(
                 "| |",
                 fontsize=res_scale(18),
                 color='white',
@@ -658,7 +622,7 @@ class QuizVisualEffects:
         
         # Next button (⏭)
         try:
-            next_btn = TextClip(
+            next_btn = make_text_clip(
                 "►►",
                 fontsize=res_scale(18),
                 color='white',
@@ -678,7 +642,7 @@ class QuizVisualEffects:
 
         # Volume icon (right side of control bar)
         try:
-            volume_icon = TextClip(
+            volume_icon = make_text_clip(
                 "🔊",  # Or "VOL"
                 fontsize=res_scale(14),
                 color='white',
@@ -701,7 +665,7 @@ class QuizVisualEffects:
         # ============================================================
         
         try:
-            timestamp_clip = TextClip(
+            timestamp_clip = make_text_clip(
                 timestamp,
                 fontsize=res_scale(14),
                 color='white',
@@ -727,7 +691,7 @@ class QuizVisualEffects:
         # ============================================================
         
         try:
-            quality_badge = TextClip(
+            quality_badge = make_text_clip(
                 "HD",
                 fontsize=res_scale(12),
                 color='white',
@@ -751,7 +715,7 @@ class QuizVisualEffects:
         self.logger.section_end("YouTube Player Overlay")
         
         if clips:
-            return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+            return IndexedCompositeVideoClip(clips, size=(WIDTH, HEIGHT))
         else:
             return None
 
@@ -797,7 +761,7 @@ class QuizVisualEffects:
             ).set_position((200, y_pos)).set_start(end_time).set_duration(0.2)
             
             # Label
-            label = TextClip(
+            label = make_text_clip(
                 seg.upper(),
                 fontsize=res_scale(20),
                 color='white',
@@ -809,7 +773,7 @@ class QuizVisualEffects:
             self.logger.data(f"{seg}", f"{start_time:.2f}s -> {end_time:.2f}s", LogLevel.DEBUG)
         
         self.logger.section_end("Timing Markers")
-        return CompositeVideoClip(markers, size=(WIDTH, HEIGHT)) if markers else None
+        return IndexedCompositeVideoClip(markers, size=(WIDTH, HEIGHT)) if markers else None
     
     # NEW function signature:
     def create_cta_banner(self, social_text, link_text, social_start, social_duration, 
@@ -882,7 +846,7 @@ class QuizVisualEffects:
             
             # PART A: Social Action Text
             try:
-                social_clip = TextClip(
+                social_clip = make_text_clip(
                     social_text,
                     fontsize=res_scale(52),
                     color='black',
@@ -912,7 +876,7 @@ class QuizVisualEffects:
             
             # PART B: Link Directive Text
             try:
-                link_clip = TextClip(
+                link_clip = make_text_clip(
                     link_text,
                     fontsize=res_scale(52),
                     color='black',
@@ -941,7 +905,7 @@ class QuizVisualEffects:
         self.logger.section_end("Split CTA Banner")
         
         if clips:
-            return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+            return IndexedCompositeVideoClip(clips, size=(WIDTH, HEIGHT))
         return None
         """
         Creates CTA (Call-to-Action) overlay with professional styling.
@@ -1011,7 +975,7 @@ class QuizVisualEffects:
             # Line 1: Main CTA (larger, bold)
             try:
                 main_text = lines[0]
-                text_clip_1 = TextClip(
+                text_clip_1 = make_text_clip(
                     main_text,
                     fontsize=res_scale(52),
                     color='black',
@@ -1031,7 +995,7 @@ class QuizVisualEffects:
                 
                 # Line 2: Secondary text (smaller)
                 if len(lines) > 1:
-                    text_clip_2 = TextClip(
+                    text_clip_2 = make_text_clip(
                         lines[1],
                         fontsize=36,
                         color='black',
@@ -1067,7 +1031,7 @@ class QuizVisualEffects:
             
             # Compact text
             try:
-                text_clip = TextClip(
+                text_clip = make_text_clip(
                     cta_text,
                     fontsize=36,
                     color='black',
@@ -1086,7 +1050,7 @@ class QuizVisualEffects:
         self.logger.section_end("CTA Banner Creation")
         
         if clips:
-            return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+            return IndexedCompositeVideoClip(clips, size=(WIDTH, HEIGHT))
         else:
             return None
 
@@ -1130,25 +1094,32 @@ class QuizVisualEffects:
         clips = []
         text_color = self._to_hex(color)
         
-        # Background card (appears immediately, stays throughout)
+        # Full text laid out once; words are revealed by masking that raster
         try:
-            # Measure text dimensions
-            full_text_clip = TextClip(
+            hold_time = total_remaining_time if total_remaining_time else audio_duration
+            typed = TypewriterClip(
                 text,
+                reveal_times=[i * word_delay for i in range(word_count)],
+                duration=hold_time,
                 fontsize=int(fontsize),
                 color=text_color,
                 font=FONT_BOLD,
                 stroke_color='black',
                 stroke_width=res_scale(3),
                 method='caption',
-                size=(WIDTH - res_scale(120), None),
+                size=(WIDTH - res_scale(140), None),
                 align='center'
             )
-            
+        except Exception as e:
+            self.logger.warning(f"Typewriter text creation failed: {e}")
+            return None
+        
+        # Background card (appears immediately, stays throughout)
+        try:
             # Semi-transparent background card
             card_padding = res_scale(20)
-            card_width = min(full_text_clip.w + card_padding * 2, WIDTH - res_scale(100))
-            card_height = full_text_clip.h + card_padding * 2
+            card_width = min(typed.w + card_padding * 2, WIDTH - res_scale(100))
+            card_height = typed.h + card_padding * 2
             
             bg_card = ColorClip(
                 size=(card_width, card_height),
@@ -1181,66 +1152,25 @@ class QuizVisualEffects:
             card_x = (WIDTH - res_scale(800)) // 2
             card_y = y_offset
         
-        # Create word-by-word reveal
-        for i in range(word_count):
-            self.logger.progress(i + 1, word_count, "Text Clips")
-            
-            # Progressive text (all words up to current)
-            progressive_text = " ".join(words[:i+1])
-            
-            try:
-                word_clip = TextClip(
-                    progressive_text,
-                    fontsize=int(fontsize),
-                    color=text_color,
-                    font=FONT_BOLD,
-                    stroke_color='black',
-                    stroke_width=res_scale(3),
-                    method='caption',
-                    size=(WIDTH - res_scale(140), None),
-                    align='center'
-                )
-                
-                # Position relative to card
-                text_x = (WIDTH - word_clip.w) // 2
-                text_y = card_y + res_scale(20)  # Padding inside card
-                
-                # Timing: each word appears sequentially
-                word_start = start_time + (i * word_delay)
-                
-                # FIXED: Duration is only until next word appears (not until end)
-                if i < word_count - 1:
-                    word_duration = word_delay  # Show only until next word
-                else:
-                    if total_remaining_time:
-                        word_duration = total_remaining_time - (i * word_delay)
-                    else:
-                        word_duration = audio_duration - (i * word_delay)
-                
-                # Last word gets a subtle pop
-                if i == word_count - 1:
-                    def last_word_pop(t):
-                        if t < 0.2:
-                            scale = 1.0 + 0.05 * math.sin(t / 0.2 * math.pi)
-                            offset_x = (1 - scale) * word_clip.w / 2
-                            offset_y = (1 - scale) * word_clip.h / 2
-                            return (text_x + offset_x, text_y + offset_y)
-                        return (text_x, text_y)
-                    word_clip = word_clip.set_position(last_word_pop)
-                else:
-                    word_clip = word_clip.set_position((text_x, text_y))
-                
-                word_clip = word_clip.set_start(word_start).set_duration(word_duration)
-                clips.append(word_clip)
-                
-            except Exception as e:
-                self.logger.warning(f"Word clip {i+1} creation failed: {e}")
-                continue
+        text_x = (WIDTH - typed.w) // 2
+        text_y = card_y + res_scale(20)  # Padding inside card
+        
+        # Last word gets a subtle pop
+        last_reveal = (word_count - 1) * word_delay
+        def last_word_pop(t):
+            if last_reveal <= t < last_reveal + 0.2:
+                scale = 1.0 + 0.05 * math.sin((t - last_reveal) / 0.2 * math.pi)
+                offset_x = (1 - scale) * typed.w / 2
+                offset_y = (1 - scale) * typed.h / 2
+                return (text_x + offset_x, text_y + offset_y)
+            return (text_x, text_y)
+        
+        clips.append(typed.set_position(last_word_pop).set_start(start_time))
         
         self.logger.section_end("TypeWriter Text Effect")
         
         if len(clips) > 0:
-            return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+            return IndexedCompositeVideoClip(clips, size=(WIDTH, HEIGHT))
         return None
     
     # NEW function signature:
@@ -1290,7 +1220,7 @@ class QuizVisualEffects:
             
             try:
                 # Create text clip
-                opt_clip = TextClip(
+                opt_clip = make_text_clip(
                     text,
                     fontsize=res_scale(52),
                     color='white',
@@ -1404,7 +1334,7 @@ class QuizVisualEffects:
             number = int(duration) - i
             
             try:
-                num_clip = TextClip(
+                num_clip = make_text_clip(
                     str(number),
                     fontsize=res_scale(140),
                     color='white',
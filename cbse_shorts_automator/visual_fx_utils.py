@@ -5,8 +5,10 @@ Handles procedural asset generation and cinema-grade motion easing.
 """
 
 import numpy as np
+from collections import OrderedDict
 from PIL import Image, ImageDraw
-from moviepy.editor import ImageClip
+from moviepy.editor import ImageClip, VideoClip
+from text_renderer import render_text_layout
 
 # CONSTANTS
 WIDTH = 1080
@@ -51,6 +53,34 @@ def ease_out_back(t):
     c3 = c1 + 1
     return 1 + c3 * pow(t - 1, 3) + c1 * pow(t - 1, 2)
 
+def memoize_per_frame(func, fps, max_frames=2048):
+    """
+    Wraps a motion function f(t) (position, scale, opacity...) so it is
+    evaluated once per video frame: t is quantized to the nearest frame
+    index and f is sampled at that frame's exact time. Several clips that
+    follow the same path (PIP, its borders, glow, overlay buttons) then
+    share one evaluation per frame. Bounded LRU of max_frames entries.
+
+    Args:
+        fps: The render's frame rate (a different rate makes motion step)
+    """
+    cache = OrderedDict()
+
+    def sampled(t):
+        frame = int(round(t * fps))
+        value = cache.get(frame)
+        if value is None:
+            value = func(frame / fps)
+            cache[frame] = value
+            if len(cache) > max_frames:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(frame)
+        return value
+
+    sampled.__wrapped__ = func
+    return sampled
+
 def resolve_coord(coord, dimension_size):
     """
     Helper: Converts 'center' to numerical middle point.
@@ -59,11 +89,12 @@ def resolve_coord(coord, dimension_size):
         return dimension_size / 2
     return float(coord)
 
-def make_motion_func(start_pos, end_pos, start_time, duration, easing_func=ease_out_expo):
+def make_motion_func(start_pos, end_pos, start_time, duration, easing_func=ease_out_expo, *, fps):
     """
     Returns a position function pos(t) for MoviePy's set_position.
     Interpolates between start_pos (x,y) and end_pos (x,y) using the easing logic.
-    Handles 'center' automatically.
+    Handles 'center' automatically. Sampled once per frame (memoize_per_frame)
+    at fps, which must be the render's frame rate.
     """
     # Resolve 'center' strings to numbers ONCE
     sx = resolve_coord(start_pos[0], WIDTH)
@@ -110,7 +141,7 @@ def make_motion_func(start_pos, end_pos, start_time, duration, easing_func=ease_
              
         return (final_x, final_y)
         
-    return pos
+    return memoize_per_frame(pos, fps)
 
 # --- 3. PROCEDURAL ASSET GENERATOR ---
 def create_glass_panel(width, height, color=(30, 40, 60, 200), border_color=(255, 255, 255, 50), radius=30, border_width=2):
@@ -142,4 +173,181 @@ def create_glass_panel(width, height, color=(30, 40, 60, 200), border_color=(255
     
     # 4. Convert to MoviePy ImageClip
     numpy_img = np.array(img)
-    return ImageClip(numpy_img)
\ No newline at end of file
+    return ImageClip(numpy_img)
+# --- 4. VECTORIZED PARTICLE FIELD ---
+class ParticleFieldClip(VideoClip):
+    """
+    Opaque backdrop clip: a pre-rendered base plate plus any number of
+    same-coloured rectangular sprites (drifting particles, streaks) drawn in
+    ONE vectorized pass per frame. Replaces dozens of ColorClips with Python
+    position callbacks inside a CompositeVideoClip.
+    Not bit-exact against that composite: pixels under one sprite match, but
+    where k sprites overlap the result may differ by up to k - 1 levels
+    (MoviePy rounds after every blit, this rounds once). Checked by
+    test_particle_field.py.
+
+    Usage:
+        field = ParticleFieldClip((1080, 1920), duration, base_rgb, (250, 204, 21))
+        field.add_drifters(x, y_start, speed, size, opacity, wobble=10)
+        field.add_streaks(start_x, start_y, direction, start, size=(3, 50), opacity=0.6)
+    """
+
+    def __init__(self, size, duration, base, color):
+        """
+        Args:
+            size: (width, height)
+            duration: Clip duration (seconds)
+            base: (h, w, 3) uint8 background image, or an RGB tuple
+            color: Sprite colour (RGB)
+        """
+        VideoClip.__init__(self, duration=duration)
+        self.size = tuple(size)
+        w, h = self.size
+        if isinstance(base, np.ndarray):
+            self.base = base.astype(np.uint8)
+        else:
+            self.base = np.empty((h, w, 3), dtype=np.uint8)
+            self.base[...] = base
+        self.color = np.array(color, dtype=np.float32)
+        self.drifters = None
+        self.streaks = None
+        # Per-pixel transmittance scratch buffer (all ones between frames)
+        self._trans = np.ones(h * w, dtype=np.float32)
+        self._offsets = {}
+        self.make_frame = self._draw
+
+    def add_drifters(self, x, y_start, speed, size, opacity, wobble=10.0, wobble_freq=2.0):
+        """Particles rising at `speed` px/s with a shared sideways wobble: (x + sin(f*t)*wobble, y_start - speed*t)."""
+        self.drifters = {
+            'x': np.asarray(x, dtype=np.float64), 'y': np.asarray(y_start, dtype=np.float64),
+            'speed': np.asarray(speed, dtype=np.float64), 'size': np.asarray(size, dtype=np.int64),
+            'opacity': np.asarray(opacity, dtype=np.float32),
+            'wobble': float(wobble), 'freq': float(wobble_freq),
+        }
+        return self
+
+    def add_streaks(self, start_x, start_y, direction, start, size=(3, 50), opacity=0.6, life=1.5,
+                    travel=None):
+        """
+        Short-lived diagonal streaks. Each runs for `life` seconds from its `start`,
+        moving by (-direction * travel[0], travel[1]) over its life.
+        """
+        w, h = self.size
+        travel = travel or (w, h * 0.3)
+        self.streaks = {
+            'x': np.asarray(start_x, dtype=np.float64), 'y': np.asarray(start_y, dtype=np.float64),
+            'dir': np.asarray(direction, dtype=np.float64), 'start': np.asarray(start, dtype=np.float64),
+            'w': int(size[0]), 'h': int(size[1]), 'opacity': float(opacity),
+            'life': float(life), 'travel': travel,
+        }
+        return self
+
+    def _sprite_offsets(self, sw, sh):
+        """Flat (dy, dx) grid for one sprite size, cached."""
+        key = (sw, sh)
+        if key not in self._offsets:
+            dy, dx = np.mgrid[0:sh, 0:sw]
+            self._offsets[key] = (dy.ravel(), dx.ravel())
+        return self._offsets[key]
+
+    def _sprite_pixels(self, x0, y0, sw, sh, opacity):
+        """Flat pixel indices + per-pixel opacity for sprites of one size (clipped to the frame)."""
+        w, h = self.size
+        dy, dx = self._sprite_offsets(sw, sh)
+        ys = (y0[:, None] + dy[None, :]).ravel()
+        xs = (x0[:, None] + dx[None, :]).ravel()
+        alpha = np.repeat(opacity, dy.size)
+        inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+        return ys[inside] * w + xs[inside], alpha[inside]
+
+    def _draw(self, t):
+        idx_parts, alpha_parts = [], []
+
+        d = self.drifters
+        if d is not None:
+            # int() truncation like MoviePy's blit position
+            x0 = (d['x'] + np.sin(t * d['freq']) * d['wobble']).astype(np.int64)
+            y0 = (d['y'] - d['speed'] * t).astype(np.int64)
+            for s in np.unique(d['size']):
+                sel = d['size'] == s
+                idx, alpha = self._sprite_pixels(x0[sel], y0[sel], int(s), int(s), d['opacity'][sel])
+                idx_parts.append(idx)
+                alpha_parts.append(alpha)
+
+        st = self.streaks
+        if st is not None:
+            live = (t >= st['start']) & (t < st['start'] + st['life'])
+            if live.any():
+                progress = (t - st['start'][live]) / st['life']
+                x0 = (st['x'][live] + st['dir'][live] * -st['travel'][0] * progress).astype(np.int64)
+                y0 = (st['y'][live] + st['travel'][1] * progress).astype(np.int64)
+                opacity = np.full(len(x0), st['opacity'], dtype=np.float32)
+                idx, alpha = self._sprite_pixels(x0, y0, st['w'], st['h'], opacity)
+                idx_parts.append(idx)
+                alpha_parts.append(alpha)
+
+        frame = self.base.copy()
+        if not idx_parts:
+            return frame
+        idx = np.concatenate(idx_parts)
+        if idx.size == 0:
+            return frame
+
+        # Same colour everywhere, so stacking order doesn't matter:
+        # result = base * prod(1 - a) + color * (1 - prod(1 - a))
+        trans = self._trans
+        np.multiply.at(trans, idx, 1.0 - np.concatenate(alpha_parts))
+        touched = np.unique(idx)
+        keep = trans[touched][:, None]
+        flat = frame.reshape(-1, 3)
+        flat[touched] = (flat[touched] * keep + self.color * (1.0 - keep)).astype(np.uint8)
+        trans[touched] = 1.0
+        return frame
+
+# --- 5. TYPEWRITER TEXT ---
+class TypewriterClip(VideoClip):
+    """
+    Word-by-word text reveal from ONE layout and ONE raster. Words sit at
+    their final positions from the start; the mask uncovers each word's ink
+    box at its reveal time (instead of one TextClip per growing prefix).
+
+    Usage:
+        clip = TypewriterClip(question, reveal_times, duration, fontsize=55, color='#FACC15',
+                              font=FONT_BOLD, stroke_color='black', stroke_width=3,
+                              method='caption', size=(940, None))
+    """
+
+    def __init__(self, text, reveal_times, duration, **text_kwargs):
+        """
+        Args:
+            text: Full text
+            reveal_times: Clip-relative time each word appears (one per word, ascending)
+            duration: Clip duration (seconds)
+            text_kwargs: TextClip-style arguments for text_renderer
+        """
+        rgb, alpha, boxes = render_text_layout(text, **text_kwargs)
+        VideoClip.__init__(self, duration=duration)
+        self.size = (rgb.shape[1], rgb.shape[0])
+        self.rgb = rgb
+        self.alpha = alpha if alpha is not None else np.ones(rgb.shape[:2], dtype=np.float32)
+        self.word_boxes = boxes
+        self.reveal_times = np.asarray(reveal_times, dtype=np.float64)
+        self._revealed = (0, np.zeros(rgb.shape[:2], dtype=np.float32))
+        self.make_frame = lambda t: self.rgb
+        self.mask = VideoClip(make_frame=self._mask_frame, ismask=True, duration=duration)
+
+    def _mask_frame(self, t):
+        count = int(np.searchsorted(self.reveal_times, t, side='right'))
+        count = min(count, len(self.word_boxes))
+        shown, mask = self._revealed
+        if count == shown:
+            return mask
+        # Frames arrive in order: extend the previous mask instead of rebuilding
+        if count > shown:
+            mask, boxes = mask.copy(), self.word_boxes[shown:count]
+        else:
+            mask, boxes = np.zeros_like(mask), self.word_boxes[:count]
+        for x0, y0, x1, y1 in boxes:
+            mask[y0:y1, x0:x1] = self.alpha[y0:y1, x0:x1]
+        self._revealed = (count, mask)
+        return mask
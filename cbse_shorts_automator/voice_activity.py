@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+File: voice_activity.py
+Energy-based voice activity detection over the stored 16 kHz PCM.
+- Frame RMS in dBFS (one reshape + mean, no per-sample Python).
+- Speech = frames louder than the file's own noise floor (10th percentile)
+  plus a margin, never quieter than an absolute floor.
+- Runs are padded and merged across short pauses, so Whisper sees whole
+  sentences and slide transitions / intros / outros are skipped.
+transcribe_regions() runs a Whisper model over the regions only and shifts
+the segment times back to the full file's timeline.
+"""
+
+import numpy as np
+from transcript_store import SAMPLE_RATE
+
+def frame_energy_db(samples, sample_rate=SAMPLE_RATE, frame_ms=30):
+    """(per-frame RMS in dBFS, frame length in samples)."""
+    frame = max(int(sample_rate * frame_ms / 1000), 1)
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32), frame
+    frames = np.asarray(samples[:n * frame], dtype=np.float32).reshape(n, frame)
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame)
+    return 20.0 * np.log10(rms + 1e-10), frame
+
+def speech_regions(samples, sample_rate=SAMPLE_RATE, frame_ms=30, threshold_db=10.0, floor_db=-50.0,
+                   min_speech=0.25, pad=0.3, min_gap=1.0, max_coverage=0.9):
+    """
+    Speech regions of a mono float32 signal.
+
+    Args:
+        threshold_db: Margin above the estimated noise floor
+        floor_db: Frames quieter than this are never speech
+        min_speech: Drop bursts shorter than this (clicks, page turns)
+        pad: Seconds added on both sides of each region
+        min_gap: Regions closer than this are merged
+        max_coverage: If speech covers more of the file than this, return
+            the whole file as one region (splitting would save nothing)
+
+    Returns:
+        [(start, end), ...] in seconds, sorted and non-overlapping
+    """
+    duration = len(samples) / float(sample_rate)
+    db, frame = frame_energy_db(samples, sample_rate, frame_ms)
+    if not len(db) or np.percentile(db, 95) < floor_db:
+        return []  # Silent track
+
+    noise, loud = np.percentile(db, [10, 95])
+    # Continuous speech has no quiet floor: never demand more than (loud - margin),
+    # but never accept frames under the absolute floor either (quiet files)
+    threshold = max(min(noise + threshold_db, loud - threshold_db), floor_db)
+    active = (db > threshold).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active, [0]))))
+    frame_sec = frame / float(sample_rate)
+
+    # Join runs across pauses first (syllable dips are shorter than min_speech)
+    runs = []
+    for start, end in zip(edges[0::2] * frame_sec, edges[1::2] * frame_sec):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    regions = []
+    for start, end in runs:
+        if end - start < min_speech: continue
+        start, end = max(start - pad, 0.0), min(end + pad, duration)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end)
+        else:
+            regions.append([start, end])
+
+    if sum(e - s for s, e in regions) >= max_coverage * duration:
+        return [(0.0, duration)]
+    return [(float(s), float(e)) for s, e in regions]
+
+def transcribe_regions(model, samples, regions, sample_rate=SAMPLE_RATE, **options):
+    """
+    Whisper segments for the given regions only, on the file's timeline.
+
+    The model is not thread-safe and already uses every core per decode, so
+    regions run back to back on the one warm model.
+    """
+    segments = []
+    for start, end in regions:
+        chunk = np.ascontiguousarray(samples[int(start * sample_rate):int(end * sample_rate)], dtype=np.float32)
+        if not len(chunk): continue
+        for seg in model.transcribe(chunk, **options)['segments']:
+            segments.append({'start': start + float(seg['start']),
+                             'end': min(start + float(seg['end']), end),
+                             'text': seg['text']})
+    return segments
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+File: whisper_server.py
+Long-lived local Whisper transcription service over a Unix socket.
+- The model is loaded once and stays warm across rows, batches and
+  render-farm workers (one copy in RAM instead of one per process).
+- Requests from every client go through one job queue; identical requests
+  in flight (same file, same options) are coalesced into one transcription.
+- Newline-delimited JSON protocol:
+    -> {"op": "transcribe", "path": "...", "model": "tiny"}   (media file or .pcm.npy)
+       optional "regions": [[start, end], ...] to transcribe speech regions only
+    <- {"ok": true, "segments": [{"start": ..., "end": ..., "text": ...}, ...]}
+- Exits on its own after IDLE seconds without work.
+WhisperClient talks to it, starting it on first use (one starter per host,
+under a file lock). Callers fall back to an in-process model when the
+server can't be reached.
+
+Run manually:
+    python whisper_server.py --socket cache/whisper.sock --model tiny
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+import numpy as np
+from transcript_store import load_pcm, SAMPLE_RATE
+from voice_activity import transcribe_regions
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class WhisperServerUnavailable(Exception):
+    """The server could not be reached / started, or failed the request."""
+    pass
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+class _Job:
+    def __init__(self, key, path, regions, options):
+        self.key = key
+        self.path = path
+        self.regions = regions
+        self.options = options
+        self.done = threading.Event()
+        self.segments = None
+        self.error = None
+
+class TranscriptionQueue:
+    """Single consumer in front of the (not thread-safe) Whisper model."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = None
+        self.jobs = queue.Queue()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.last_activity = time.time()
+        self.completed = 0
+
+    def submit(self, path, options, regions=None):
+        key = json.dumps([os.path.abspath(path), os.path.getmtime(path), regions, options], sort_keys=True)
+        with self.lock:
+            self.last_activity = time.time()
+            job = self.inflight.get(key)
+            if job is None:
+                job = _Job(key, path, regions, options)
+                self.inflight[key] = job
+                self.jobs.put(job)
+            return job
+
+    @property
+    def busy(self):
+        with self.lock:
+            return bool(self.inflight)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                import whisper
+                if self.model is None:
+                    print(f"⏳ Whisper server loading model ({self.model_name})...")
+                    self.model = whisper.load_model(self.model_name)
+                if job.path.endswith('.npy'):
+                    audio = load_pcm(job.path)
+                elif job.regions is not None:
+                    audio = whisper.load_audio(job.path)  # Regions slice samples, not a file name
+                else:
+                    audio = job.path
+                if job.regions is not None:
+                    segments = transcribe_regions(self.model, audio, job.regions, **job.options)
+                else:
+                    segments = self.model.transcribe(audio, **job.options)['segments']
+                job.segments = [{'start': float(s['start']), 'end': float(s['end']), 'text': s['text']}
+                                for s in segments]
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+            with self.lock:
+                self.inflight.pop(job.key, None)
+                self.last_activity = time.time()
+                self.completed += 1
+            job.done.set()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            reply = self.server.dispatch(request)
+        except Exception as e:
+            reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+class WhisperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Usage:
+        server = WhisperServer('cache/whisper.sock', 'tiny', idle_seconds=900)
+        server.serve()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_name='tiny', idle_seconds=900):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Stale socket: the caller already failed to connect to it
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+        self.socket_path = socket_path
+        self.jobs = TranscriptionQueue(model_name)
+        self.idle_seconds = float(idle_seconds)
+
+    def dispatch(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True, 'model': self.jobs.model_name, 'pid': os.getpid(),
+                    'completed': self.jobs.completed}
+        if op == 'transcribe':
+            if request.get('model', self.jobs.model_name) != self.jobs.model_name:
+                return {'ok': False, 'error': f"Server runs model '{self.jobs.model_name}'"}
+            job = self.jobs.submit(request['path'], request.get('options') or {}, request.get('regions'))
+            job.done.wait()
+            if job.error:
+                return {'ok': False, 'error': job.error}
+            return {'ok': True, 'segments': job.segments}
+        return {'ok': False, 'error': f"Unknown op '{op}'"}
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(min(self.idle_seconds, 30))
+            if not self.jobs.busy and time.time() - self.jobs.last_activity > self.idle_seconds:
+                print("💤 Whisper server idle. Shutting down.")
+                self.shutdown()
+                return
+
+    def serve(self):
+        threading.Thread(target=self.jobs.run, daemon=True).start()
+        threading.Thread(target=self._watch_idle, daemon=True).start()
+        print(f"🎧 Whisper server ({self.jobs.model_name}) listening on {self.socket_path}")
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class WhisperClient:
+    """
+    Usage:
+        client = WhisperClient('cache/whisper.sock', 'tiny')
+        try:
+            segments = client.transcribe('video.mp4')
+        except WhisperServerUnavailable:
+            segments = local_model.transcribe('video.mp4')['segments']
+    """
+
+    UNKNOWN_AUDIO_SECONDS = 3 * 3600  # Timeout budget for a media file whose length isn't known
+
+    def __init__(self, socket_path='cache/whisper.sock', model_name='tiny', autostart=True,
+                 idle_seconds=900, start_timeout=30, log_path=None,
+                 timeout_base=120, timeout_per_audio_second=0.5):
+        """
+        Args:
+            timeout_base: Seconds allowed for queueing / model load on top of the audio
+            timeout_per_audio_second: Seconds allowed per second of audio sent
+        """
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.autostart = autostart
+        self.idle_seconds = idle_seconds
+        self.start_timeout = start_timeout
+        self.timeout_base = float(timeout_base)
+        self.timeout_per_audio_second = float(timeout_per_audio_second)
+        self.log_path = log_path or socket_path + '.log'
+        folder = os.path.dirname(socket_path)
+        if folder: os.makedirs(folder, exist_ok=True)
+
+    def _request(self, payload, timeout=None):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise WhisperServerUnavailable("Whisper server closed the connection")
+        return json.loads(line.decode('utf-8'))
+
+    def ping(self):
+        try:
+            return self._request({'op': 'ping'}, timeout=5).get('ok', False)
+        except (OSError, ValueError, WhisperServerUnavailable):
+            return False
+
+    def _start_server(self):
+        """Starts the server unless another process beat us to it."""
+        with open(self.socket_path + '.lock', 'a') as fh:
+            if fcntl: fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                if self.ping():
+                    return
+                print(f"🚀 Starting Whisper server ({self.model_name})...")
+                script = os.path.abspath(__file__)
+                with open(self.log_path, 'a') as log:
+                    subprocess.Popen(
+                        [sys.executable, script, '--socket', self.socket_path,
+                         '--model', self.model_name, '--idle', str(self.idle_seconds)],
+                        stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                        start_new_session=True  # Outlives the row / worker that started it
+                    )
+                deadline = time.time() + self.start_timeout
+                while time.time() < deadline:
+                    if self.ping():
+                        return
+                    time.sleep(0.2)
+                raise WhisperServerUnavailable(f"Whisper server did not start within {self.start_timeout}s")
+            finally:
+                if fcntl: fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def request_timeout(self, path, regions=None):
+        """Seconds to wait for a transcription: grows with the audio actually sent."""
+        if regions is not None:
+            seconds = sum(end - start for start, end in regions)
+        elif path.endswith('.npy'):
+            seconds = len(np.load(path, mmap_mode='r')) / float(SAMPLE_RATE)
+        else:
+            seconds = self.UNKNOWN_AUDIO_SECONDS
+        return self.timeout_base + self.timeout_per_audio_second * seconds
+
+    def transcribe(self, path, regions=None, **options):
+        """
+        Segments [{'start', 'end', 'text'}, ...] for a media file or stored
+        .pcm.npy; with regions (seconds), only those spans are transcribed.
+
+        Raises:
+            WhisperServerUnavailable also when no answer arrives within
+            request_timeout() (callers then use their in-process model)
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise WhisperServerUnavailable("Unix sockets not supported on this platform")
+        if not self.ping():
+            if not self.autostart:
+                raise WhisperServerUnavailable("Whisper server not running")
+            self._start_server()
+
+        payload = {'op': 'transcribe', 'path': os.path.abspath(path),
+                   'model': self.model_name, 'options': options,
+                   'regions': [list(r) for r in regions] if regions is not None else None}
+        timeout = self.request_timeout(path, regions)
+        try:
+            reply = self._request(payload, timeout=timeout)
+        except socket.timeout:
+            raise WhisperServerUnavailable(f"Whisper server gave no answer within {timeout:.0f}s")
+        except (OSError, ValueError) as e:
+            raise WhisperServerUnavailable(f"Whisper server request failed: {e}")
+        if not reply.get('ok'):
+            raise WhisperServerUnavailable(reply.get('error', 'unknown error'))
+        return reply['segments']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local Whisper transcription server")
+    parser.add_argument('--socket', default='cache/whisper.sock')
+    parser.add_argument('--model', default='tiny')
+    parser.add_argument('--idle', type=float, default=900, help="Exit after this many idle seconds")
+    args = parser.parse_args()
+    WhisperServer(args.socket, args.model, args.idle).serve()